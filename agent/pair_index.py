@@ -0,0 +1,127 @@
+import heapq
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+
+from agent.strategy import Pair, implied_a2u, implied_u2a, operable_ars_a2u, operable_ars_u2a
+
+# estado incremental por par (implied, operable, eligible) que se actualiza sólo con los símbolos que tickearon;
+# heap lazy (-implied_u2a, versión, id) para el mejor u2a en O(log n)
+
+class PairIndex:
+    def __init__(self, pairs: List[Pair]):
+        self.pairs: List[Pair] = list(pairs)
+        n = len(self.pairs)
+        self.sym_ids: Dict[str, List[int]] = {}
+        for i, p in enumerate(self.pairs):
+            for s in p:
+                self.sym_ids.setdefault(s, []).append(i)
+        self.implied_a2u = np.full(n, np.nan)
+        self.implied_u2a = np.full(n, np.nan)
+        self.op_a2u = np.zeros(n)
+        self.op_u2a = np.zeros(n)
+        self.eligible_a2u = np.zeros(n, dtype=bool)
+        self.eligible_u2a = np.zeros(n, dtype=bool)
+        self._ver: List[int] = [0] * n
+        self._heap: List[Tuple[float, int, int]] = []
+        self._lim_a2u: Optional[float] = None
+        self._lim_u2a: Optional[float] = None
+        self._full_at: Optional[float] = None
+        self._state = None
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def ids_for(self, symbols) -> Set[int]:
+        return {i for s in symbols for i in self.sym_ids.get(s, ())}
+
+    # ---- quotes ----
+    def update(self, snap, dirty: Optional[Set[str]]) -> Set[int]:
+        """recalcula sólo los pares que tocan `dirty` (None => todos); devuelve los ids tocados"""
+        ids = set(range(len(self.pairs))) if dirty is None else self.ids_for(dirty)
+        for i in ids:
+            a, u = self.pairs[i]
+            qa, qu = snap.get(a), snap.get(u)
+            ia, iu = implied_a2u(qa, qu), implied_u2a(qa, qu)
+            self.implied_a2u[i] = np.nan if ia is None else ia
+            self.implied_u2a[i] = np.nan if iu is None else iu
+            self.op_a2u[i] = operable_ars_a2u(qa, qu, ia)
+            self.op_u2a[i] = operable_ars_u2a(qa, qu, iu)
+            self._ver[i] += 1
+            if iu is not None:
+                heapq.heappush(self._heap, (-iu, self._ver[i], i))
+            if self._lim_a2u is not None:
+                self.eligible_a2u[i] = ia is not None and ia <= self._lim_a2u
+            if self._lim_u2a is not None:
+                self.eligible_u2a[i] = iu is not None and iu >= self._lim_u2a
+        if len(self._heap) > 4 * len(self.pairs) + 64:
+            self._compact()
+        return ids
+
+    def _compact(self):
+        self._heap = [(-float(v), self._ver[i], i) for i, v in enumerate(self.implied_u2a) if v == v]
+        heapq.heapify(self._heap)
+
+    # ---- umbrales ----
+    def set_limits(self, a2u_lim: Optional[float], u2a_lim: Optional[float]) -> bool:
+        """umbral efectivo (ref*(1-thresh) / ref*(1+thresh)); si se movió, re-marca eligible vectorizado (-> True)"""
+        moved = a2u_lim != self._lim_a2u or u2a_lim != self._lim_u2a
+        if a2u_lim != self._lim_a2u:
+            self._lim_a2u = a2u_lim
+            if a2u_lim: np.less_equal(self.implied_a2u, a2u_lim, out=self.eligible_a2u)   # nan => False
+            else: self.eligible_a2u.fill(False)
+        if u2a_lim != self._lim_u2a:
+            self._lim_u2a = u2a_lim
+            if u2a_lim: np.greater_equal(self.implied_u2a, u2a_lim, out=self.eligible_u2a)
+            else: self.eligible_u2a.fill(False)
+        return moved
+
+    # ---- candidatos ----
+    def scope(self, dirty: Optional[Set[str]], ref_pair: Pair, now: Optional[float] = None,
+              every_s: float = 0.0, state=None) -> Optional[Set[int]]:
+        """
+        qué pares re-evaluar: None (todos) en polling/heartbeat, si se movió el par de referencia
+        (cambia el umbral de todos), cada every_s aunque no falten ticks, o si cambió `state`
+        (legs terminados / cash: un par salteado por símbolo ocupado o sin cash vuelve a entrar
+        aunque sus patas estén quietas); si no, sólo los que tocó el tick.
+        """
+        full = not dirty or ref_pair[0] in dirty or ref_pair[1] in dirty
+        if state != self._state:
+            self._state, full = state, True
+        if now is not None and every_s > 0 and (self._full_at is None or now - self._full_at >= every_s):
+            full = True
+        if full:
+            self._full_at = now
+            return None
+        return self.ids_for(dirty)
+
+    def a2u_candidates(self, scope: Optional[Set[int]] = None) -> List[Pair]:
+        el = self.eligible_a2u
+        if scope is not None:
+            return [self.pairs[i] for i in sorted(scope) if el[i]]
+        return [self.pairs[i] for i in np.flatnonzero(el)]
+
+    def u2a_best(self, k: int = 1, ok: Optional[Callable[[Pair], bool]] = None) -> List[Pair]:
+        """hasta k pares eligible u2a, del mejor implied_rev al peor (entradas viejas se descartan al pasar)"""
+        out, keep = [], []
+        h = self._heap
+        while h and len(out) < k:
+            neg, ver, i = h[0]
+            if ver != self._ver[i]:
+                heapq.heappop(h); continue
+            if self._lim_u2a is None or -neg < self._lim_u2a:
+                break                                   # ordenado: de acá para abajo nadie cumple
+            heapq.heappop(h); keep.append((neg, ver, i))
+            if ok is None or ok(self.pairs[i]):
+                out.append(self.pairs[i])
+        for e in keep:
+            heapq.heappush(h, e)
+        return out
+
+    def implied_map(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        """"ARS:USD" -> (implied a2u, implied u2a) top-of-book, None si falta alguna pata (para la ui)"""
+        f = lambda v: None if v != v else float(v)
+        return {f"{a}:{u}": (f(x), f(y)) for (a, u), x, y in zip(self.pairs, self.implied_a2u, self.implied_u2a)}
+
+    def snapshot(self) -> dict:
+        return dict(pairs=len(self.pairs), eligible_a2u=int(self.eligible_a2u.sum()),
+                    eligible_u2a=int(self.eligible_u2a.sum()), heap=len(self._heap))
@@ -0,0 +1,205 @@
+from typing import List, Optional, Tuple
+from settings import settings
+from agent.rules import signal_ars_to_usd, signal_usd_to_ars
+from exec.sync import leg_buy_ioc_then_sell_smart
+from datafeed.book import walk_ratio
+from exec.latency import LATENCY
+
+# señal / sizing / ejecución por par, compartida entre live_ws y sim/replay (cualquier feed tipo DataFeedWS)
+
+Pair = Tuple[str, str]
+
+def implied_a2u(qa, qu) -> Optional[float]:
+    return (qa.ask / qu.bid) if (qa and qu and qa.ask > 0 and qu.bid > 0) else None
+
+def implied_u2a(qa, qu) -> Optional[float]:
+    return (qa.bid / qu.ask) if (qa and qu and qa.bid > 0 and qu.ask > 0) else None
+
+def operable_ars_a2u(qa, qu, implied) -> float:
+    if implied is None:
+        return 0.0
+    # pesos máximos operables dados los top-of-book
+    return min(qa.ask_qty * qa.ask, qu.bid_qty * qu.bid * implied)
+
+def operable_ars_u2a(qa, qu, implied_rev) -> float:
+    if implied_rev is None:
+        return 0.0
+    return min(qa.bid_qty * qa.bid, qu.ask_qty * qu.ask * implied_rev)
+
+def size_a2u(qa, qu, ba, bu, limit: float) -> Tuple[int, float, float, float]:
+    """
+    qty máxima cuyo vwap implied (ars pagados / usd recibidos) queda <= limit.
+    con book level 2 camina asks del ars contra bids del usd; sin book, top-of-book.
+    -> (qty, ARS operables, peor ask ars, peor bid usd) — los peores px son los límites de las órdenes
+    """
+    if ba is not None and bu is not None and ba.n_ask and bu.n_bid:
+        q, a_ars, _, pa, pb = walk_ratio(ba.ask_px, ba.ask_qty, ba.n_ask, bu.bid_px, bu.bid_qty, bu.n_bid, limit)
+        return q, a_ars, pa, pb
+    implied = implied_a2u(qa, qu)
+    if implied is None or implied > limit:
+        return 0, 0.0, 0.0, 0.0
+    return int(min(qu.bid_qty, qa.ask_qty)), operable_ars_a2u(qa, qu, implied), qa.ask, qu.bid
+
+def size_u2a(qa, qu, ba, bu, limit: float) -> Tuple[int, float, float, float]:
+    """
+    qty máxima cuyo vwap implied_rev (ars recibidos / usd pagados) queda >= limit:
+    mismo walk con las patas invertidas (usd pagados / ars recibidos <= 1/limit).
+    -> (qty, ARS operables, peor bid ars, peor ask usd)
+    """
+    if ba is not None and bu is not None and ba.n_bid and bu.n_ask and limit > 0:
+        q, _, b_ars, pu, pa = walk_ratio(bu.ask_px, bu.ask_qty, bu.n_ask, ba.bid_px, ba.bid_qty, ba.n_bid, 1.0 / limit)
+        return q, b_ars, pa, pu
+    implied_rev = implied_u2a(qa, qu)
+    if implied_rev is None or implied_rev < limit:
+        return 0, 0.0, 0.0, 0.0
+    return int(min(qa.bid_qty, qu.ask_qty)), operable_ars_u2a(qa, qu, implied_rev), qa.bid, qu.ask
+
+async def _exec_leg(tag: str, pair: str, tracer, sig=None, **kw) -> dict:
+    LATENCY.bind(sig)
+    try:
+        res = await leg_buy_ioc_then_sell_smart(**kw)
+    finally:
+        LATENCY.bind(None)
+    if settings.trace_enabled and tracer:
+        tracer.log(f"exec.{tag}.result", pair=pair, **res)
+    return res
+
+async def run_a2u(feed, pairs: List[Pair], snap, a2u_ref: float, cash_ars: float, ref, tracer=None, sched=None) -> List[dict]:
+    """
+    ARS -> USD: dispara cada par que cumpla la regla; devuelve las filas para el log de trades.
+    con `sched` (exec.scheduler.ExecScheduler) los legs corren en paralelo y el cash se toma neto de reservas.
+    """
+    rows = []
+    for ars_sym, usd_sym in pairs:
+        if sched and not sched.can_launch((ars_sym, usd_sym)):
+            continue
+        qa = snap.get(ars_sym)
+        qu = snap.get(usd_sym)
+        if not qa or not qu:
+            continue
+        implied = implied_a2u(qa, qu)
+        if not implied or implied > a2u_ref * (1 - settings.thresh_pct):
+            continue
+        # profundidad: qty que mantiene el vwap implied dentro del umbral (walk level 2)
+        cap_by_depth, op_ars, px_ars, px_usd = size_a2u(
+            qa, qu, feed.book(ars_sym), feed.book(usd_sym), a2u_ref * (1 - settings.thresh_pct))
+
+        if signal_ars_to_usd(
+            implied, a2u_ref, op_ars,
+            settings.min_notional_ars, settings.thresh_pct
+        ):
+            # caps por profundidad y cash
+            avail_ars    = sched.available("ARS", cash_ars) if sched else cash_ars
+            cap_by_cash  = int(max(int(avail_ars // max(px_ars, 1)), 0))
+            nom_cap      = max(min(cap_by_depth, cap_by_cash), 0)
+
+            if nom_cap > 0 and nom_cap * qa.ask >= settings.min_notional_ars:
+                def refs(ars_sym=ars_sym, usd_sym=usd_sym):
+                    s2 = feed.snapshot()
+                    qa2, qu2 = s2.get(ars_sym), s2.get(usd_sym)
+                    return dict(
+                        dir="A2U", ref=a2u_ref, implied_now=implied_a2u(qa2, qu2),
+                        book_ok=bool(qu2 and qu2.bid_qty > 0),
+                        rem_sell_px=(qu2.bid if qu2 else None)
+                    )
+
+                if settings.trace_enabled and tracer:
+                    tracer.log("signal.a2u",
+                               pair=f"{ars_sym}:{usd_sym}",
+                               implied=implied, ref=a2u_ref,
+                               cap_depth=cap_by_depth, cap_cash=cap_by_cash, nom_cap=nom_cap,
+                               px_ars=px_ars, px_usd=px_usd,
+                               ref_inst=ref.inst_a2u, ref_ema=ref.ema_a2u, mode=settings.REF_MODE)
+
+                sig = LATENCY.signal((ars_sym, usd_sym))
+                leg = _exec_leg(
+                    "a2u", f"{ars_sym}:{usd_sym}", tracer, sig,
+                    feed=feed,
+                    buy_symbol=ars_sym,  buy_price=px_ars,  buy_qty_cap=nom_cap,
+                    sell_symbol=usd_sym, sell_price=px_usd,
+                    get_refs_and_implied=refs,
+                    wait_ms=settings.WAIT_MS, grace_ms=settings.GRACE_MS
+                )
+                if sched:
+                    if not sched.launch((ars_sym, usd_sym), "ARS", nom_cap * px_ars, leg):
+                        continue
+                else:
+                    await leg
+
+                rows.append(dict(
+                    ts=str(qa.ts), pair=f"{ars_sym}:{usd_sym}", dir="ARS->USD",
+                    implied=implied, mep_ref=a2u_ref, nom=nom_cap, px_ars=px_ars, px_usd=px_usd
+                ))
+    return rows
+
+async def run_u2a(feed, pairs: List[Pair], snap, u2a_ref: float, cash_usd: float, ref, tracer=None, sched=None) -> List[dict]:
+    """USD -> ARS: elige el mejor implied_rev entre los pares que cumplen la regla (y que estén libres si hay `sched`)"""
+    rows = []
+    if sched:
+        cash_usd = sched.available("USD", cash_usd)
+    if cash_usd <= 0:
+        return rows
+    cands = []
+    for ars_sym, usd_sym in pairs:
+        if sched and not sched.can_launch((ars_sym, usd_sym)):
+            continue
+        qa = snap.get(ars_sym)
+        qu = snap.get(usd_sym)
+        if not qa or not qu:
+            continue
+        implied_rev = implied_u2a(qa, qu)
+        if not implied_rev or implied_rev < u2a_ref * (1 + settings.thresh_pct):
+            continue
+        depth, op_ars_rev, px_ars, px_usd = size_u2a(
+            qa, qu, feed.book(ars_sym), feed.book(usd_sym), u2a_ref * (1 + settings.thresh_pct))
+
+        if signal_usd_to_ars(
+            implied_rev, u2a_ref, op_ars_rev,
+            settings.min_notional_ars, settings.thresh_pct
+        ):
+            cands.append((implied_rev, ars_sym, usd_sym, qa, qu, depth, px_ars, px_usd))
+
+    if not cands:
+        return rows
+    implied_rev, ars_sym, usd_sym, qa, qu, cap_by_depth, px_ars, px_usd = max(cands, key=lambda x: x[0])
+    cap_by_cash  = int(max(int(cash_usd // max(px_usd, 1)), 0))
+    nom_cap      = max(min(cap_by_depth, cap_by_cash), 0)
+
+    if nom_cap > 0 and nom_cap * qa.bid >= settings.min_notional_ars:
+        def refs_u2a():
+            s2 = feed.snapshot()
+            qa2, qu2 = s2.get(ars_sym), s2.get(usd_sym)
+            return dict(
+                dir="U2A", ref=u2a_ref, implied_now=implied_u2a(qa2, qu2),
+                book_ok=bool(qa2 and qa2.bid_qty > 0),
+                rem_sell_px=(qa2.bid if qa2 else None)
+            )
+
+        if settings.trace_enabled and tracer:
+            tracer.log("signal.u2a",
+                       pair=f"{ars_sym}:{usd_sym}",
+                       implied=implied_rev, ref=u2a_ref,
+                       cap_depth=cap_by_depth, cap_cash=cap_by_cash, nom_cap=nom_cap,
+                       px_ars=px_ars, px_usd=px_usd,
+                       ref_inst=ref.inst_u2a, ref_ema=ref.ema_u2a, mode=settings.REF_MODE)
+
+        sig = LATENCY.signal((ars_sym, usd_sym))
+        leg = _exec_leg(
+            "u2a", f"{ars_sym}:{usd_sym}", tracer, sig,
+            feed=feed,
+            buy_symbol=usd_sym,  buy_price=None,   buy_qty_cap=nom_cap,
+            sell_symbol=ars_sym, sell_price=px_ars,
+            get_refs_and_implied=refs_u2a,
+            wait_ms=settings.WAIT_MS, grace_ms=settings.GRACE_MS
+        )
+        if sched:
+            if not sched.launch((ars_sym, usd_sym), "USD", nom_cap * px_usd, leg):
+                return rows
+        else:
+            await leg
+
+        rows.append(dict(
+            ts=str(qa.ts), pair=f"{ars_sym}:{usd_sym}", dir="USD->ARS",
+            implied=implied_rev, mep_ref=u2a_ref, nom=nom_cap, px_ars=px_ars
+        ))
+    return rows
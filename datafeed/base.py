@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from pandas import Timestamp
 
 @dataclass
@@ -14,6 +14,10 @@ class DataFeedWS:
     async def run(self): ...
     def snapshot(self) -> Dict[str, Quote2]: ...
     def subscribed_symbols(self) -> List[str]: ...
+    async def wait_updates(self, timeout: float) -> Set[str]: ...
+    def new_cl_ord_id(self) -> str: ...
+    async def cancel(self, cl_ord_id: str): ...
+    def book(self, symbol: str): ...          # DepthBook (level 2) o None si el feed es sólo top-of-book
 
 @dataclass
 class ExecReport:
@@ -25,3 +29,9 @@ class ExecReport:
     status: str
     order_id: Optional[str] = None
     cl_ord_id: Optional[str] = None
+    cum_qty: Optional[float] = None
+    leaves_qty: Optional[float] = None
+    avg_px: Optional[float] = None
+
+FILL_STATUSES = ("FILLED", "PARTIALLY_FILLED")
+DONE_STATUSES = ("FILLED", "CANCELLED", "REJECTED", "EXPIRED")
@@ -0,0 +1,67 @@
+import math
+from typing import List, Tuple
+import numpy as np
+
+# book level 2 por símbolo sobre arrays preasignados (md in-place); nivel 0 = top-of-book
+
+class DepthBook:
+    __slots__ = ("depth", "bid_px", "bid_qty", "ask_px", "ask_qty", "n_bid", "n_ask")
+
+    def __init__(self, depth: int):
+        self.depth = int(depth)
+        self.bid_px = np.zeros(self.depth); self.bid_qty = np.zeros(self.depth)
+        self.ask_px = np.zeros(self.depth); self.ask_qty = np.zeros(self.depth)
+        self.n_bid = 0
+        self.n_ask = 0
+
+    @staticmethod
+    def _fill(px: np.ndarray, qty: np.ndarray, lv: List[Tuple[float, float]], depth: int) -> int:
+        n = 0
+        for p, s in lv[:depth]:
+            if p <= 0 or s <= 0: continue
+            px[n] = p; qty[n] = s; n += 1
+        return n
+
+    def update(self, bids: List[Tuple[float, float]], offers: List[Tuple[float, float]]):
+        """niveles (price, size) de BI/OF ya decodificados (datafeed/codec.py), mejor -> peor"""
+        self.n_bid = self._fill(self.bid_px, self.bid_qty, bids, self.depth)
+        self.n_ask = self._fill(self.ask_px, self.ask_qty, offers, self.depth)
+
+    def top(self) -> Tuple[float, float, float, float]:
+        """(bid, ask, bid_qty, ask_qty) del nivel 0; 0 si el lado está vacío"""
+        return (float(self.bid_px[0]) if self.n_bid else 0.0, float(self.ask_px[0]) if self.n_ask else 0.0,
+                float(self.bid_qty[0]) if self.n_bid else 0.0, float(self.ask_qty[0]) if self.n_ask else 0.0)
+
+def walk_ratio(a_px, a_qty, na: int, b_px, b_qty, nb: int, limit: float) -> Tuple[int, float, float, float, float]:
+    """
+    camina dos escaleras a la vez con la misma qty (nominales) en ambas:
+      A(q) = sum px*qty de `a` (lo que pagamos), B(q) = idem de `b` (lo que recibimos)
+    y devuelve la mayor q entera con A(q)/B(q) <= limit (vwap implied dentro del umbral).
+    dentro de cada tramo los precios marginales son constantes => A y B son lineales y el corte es cerrado.
+    -> (q, A, B, último px de a usado, último px de b usado)
+    """
+    i = j = 0
+    q = 0; A = B = 0.0; pa_last = pb_last = 0.0
+    ra = float(a_qty[0]) if na else 0.0
+    rb = float(b_qty[0]) if nb else 0.0
+    while i < na and j < nb:
+        pa = float(a_px[i]); pb = float(b_px[j])
+        seg = math.floor(min(ra, rb))
+        if pa <= limit * pb:
+            take = seg
+        else:
+            # el marginal ya no cumple: sólo entra lo que banque el colchón acumulado
+            room = limit * B - A
+            take = min(seg, math.floor(room / (pa - limit * pb))) if room > 0 else 0
+        if take <= 0:
+            break
+        q += take; A += pa * take; B += pb * take
+        pa_last, pb_last = pa, pb
+        if take < seg:
+            break
+        ra -= take; rb -= take
+        if ra < 1:
+            i += 1; ra = float(a_qty[i]) if i < na else 0.0
+        if rb < 1:
+            j += 1; rb = float(b_qty[j]) if j < nb else 0.0
+    return q, A, B, pa_last, pb_last
@@ -0,0 +1,159 @@
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple, Union
+import pandas as pd
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from .base import ExecReport
+
+# codec ws enchufable (msgspec / orjson / json); get_codec("auto") elige el más rápido instalado.
+# decode(raw) -> (type, msg): "md" -> MdMsg, "er" -> ExecReport, otro -> dict (None si no parsea)
+
+Level = Tuple[float, float]          # (price, size)
+
+@dataclass(slots=True)
+class MdMsg:
+    symbol: str
+    bids: List[Level]
+    offers: List[Level]
+
+def _opt_float(v) -> Optional[float]:
+    try: return None if v is None else float(v)
+    except (TypeError, ValueError): return None
+
+def _levels(lv) -> List[Level]:
+    return [(float(e.get("price", 0) or 0), float(e.get("size", 0) or 0)) for e in (lv or ())]
+
+def parse_md(j: dict) -> MdMsg:
+    e = j.get("entries") or {}
+    return MdMsg(j.get("symbol") or "", _levels(e.get("BI")), _levels(e.get("OF")))
+
+def parse_er(j: dict, ts: Optional[pd.Timestamp] = None) -> ExecReport:
+    """mensaje ws type 'er' -> ExecReport (lo usa también el exchange simulado)"""
+    return ExecReport(
+        ts=ts if ts is not None else pd.Timestamp.utcnow(),
+        symbol=j.get("product",{}).get("symbol",""),
+        side=j.get("side",""),
+        price=float(j.get("lastPx", j.get("price",0)) or 0),
+        qty=float(j.get("lastQty", j.get("quantity",0)) or 0),
+        status=j.get("status",""),
+        order_id=str(j.get("orderId","") or ""),
+        cl_ord_id=str(j.get("clOrdId","") or ""),
+        cum_qty=_opt_float(j.get("cumQty")),
+        leaves_qty=_opt_float(j.get("leavesQty")),
+        avg_px=_opt_float(j.get("avgPx")),
+    )
+
+def _typed(j: Any) -> Tuple[Optional[str], Any]:
+    if not isinstance(j, dict):
+        return None, None
+    t = j.get("type")
+    if t == "md": return t, parse_md(j)
+    if t == "er": return t, parse_er(j)
+    return t, j
+
+class JsonCodec:
+    name = "json"
+    def decode(self, raw) -> Tuple[Optional[str], Any]:
+        try: j = json.loads(raw)
+        except Exception: return None, None
+        return _typed(j)
+    def encode(self, obj: dict) -> str:
+        return json.dumps(obj)
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+    def __init__(self):
+        import orjson       # ImportError => no disponible
+        self._loads, self._dumps = orjson.loads, orjson.dumps
+    def decode(self, raw):
+        try: j = self._loads(raw)
+        except Exception: return None, None
+        return _typed(j)
+    def encode(self, obj: dict) -> str:
+        return self._dumps(obj).decode()     # primary espera frames de texto
+
+if msgspec is not None:
+    class _Lv(msgspec.Struct):
+        price: Optional[float] = 0.0
+        size: Optional[float] = 0.0
+
+    class _Entries(msgspec.Struct):
+        BI: List[_Lv] = []
+        OF: List[_Lv] = []
+
+    class _Md(msgspec.Struct, tag_field="type", tag="md"):
+        symbol: str = ""
+        entries: Optional[_Entries] = None
+
+    class _Product(msgspec.Struct):
+        symbol: str = ""
+
+    class _Er(msgspec.Struct, tag_field="type", tag="er"):
+        product: Optional[_Product] = None
+        side: str = ""
+        status: str = ""
+        price: Optional[float] = None
+        quantity: Optional[float] = None
+        lastPx: Optional[float] = None
+        lastQty: Optional[float] = None
+        orderId: Optional[Union[str, int]] = None
+        clOrdId: Optional[Union[str, int]] = None
+        cumQty: Optional[float] = None
+        leavesQty: Optional[float] = None
+        avgPx: Optional[float] = None
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+    def __init__(self):
+        if msgspec is None: raise ImportError("msgspec")
+        self._dec = msgspec.json.Decoder(Union[_Md, _Er])
+        self._any = msgspec.json.Decoder()
+        self._enc = msgspec.json.Encoder()
+
+    def decode(self, raw):
+        try:
+            m = self._dec.decode(raw)
+        except msgspec.ValidationError:
+            # tipo que no modelamos (o campos raros): dict genérico
+            try: return _typed(self._any.decode(raw))
+            except Exception: return None, None
+        except Exception:
+            return None, None
+        if type(m) is _Md:
+            e = m.entries
+            if e is None: return "md", MdMsg(m.symbol, [], [])
+            return "md", MdMsg(m.symbol, [(l.price or 0.0, l.size or 0.0) for l in e.BI],
+                                         [(l.price or 0.0, l.size or 0.0) for l in e.OF])
+        px = m.lastPx if m.lastPx is not None else m.price
+        q = m.lastQty if m.lastQty is not None else m.quantity
+        return "er", ExecReport(
+            ts=pd.Timestamp.utcnow(), symbol=m.product.symbol if m.product else "", side=m.side,
+            price=float(px or 0), qty=float(q or 0), status=m.status,
+            order_id=str(m.orderId or ""), cl_ord_id=str(m.clOrdId or ""),
+            cum_qty=m.cumQty, leaves_qty=m.leavesQty, avg_px=m.avgPx,
+        )
+
+    def encode(self, obj: dict) -> str:
+        return self._enc.encode(obj).decode()
+
+CODECS = {"msgspec": MsgspecCodec, "orjson": OrjsonCodec, "json": JsonCodec}
+
+def available_codecs() -> List[str]:
+    out = []
+    for name, cls in CODECS.items():
+        try: cls(); out.append(name)
+        except ImportError: pass
+    return out
+
+def get_codec(name: str = "auto"):
+    """'auto' => msgspec > orjson > json según lo instalado; un nombre explícito que no está cae a json"""
+    order = list(CODECS) if name == "auto" else [name, "json"]
+    for n in order:
+        try: return CODECS[n]()
+        except (ImportError, KeyError): continue
+    return JsonCodec()
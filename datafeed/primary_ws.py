@@ -1,18 +1,69 @@
-import asyncio, json, time, uuid
-import pandas as pd
-import requests, websockets
-from typing import Dict, List, Optional
-from .base import Quote2, DataFeedWS, ExecReport
+import asyncio, time, uuid
+import websockets
+from typing import Callable, Dict, List, Optional, Set
+from .base import DataFeedWS, ExecReport
+from .recorder import TickRecorder
+from .book import DepthBook
+from .quotes import QuoteStore, QuoteSnapshot
+from .codec import get_codec, parse_er      # parse_er re-exportado (sim/exchange lo usa)
 from settings import settings
 from util.trace import Trace
+from util.rest import rest_client
+from util.clock import REAL_CLOCK
+from exec.oms import OMS
+from exec.latency import LATENCY
 
 AUTH_HDR = "X-Auth-Token"
 
 def _cid(prefix="MESITA") -> str:
     return f"{prefix}-{int(time.time()*1000)}-{uuid.uuid4().hex[:6]}"
 
+class ERRouter:
+    """
+    reparte cada execution report (fan-out, nadie le roba er a nadie):
+      - broadcast: cada suscriptor tiene su queue y ve todos los er (reconciler, loggers)
+      - por clOrdId: registro O(1) clOrdId -> queue, sólo con los er de esa orden (sync, latency)
+      - hooks: callbacks sincrónicos que ven cada er antes que las queues (oms)
+    registrar con expect() ANTES de mandar la orden y liberar con release() al terminar.
+    """
+    def __init__(self):
+        self._subs: List[asyncio.Queue] = []
+        self._by_clid: Dict[str, asyncio.Queue] = {}
+        self._hooks: List[Callable[[ExecReport], None]] = []
+
+    def add_hook(self, fn: Callable[[ExecReport], None]):
+        self._hooks.append(fn)
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue()
+        self._subs.append(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        try: self._subs.remove(q)
+        except ValueError: pass
+
+    def expect(self, cl_ord_id: str) -> asyncio.Queue:
+        q = self._by_clid.get(cl_ord_id)
+        if q is None:
+            q = self._by_clid[cl_ord_id] = asyncio.Queue()
+        return q
+
+    def release(self, cl_ord_id: str):
+        self._by_clid.pop(cl_ord_id, None)
+
+    def publish(self, er: ExecReport):
+        for fn in self._hooks:
+            try: fn(er)
+            except Exception: pass
+        for q in self._subs:
+            q.put_nowait(er)
+        q = self._by_clid.get(er.cl_ord_id or "")
+        if q is not None:
+            q.put_nowait(er)
+
 class PrimaryWS(DataFeedWS):
-    def __init__(self, symbols: List[str]):
+    def __init__(self, symbols: List[str], orders: bool = True):
         rest, ws = settings.urls()
         self.base_rest = rest.rstrip("/")
         self.ws_url = ws
@@ -21,24 +72,47 @@ class PrimaryWS(DataFeedWS):
         self.symbols = sorted(set(symbols))
         self.token: Optional[str] = None
         self.ws = None
-        self._cache: Dict[str, Quote2] = {}
-        self._lock = asyncio.Lock()
+        # orders=False => conexión sólo md (shard de datafeed.sharded): no se suscribe a er
+        self.orders = orders
+        # sink opcional por tick: on_md(symbol, DepthBook, ts_ns, t_recv monotónico) (p.ej. tabla en shared memory)
+        self.on_md: Optional[Callable[[str, DepthBook, int, int], None]] = None
+        # tabla de quotes por id de símbolo (sin Quote2 ni pd.Timestamp por tick)
+        self.quotes = QuoteStore(self.symbols)
+        # level 2: niveles por símbolo en arrays preasignados (md_depth=1 => sólo top)
+        self.depth = max(1, int(settings.md_depth))
+        self._books: Dict[str, DepthBook] = {}
+        # símbolos con tick nuevo desde el último wait_updates (los drena el loop de estrategia)
+        self._dirty: Set[str] = set()
+        self._md_evt = asyncio.Event()
         self._stop = False
-        self._er_queue: asyncio.Queue[ExecReport] = asyncio.Queue()
+        self.er_router = ERRouter()
+        self.oms = OMS()
+        self.er_router.add_hook(self.oms.on_er)
+        self.clock = REAL_CLOCK
+        self._er_default: Optional[asyncio.Queue] = None
+        # control pre-trade (exec.risk.RiskEngine); lo engancha live_ws, None = sin control
+        self.risk = None
         self._account = settings.account_for_env()
         self._prop = settings.proprietary_tag
+        self._codec = get_codec(settings.ws_codec)
         self._trace = Trace(settings.trace_path, settings.trace_rotate_mb) if settings.trace_enabled else None
+        self._rec = TickRecorder(settings.tick_dir) if settings.tick_record else None
 
     def subscribed_symbols(self) -> List[str]: return list(self.symbols)
-    def snapshot(self) -> Dict[str, Quote2]: return dict(self._cache)
+    def snapshot(self) -> QuoteSnapshot: return self.quotes.snapshot()
     def token_value(self) -> str: return self.token
+    def new_cl_ord_id(self) -> str: return _cid()
+    def book(self, symbol: str) -> Optional[DepthBook]: return self._books.get(symbol)
+
+    def _smd(self) -> dict:
+        return {"type":"smd","level":1,"symbols":self.symbols,"entries":["BI","OF"],"depth":self.depth}
 
-    def login(self) -> str:
-        r = requests.post(
+    async def login(self) -> str:
+        r = await rest_client().post(
             f"{self.base_rest}/auth/getToken",
             headers={"X-Username": self.user, "X-Password": self.pwd},
             timeout=self.timeout,
-        ); r.raise_for_status()
+        )
         tok = r.headers.get(AUTH_HDR)
         if not tok: raise RuntimeError("no token")
         self.token = tok
@@ -46,27 +120,91 @@ class PrimaryWS(DataFeedWS):
         return tok
 
     async def _connect(self):
-        if not self.token: self.login()
+        if not self.token: await self.login()
         q = f"{self.ws_url}?{AUTH_HDR}={self.token}"
         if self._trace: self._trace.log("ws.connect.start", url=self.ws_url)
         self.ws = await websockets.connect(q, ping_interval=15, ping_timeout=10)
         if self._trace: self._trace.log("ws.connect.ok", subscribed=len(self.symbols))
         if self.symbols:
-            await self._send({"type":"smd","level":1,"symbols":self.symbols,"entries":["BI","OF"]})
-        await self._send({"type":"spr","accounts":[self._account],"all":True})
+            await self._send(self._smd())
+        if self.orders:
+            await self._send({"type":"spr","accounts":[self._account],"all":True})
 
     async def _send(self, obj: dict):
         if self._trace and settings.trace_raw:
             try: self._trace.log("ws.send", payload=obj)
             except Exception: pass
-        await self.ws.send(json.dumps(obj))
+        await self.ws.send(self._codec.encode(obj))
+
+    async def _send_order(self, payload: dict, px: Optional[float]):
+        """toda orden sale por acá: pre-trade de risk (puede levantar RiskReject) y envío"""
+        clid = payload["clOrdId"]
+        sym = payload["product"]["symbol"]
+        if self.risk:
+            self.risk.pre_trade(clid, sym, payload["side"], payload["quantity"], px)
+        self.oms.on_send(clid, sym, payload["side"], payload["quantity"], payload.get("price"), payload["timeInForce"])
+        t0 = time.monotonic_ns()
+        try:
+            await self._send(payload)
+        except Exception:
+            if self.risk: self.risk.drop(clid)
+            self.oms.fail(clid)
+            raise
+        LATENCY.on_send(clid, t0, time.monotonic_ns())
+
+    async def cancel(self, cl_ord_id: str):
+        """cancel por clOrdId (ws 'co'); el CANCELLED llega como er y lo aplica el oms"""
+        o = self.oms.get(cl_ord_id)
+        if o is not None and o.done:
+            return
+        await self._send({"type":"co","clientId":cl_ord_id,"proprietary":self._prop})
+        self.oms.mark_cancel(cl_ord_id)
+        if self._trace: self._trace.log("order.cancel", clOrdId=cl_ord_id)
+
+    async def replace(self, cl_ord_id: str, qty: Optional[int] = None, price: Optional[float] = None) -> Optional[str]:
+        """
+        replace = cancel + new; `qty` es el total buscado (default: el de la orden vieja) y la nueva
+        sale por qty - cum. el new espera el terminal de la vieja (si llena durante el cancel no hay doble
+        fill); cancel rechazado o sin respuesta en primary_timeout_s => no se manda nada, devuelve None.
+        """
+        o = self.oms.get(cl_ord_id)
+        if o is None or o.done:
+            return None
+        q = self.er_router.expect(cl_ord_id)
+        try:
+            await self.cancel(cl_ord_id)
+            t_end = self.clock.time() + float(self.timeout)
+            while not o.done:
+                rem = t_end - self.clock.time()
+                if rem <= 0: break
+                try:
+                    await self.clock.wait_queue(q, rem)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            self.er_router.release(cl_ord_id)
+        if o.status not in ("CANCELLED", "EXPIRED"):
+            if self._trace: self._trace.log("order.replace_skip", clOrdId=cl_ord_id, status=o.status)
+            return None
+        new_qty = int((qty if qty is not None else o.qty) - o.cum_qty)
+        if new_qty <= 0:
+            return None
+        new_px = o.price if price is None else price
+        if new_px is None:
+            clid = await self.send_market(o.symbol, o.side, new_qty, tif=o.tif)
+        else:
+            clid = await self.send_limit(o.symbol, o.side, new_qty, new_px, tif=o.tif)
+        o.replaced_by = clid
+        return clid
 
     async def update_symbols(self, new_symbols: List[str]):
         self.symbols = sorted(set(new_symbols))
-        gone = [k for k in list(self._cache.keys()) if k not in self.symbols]
-        for k in gone: self._cache.pop(k, None)
+        gone = [k for k in self.quotes.names if k not in self.symbols]
+        for k in gone:
+            self.quotes.clear(k); self._books.pop(k, None)
+        self._dirty.difference_update(gone)
         if self.ws:
-            await self._send({"type":"smd","level":1,"symbols":self.symbols,"entries":["BI","OF"]})
+            await self._send(self._smd())
         if self._trace: self._trace.log("md.resub", symbols=len(self.symbols))
 
     async def send_limit(self, symbol: str, side: str, qty: int, price: float, tif: str="DAY", iceberg: bool=False, display_qty: int|None=None, cl_ord_id: Optional[str]=None) -> str:
@@ -85,7 +223,7 @@ class PrimaryWS(DataFeedWS):
         }
         if iceberg and display_qty:
             payload["displayQuantity"] = display_qty
-        await self._send(payload)
+        await self._send_order(payload, price)
         if self._trace:
             self._trace.log("order.send", kind="limit", symbol=symbol, side=side, qty=qty, price=price, tif=tif, clOrdId=clid)
         return clid
@@ -103,46 +241,42 @@ class PrimaryWS(DataFeedWS):
             "timeInForce":tif,
             "proprietary":self._prop
         }
-        await self._send(payload)
+        # market no tiene precio: para risk valuamos contra el top-of-book del lado que pega
+        q = self.quotes.get(symbol)
+        px = (q.ask if side.upper() == "BUY" else q.bid) if q else None
+        await self._send_order(payload, px)
         if self._trace:
             self._trace.log("order.send", kind="market", symbol=symbol, side=side, qty=qty, tif=tif, clOrdId=clid)
         return clid
 
     async def _consume(self):
         async for raw in self.ws:
-            try:
-                j = json.loads(raw)
-            except Exception:
-                continue
-            t = j.get("type")
+            t0 = time.monotonic_ns()
+            t, m = self._codec.decode(raw)
+            t1 = time.monotonic_ns()
             if t == "md":
-                sym = j.get("symbol")
-                e = j.get("entries", {})
-                bi = (e.get("BI") or [{}])[0]
-                of = (e.get("OF") or [{}])[0]
-                q = Quote2(
-                    ts=pd.Timestamp.utcnow(),
-                    bid=float(bi.get("price",0) or 0),
-                    ask=float(of.get("price",0) or 0),
-                    bid_qty=float(bi.get("size",0) or 0),
-                    ask_qty=float(of.get("size",0) or 0),
-                )
-                async with self._lock:
-                    self._cache[sym]=q
+                sym = m.symbol
+                b = self._books.get(sym)
+                if b is None:
+                    b = self._books[sym] = DepthBook(self.depth)
+                b.update(m.bids, m.offers)
+                bid, ask, bq, aq = b.top()
+                ts_ns = time.time_ns()
+                self.quotes.set(sym, bid, ask, bq, aq, ts_ns)
+                LATENCY.md(sym, t0, t1, time.monotonic_ns())
+                self._dirty.add(sym)
+                self._md_evt.set()
+                if self.on_md is not None:
+                    self.on_md(sym, b, ts_ns, t0)
+                if self._rec:
+                    self._rec.write(sym, bid, ask, bq, aq, ts_ns)
                 if self._trace and settings.trace_raw:
-                    self._trace.log("md", symbol=sym, bid=q.bid, ask=q.ask, bid_qty=q.bid_qty, ask_qty=q.ask_qty)
+                    self._trace.log("md", symbol=sym, bid=bid, ask=ask, bid_qty=bq, ask_qty=aq)
             elif t == "er":
-                er = ExecReport(
-                    ts=pd.Timestamp.utcnow(),
-                    symbol=j.get("product",{}).get("symbol",""),
-                    side=j.get("side",""),
-                    price=float(j.get("lastPx", j.get("price",0)) or 0),
-                    qty=float(j.get("lastQty", j.get("quantity",0)) or 0),
-                    status=j.get("status",""),
-                    order_id=str(j.get("orderId","") or ""),
-                    cl_ord_id=str(j.get("clOrdId","") or ""),
-                )
-                await self._er_queue.put(er)
+                er = m
+                LATENCY.on_er(er.cl_ord_id, t0)
+                if self.risk: self.risk.on_er(er)
+                self.er_router.publish(er)
                 if self._trace:
                     self._trace.log("er", symbol=er.symbol, side=er.side, price=er.price, qty=er.qty, status=er.status, order_id=er.order_id, clOrdId=er.cl_ord_id)
             else:
@@ -157,16 +291,32 @@ class PrimaryWS(DataFeedWS):
                 await self._consume()
             except websockets.ConnectionClosed:
                 await asyncio.sleep(backoff); backoff=min(backoff*2,30.0)
-                try: self.login()
+                try: await self.login()
                 except Exception: pass
             except Exception:
                 await asyncio.sleep(backoff); backoff=min(backoff*2,30.0)
 
     async def stop(self):
         self._stop = True
+        if self._rec: self._rec.close()
         try:
             if self.ws: await self.ws.close()
         except Exception: pass
 
+    async def wait_updates(self, timeout: float) -> Set[str]:
+        """
+        espera hasta `timeout` s por ticks nuevos y devuelve (drenando) los símbolos tocados.
+        set vacío = no hubo md en la ventana (heartbeat).
+        """
+        if not self._dirty:
+            try: await asyncio.wait_for(self._md_evt.wait(), timeout)
+            except asyncio.TimeoutError: pass
+        self._md_evt.clear()
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
     async def next_exec_report(self) -> ExecReport:
-        return await self._er_queue.get()
+        """compat para scripts de un solo consumidor; el resto usa er_router"""
+        if self._er_default is None:
+            self._er_default = self.er_router.subscribe()
+        return await self._er_default.get()
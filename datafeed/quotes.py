@@ -0,0 +1,114 @@
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+
+# quotes por id de símbolo en arrays numpy (px, ts_ns, seq; seq 0 = sin dato);
+# snapshot() copia los arrays y expone la interfaz del dict de Quote2
+
+BID, ASK, BID_QTY, ASK_QTY = range(4)
+
+class QuoteRow:
+    """fila de un snapshot con los atributos de Quote2 (ts se arma recién si alguien lo pide)"""
+    __slots__ = ("_s", "_i")
+
+    def __init__(self, snap: "QuoteSnapshot", i: int):
+        self._s = snap; self._i = i
+
+    @property
+    def bid(self) -> float: return float(self._s.px[self._i, BID])
+    @property
+    def ask(self) -> float: return float(self._s.px[self._i, ASK])
+    @property
+    def bid_qty(self) -> float: return float(self._s.px[self._i, BID_QTY])
+    @property
+    def ask_qty(self) -> float: return float(self._s.px[self._i, ASK_QTY])
+    @property
+    def ts_ns(self) -> int: return int(self._s.ts_ns[self._i])
+    @property
+    def seq(self) -> int: return int(self._s.seq[self._i])
+    @property
+    def ts(self) -> pd.Timestamp: return pd.Timestamp(self.ts_ns, tz="UTC")
+
+    def __repr__(self) -> str:
+        return f"QuoteRow(bid={self.bid}, ask={self.ask}, bid_qty={self.bid_qty}, ask_qty={self.ask_qty}, ts_ns={self.ts_ns})"
+
+class QuoteSnapshot(Mapping):
+    """copia congelada de la tabla; el índice símbolo->id se comparte (sólo crece)"""
+    __slots__ = ("px", "ts_ns", "seq", "_ids", "_n")
+
+    def __init__(self, px: np.ndarray, ts_ns: np.ndarray, seq: np.ndarray, ids: Dict[str, int], n: int):
+        self.px, self.ts_ns, self.seq, self._ids, self._n = px, ts_ns, seq, ids, n
+
+    def get(self, sym: str, default=None):
+        i = self._ids.get(sym)
+        if i is None or i >= self._n or not self.seq[i]:
+            return default
+        return QuoteRow(self, i)
+
+    def __getitem__(self, sym: str) -> QuoteRow:
+        q = self.get(sym)
+        if q is None: raise KeyError(sym)
+        return q
+
+    def __contains__(self, sym) -> bool:
+        return self.get(sym) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (s for s, i in list(self._ids.items()) if i < self._n and self.seq[i])
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.seq[:self._n]))
+
+class QuoteStore:
+    def __init__(self, symbols: Optional[List[str]] = None, capacity: int = 256):
+        cap = max(int(capacity), len(symbols or ()), 1)
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.px = np.zeros((cap, 4))
+        self.ts_ns = np.zeros(cap, dtype=np.int64)
+        self.seq = np.zeros(cap, dtype=np.int64)
+        self.last_seq = 0
+        for s in symbols or ():
+            self.sym_id(s)
+
+    def sym_id(self, sym: str) -> int:
+        """id fijo por símbolo (se asigna una vez; la tabla crece x2 si hace falta)"""
+        i = self.ids.get(sym)
+        if i is not None:
+            return i
+        i = len(self.names)
+        if i >= len(self.seq):
+            cap = 2 * len(self.seq)
+            self.px = np.resize(self.px, (cap, 4)); self.px[i:] = 0
+            self.ts_ns = np.resize(self.ts_ns, cap); self.ts_ns[i:] = 0
+            self.seq = np.resize(self.seq, cap); self.seq[i:] = 0
+        self.names.append(sym)
+        self.ids[sym] = i
+        return i
+
+    def set(self, sym: str, bid: float, ask: float, bid_qty: float, ask_qty: float, ts_ns: int) -> int:
+        i = self.ids.get(sym)
+        if i is None: i = self.sym_id(sym)
+        self.px[i] = (bid, ask, bid_qty, ask_qty)
+        self.ts_ns[i] = ts_ns
+        self.last_seq += 1
+        self.seq[i] = self.last_seq
+        return i
+
+    def clear(self, sym: str):
+        """el símbolo deja de estar suscripto: sin dato (el id queda reservado)"""
+        i = self.ids.get(sym)
+        if i is not None:
+            self.seq[i] = 0
+
+    def get(self, sym: str) -> Optional[QuoteRow]:
+        """vista VIVA de la fila (sin copia): lee el último tick cada vez que se consulta"""
+        i = self.ids.get(sym)
+        if i is None or not self.seq[i]:
+            return None
+        return QuoteRow(self, i)
+
+    def snapshot(self) -> QuoteSnapshot:
+        n = len(self.names)
+        return QuoteSnapshot(self.px[:n].copy(), self.ts_ns[:n].copy(), self.seq[:n].copy(), self.ids, n)
@@ -0,0 +1,108 @@
+import json, os, struct, time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+# captura binaria de ticks por día: header json (MAGIC + len, padding) + records TICK_DTYPE de ancho fijo;
+# symbol_id = índice en header["symbols"], el reader mapea con np.memmap
+
+MAGIC = b"MESITK01"
+HEADER_SIZE = 64 * 1024
+TICK_DTYPE = np.dtype([
+    ("ts_ns", "<i8"), ("sym", "<u4"),
+    ("bid", "<f8"), ("ask", "<f8"), ("bid_qty", "<f8"), ("ask_qty", "<f8"),
+])
+_REC = struct.Struct("<qI4d")
+assert _REC.size == TICK_DTYPE.itemsize
+
+def tick_path(tick_dir: str, day: str) -> str:
+    return os.path.join(tick_dir, f"ticks_{day}.bin")
+
+def _read_header(f) -> dict:
+    f.seek(0)
+    raw = f.read(HEADER_SIZE)
+    if raw[:8] != MAGIC:
+        raise ValueError("no es un archivo de ticks mesita")
+    n = struct.unpack_from("<I", raw, 8)[0]
+    return json.loads(raw[12:12 + n].decode("utf-8"))
+
+def _write_header(f, hdr: dict):
+    body = json.dumps(hdr, separators=(",", ":")).encode("utf-8")
+    if 12 + len(body) > HEADER_SIZE:
+        raise ValueError("header de ticks lleno (demasiados símbolos)")
+    f.seek(0)
+    f.write(MAGIC + struct.pack("<I", len(body)) + body + b" " * (HEADER_SIZE - 12 - len(body)))
+
+class TickRecorder:
+    """appender de ticks: write() es un struct.pack + write bufferizado (sin json en el hot path)"""
+    def __init__(self, tick_dir: str, buffering: int = 1 << 16):
+        self.tick_dir = tick_dir
+        self.buffering = buffering
+        os.makedirs(tick_dir, exist_ok=True)
+        self._f = None
+        self._day_end_ns = 0
+        self._hdr: dict = {}
+        self._ids: Dict[str, int] = {}
+
+    def _roll(self, ts_ns: int):
+        self.close()
+        d = datetime.fromtimestamp(ts_ns / 1e9)
+        day = d.strftime("%Y%m%d")
+        nxt = datetime(d.year, d.month, d.day) + timedelta(days=1)
+        self._day_end_ns = int(nxt.timestamp() * 1e9)
+        p = tick_path(self.tick_dir, day)
+        if os.path.exists(p) and os.path.getsize(p) >= HEADER_SIZE:
+            self._f = open(p, "r+b", buffering=self.buffering)
+            self._hdr = _read_header(self._f)
+            # si el proceso anterior murió a mitad de record, truncamos al último completo
+            size = os.path.getsize(p)
+            self._f.truncate(HEADER_SIZE + (size - HEADER_SIZE) // TICK_DTYPE.itemsize * TICK_DTYPE.itemsize)
+        else:
+            self._f = open(p, "w+b", buffering=self.buffering)
+            self._hdr = dict(version=1, day=day, record_size=TICK_DTYPE.itemsize, symbols=[])
+            _write_header(self._f, self._hdr)
+        self._ids = {s: i for i, s in enumerate(self._hdr["symbols"])}
+        self._f.seek(0, os.SEEK_END)
+
+    def _sym_id(self, symbol: str) -> int:
+        i = self._ids.get(symbol)
+        if i is None:
+            i = self._ids[symbol] = len(self._hdr["symbols"])
+            self._hdr["symbols"].append(symbol)
+            _write_header(self._f, self._hdr)
+            self._f.seek(0, os.SEEK_END)
+        return i
+
+    def write(self, symbol: str, bid: float, ask: float, bid_qty: float, ask_qty: float, ts_ns: Optional[int] = None):
+        ts_ns = time.time_ns() if ts_ns is None else ts_ns
+        if ts_ns >= self._day_end_ns:
+            self._roll(ts_ns)
+        self._f.write(_REC.pack(ts_ns, self._sym_id(symbol), bid, ask, bid_qty, ask_qty))
+
+    def flush(self):
+        if self._f: self._f.flush()
+
+    def close(self):
+        if self._f:
+            try: self._f.close()
+            except Exception: pass
+            self._f = None
+
+def load_ticks(path: str) -> Tuple[np.ndarray, List[str]]:
+    """
+    carga los ticks de un día como array estructurado TICK_DTYPE sobre np.memmap (read-only, zero copy).
+    devuelve (ticks, symbols) con ticks["sym"] indexando en symbols.
+    """
+    with open(path, "rb") as f:
+        hdr = _read_header(f)
+    n = max(os.path.getsize(path) - HEADER_SIZE, 0) // TICK_DTYPE.itemsize
+    if n == 0:
+        return np.zeros(0, dtype=TICK_DTYPE), list(hdr["symbols"])
+    ticks = np.memmap(path, dtype=TICK_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
+    return ticks, list(hdr["symbols"])
+
+def symbol_ticks(ticks: np.ndarray, symbols: List[str], symbol: str) -> np.ndarray:
+    """ticks de un símbolo (copia por máscara booleana)"""
+    try: i = symbols.index(symbol)
+    except ValueError: return ticks[:0]
+    return ticks[ticks["sym"] == i]
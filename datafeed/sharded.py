@@ -0,0 +1,302 @@
+import asyncio, multiprocessing as mp, queue, threading, time
+from typing import Dict, List, Optional, Set
+import numpy as np
+
+from .base import DataFeedWS
+from .book import DepthBook
+from .quotes import QuoteSnapshot
+from .recorder import TickRecorder
+from .shm import ShmQuoteTable, ShmRing
+from .primary_ws import PrimaryWS
+from settings import settings
+from exec.latency import LATENCY
+
+# md en N conexiones sólo-md (procesos o threads) que escriben una ShmQuoteTable; el proceso principal
+# conserva la conexión de órdenes + er. md_mode=inproc y md_shards=1 => PrimaryWS común
+
+def make_feed(symbols: List[str]) -> DataFeedWS:
+    if settings.md_mode.lower() == "process":
+        return ShardedFeed(symbols, mode="process")
+    if int(settings.md_shards) > 1:
+        return ShardedFeed(symbols)
+    return PrimaryWS(symbols)
+
+# ---- lado shard (corre en el proceso / thread hijo) ----
+
+async def _shard_main(k: int, shm_name: str, capacity: int, depth: int, ring_name: str, ring_cap: int,
+                      rows: Dict[str, int], token: Optional[str], ctl):
+    table = ShmQuoteTable.attach(shm_name, capacity, depth)
+    ring = ShmRing.attach(ring_name, ring_cap)
+    feed = PrimaryWS(list(rows), orders=False)
+    feed.depth = depth
+    feed.token = token
+    feed._trace = None          # el trace / recorder los lleva el proceso principal
+    feed._rec = None
+    def on_md(sym: str, b: DepthBook, ts_ns: int, t_recv: int):
+        i = rows.get(sym)
+        if i is not None:
+            table.write(i, b, ts_ns, t_recv)
+            ring.push(i)
+    feed.on_md = on_md
+    task = asyncio.create_task(feed.run())
+    try:
+        while True:
+            msg = await asyncio.to_thread(ctl.get)
+            if msg[0] == "stop":
+                break
+            if msg[0] == "symbols":
+                rows = dict(msg[1])             # on_md ya no escribe las filas viejas
+                ring.set_ack(msg[2])
+                await feed.update_symbols(list(rows))
+    finally:
+        await feed.stop()
+        task.cancel()
+        table.close(); ring.close()
+
+def _shard_proc(*args):
+    asyncio.run(_shard_main(*args))
+
+# ---- lado principal ----
+
+class _ShmQuotes:
+    """lo que PrimaryWS necesita de `quotes` para valuar market orders (get(sym))"""
+    def __init__(self, owner: "ShardedFeed"):
+        self._o = owner
+    def get(self, sym: str):
+        return self._o.snapshot().get(sym)
+
+class ShardedFeed(DataFeedWS):
+    def __init__(self, symbols: List[str], shards: Optional[int] = None, mode: Optional[str] = None):
+        self.n_shards = max(1, int(shards or settings.md_shards))
+        self.mode = (mode or settings.md_shard_mode).lower()          # process | thread
+        self.depth = max(1, int(settings.md_depth))
+        self.symbols = sorted(set(symbols))
+        cap = max(int(settings.md_shm_capacity), 4 * len(self.symbols), 16)
+        self.table = ShmQuoteTable(cap, self.depth)
+        self.rings = [ShmRing(int(settings.md_ring_size)) for _ in range(self.n_shards)]
+        self._cur = [0] * self.n_shards                # cursor de lectura por ring
+        self.lapped = 0                                # veces que un ring nos pasó por arriba
+        self.rows: Dict[str, int] = {}                 # símbolo -> fila vigente
+        self.names: List[str] = []                     # fila -> símbolo
+        self.active = np.zeros(cap, dtype=bool)
+        self._ids: Dict[str, int] = {}                 # copia de rows que ven los snapshots
+        self._assign: Dict[str, int] = {}              # símbolo -> shard
+        self._gen = [0] * self.n_shards                # generación de filas enviada a cada shard
+        self._free: List[int] = []                     # filas reusables
+        self._retire: List[tuple] = []                 # (fila, shard, gen): libres cuando el shard ackee gen
+        self._seen = np.zeros(0, dtype=np.int64)
+        self._poll_s = max(0.0001, float(settings.md_shm_poll_ms) / 1000.0)
+        self._books: Dict[str, DepthBook] = {}
+        self._workers: List[tuple] = []                # (ctl queue, proceso / thread)
+        self._stop = False
+        # órdenes + er por una conexión propia sin md
+        self._orders = PrimaryWS([], orders=True)
+        self._orders.quotes = _ShmQuotes(self)
+        self._rec = TickRecorder(settings.tick_dir) if settings.tick_record else None
+        for j, s in enumerate(self.symbols):
+            self._assign[s] = j % self.n_shards
+            self._new_row(s)
+        self._ids = dict(self.rows)
+
+    # órdenes / er / oms / risk van a la conexión de órdenes
+    def __getattr__(self, k):
+        if k.startswith("__") or k == "_orders":
+            raise AttributeError(k)
+        return getattr(self._orders, k)
+
+    @property
+    def risk(self): return self._orders.risk
+    @risk.setter
+    def risk(self, v): self._orders.risk = v
+
+    def _release(self, i: int, k: Optional[int]):
+        """da de baja la fila i; si un shard vivo la escribía, queda retenida hasta su ack"""
+        self.active[i] = False
+        if k is not None and k < len(self._workers):
+            self._retire.append((i, k, self._gen[k] + 1))   # gen del mensaje que sale al final de update_symbols
+        else:
+            self.table.clear(i); self._free.append(i)
+
+    def _reclaim(self):
+        keep = []
+        for i, k, g in self._retire:
+            if self.rings[k].acked() >= g:
+                self.table.clear(i); self._free.append(i)
+            else:
+                keep.append((i, k, g))
+        self._retire = keep
+
+    def _new_row(self, s: str) -> Optional[int]:
+        if not self._free:
+            self._reclaim()
+        if self._free:
+            i = self._free.pop()
+            self.names[i] = s
+        elif len(self.names) < self.table.capacity:
+            i = len(self.names)
+            self.names.append(s)
+        else:
+            return None
+        old = self.rows.get(s)
+        if old is not None:
+            self._release(old, self._assign.get(s))
+        self.rows[s] = i
+        self.active[i] = True
+        return i
+
+    def _shard_rows(self, k: int) -> Dict[str, int]:
+        return {s: self.rows[s] for s in self.symbols if self._assign.get(s) == k}
+
+    def subscribed_symbols(self) -> List[str]: return list(self.symbols)
+    def token_value(self) -> str: return self._orders.token
+    def new_cl_ord_id(self) -> str: return self._orders.new_cl_ord_id()
+    # lo que declara DataFeedWS va explícito: __getattr__ no corre para métodos del base (el stub ganaría)
+    async def cancel(self, cl_ord_id: str): await self._orders.cancel(cl_ord_id)
+
+    def snapshot(self) -> QuoteSnapshot:
+        return self.table.snapshot(self._ids, len(self.names), self.active)
+
+    def book(self, symbol: str) -> Optional[DepthBook]:
+        i = self._ids.get(symbol)
+        if i is None or not self.active[i]:
+            return None
+        b = self._books.get(symbol)
+        if b is None:
+            b = self._books[symbol] = DepthBook(self.depth)
+        return b if self.table.book_into(i, b) else None
+
+    def _start_shards(self):
+        ctx = mp.get_context("spawn")
+        for k in range(self.n_shards):
+            r = self.rings[k]
+            args = (k, self.table.name, self.table.capacity, self.depth, r.name, r.capacity,
+                    self._shard_rows(k), self._orders.token)
+            if self.mode == "thread":
+                q = queue.Queue()
+                h = threading.Thread(target=_shard_proc, args=args + (q,), name=f"md-shard-{k}", daemon=True)
+            else:
+                q = ctx.Queue()
+                h = ctx.Process(target=_shard_proc, args=args + (q,), name=f"md-shard-{k}", daemon=True)
+            h.start()
+            self._workers.append((q, h))
+
+    async def run(self):
+        t = asyncio.create_task(self._orders.run())
+        # el token de la conexión de órdenes se reusa en los shards (un login en vez de N+1)
+        while not self._orders.token and not self._stop and not t.done():
+            await asyncio.sleep(0.1)
+        if not self._stop:
+            self._start_shards()
+        await t
+
+    async def update_symbols(self, new_symbols: List[str]):
+        new = sorted(set(new_symbols))
+        keep = set(new)
+        changed: Set[int] = set()
+        for s in self.symbols:
+            if s not in keep:
+                k = self._assign.pop(s)
+                changed.add(k)
+                self._release(self.rows.pop(s), k)
+                self._books.pop(s, None)
+        load = [0] * self.n_shards
+        for k in self._assign.values():
+            load[k] += 1
+        for s in new:
+            if s in self._assign:
+                continue
+            if self._new_row(s) is None:
+                raise RuntimeError("tabla shm llena: subir md_shm_capacity")
+            k = load.index(min(load))
+            self._assign[s] = k; load[k] += 1; changed.add(k)
+        # rebalanceo: del más cargado al más liviano hasta quedar a lo sumo 1 de diferencia
+        while max(load) - min(load) > 1:
+            src, dst = load.index(max(load)), load.index(min(load))
+            s = next(x for x in reversed(new) if self._assign[x] == src)
+            if self._new_row(s) is None:
+                break
+            self._assign[s] = dst
+            load[src] -= 1; load[dst] += 1
+            changed.update((src, dst))
+        self.symbols = new
+        self._ids = dict(self.rows)
+        for k in changed:
+            if k < len(self._workers):
+                self._gen[k] += 1
+                self._workers[k][0].put(("symbols", self._shard_rows(k), self._gen[k]))
+        if self._orders._trace:
+            self._orders._trace.log("md.resub", symbols=len(self.symbols), shards=self.n_shards, moved=sorted(changed))
+
+    def _dirty(self, ch) -> Set[str]:
+        for i in ch:
+            # ts de recepción en el shard (monotonic es del sistema: comparable entre procesos)
+            LATENCY.md_seen(self.names[i], int(self.table.i64[i, 4]))
+        if self._rec:
+            snap = self.snapshot()
+            for i in ch:
+                q = snap.get(self.names[i])
+                if q is not None:
+                    self._rec.write(self.names[i], q.bid, q.ask, q.bid_qty, q.ask_qty, q.ts_ns)
+        return {self.names[i] for i in ch}
+
+    def _scan(self) -> np.ndarray:
+        """fallback: filas cuyo seq cambió desde el último barrido (O(n))"""
+        n = len(self.names)
+        seq = self.table.seqs(n)
+        if len(self._seen) < n:
+            self._seen = np.concatenate((self._seen, np.zeros(n - len(self._seen), dtype=np.int64)))
+        ch = np.flatnonzero((seq != self._seen) & self.active[:n])
+        self._seen = seq
+        return ch
+
+    def _drain(self) -> Set[str]:
+        """filas tocadas según los rings (O(eventos)); si alguno se perdió eventos, barrido completo"""
+        got, rescan = [], False
+        for k, r in enumerate(self.rings):
+            self._cur[k], rows = r.read(self._cur[k])
+            if rows is None:
+                rescan = True; self.lapped += 1
+            elif len(rows):
+                got.append(rows)
+        if rescan:
+            return self._dirty(self._scan())
+        if not got:
+            return set()
+        ch = np.unique(np.concatenate(got)) if len(got) > 1 else np.unique(got[0])
+        return self._dirty(ch[self.active[ch]])
+
+    async def wait_updates(self, timeout: float) -> Set[str]:
+        """
+        igual que PrimaryWS.wait_updates, pero mirando los rings cada md_shm_poll_ms:
+        los ticks llegan por memoria compartida, no por el loop
+        """
+        t_end = time.monotonic() + timeout
+        while True:
+            dirty = self._drain()
+            if dirty or self._stop or time.monotonic() >= t_end:
+                return dirty
+            await asyncio.sleep(self._poll_s)
+
+    def status(self) -> dict:
+        return {
+            "shards": self.n_shards, "mode": self.mode, "symbols": len(self.symbols),
+            "rows": len(self.names), "capacity": self.table.capacity, "lapped": self.lapped,
+            "free_rows": len(self._free), "retiring": len(self._retire),
+            "per_shard": [sum(1 for v in self._assign.values() if v == k) for k in range(self.n_shards)],
+            "alive": [bool(h.is_alive()) for _, h in self._workers],
+        }
+
+    async def stop(self):
+        self._stop = True
+        for q, _ in self._workers:
+            try: q.put(("stop",))
+            except Exception: pass
+        for _, h in self._workers:
+            await asyncio.to_thread(h.join, 3.0)
+            if h.is_alive() and hasattr(h, "terminate"):
+                h.terminate()
+        self._workers.clear()
+        await self._orders.stop()
+        if self._rec: self._rec.close()
+        self.table.close()
+        for r in self.rings: r.close()
@@ -0,0 +1,184 @@
+import os
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+import numpy as np
+
+from .book import DepthBook
+from .quotes import QuoteSnapshot
+
+# tabla de quotes en shared memory, una fila por símbolo con seqlock (un escritor por fila);
+# ShmRing: filas tocadas por escritor, para no barrer la tabla
+
+HDR = 5          # seq, ts_ns, n_bid, n_ask, t_recv
+
+class ShmQuoteTable:
+    def __init__(self, capacity: int, depth: int, name: Optional[str] = None, create: bool = True):
+        self.capacity = int(capacity)
+        self.depth = int(depth)
+        self.width = HDR + 4 * self.depth
+        size = self.capacity * self.width * 8
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+        self.tab = np.ndarray((self.capacity, self.width), dtype=np.float64, buffer=self.shm.buf)
+        self.i64 = self.tab.view(np.int64)
+        if create:
+            self.tab[:] = 0
+        self._good = np.zeros_like(self.tab)     # última lectura consistente (fallback del lector)
+        D = self.depth
+        self._bp, self._bq = slice(HDR, HDR + D), slice(HDR + D, HDR + 2 * D)
+        self._ap, self._aq = slice(HDR + 2 * D, HDR + 3 * D), slice(HDR + 3 * D, HDR + 4 * D)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, depth: int) -> "ShmQuoteTable":
+        return cls(capacity, depth, name=name, create=False)
+
+    # ---- escritor (uno por fila) ----
+    def write(self, i: int, book: DepthBook, ts_ns: int, t_recv: int = 0):
+        row, r64 = self.tab[i], self.i64[i]
+        s = int(r64[0])
+        r64[0] = s + 1                                  # impar: escribiendo
+        nb = min(book.n_bid, self.depth); na = min(book.n_ask, self.depth)
+        row[2] = nb; row[3] = na
+        row[self._bp] = 0; row[self._bq] = 0; row[self._ap] = 0; row[self._aq] = 0
+        row[HDR:HDR + nb] = book.bid_px[:nb]; row[HDR + self.depth:HDR + self.depth + nb] = book.bid_qty[:nb]
+        a0 = HDR + 2 * self.depth
+        row[a0:a0 + na] = book.ask_px[:na]; row[a0 + self.depth:a0 + self.depth + na] = book.ask_qty[:na]
+        r64[1] = ts_ns; r64[4] = t_recv
+        r64[0] = s + 2                                  # par: consistente
+
+    def clear(self, i: int):
+        """deja la fila sin dato (ts_ns = 0) para reusarla; sólo con la fila sin escritor"""
+        r64 = self.i64[i]
+        s = int(r64[0])
+        r64[0] = s + 1
+        self.tab[i, 1:] = 0
+        r64[0] = s + 2                                  # seq sigue creciendo: los lectores ven el cambio
+
+    # ---- lector ----
+    def read(self, n: int, tries: int = 16) -> np.ndarray:
+        """copia consistente de las primeras n filas"""
+        # el seq se lee aparte antes y después de la copia (memcpy no garantiza el orden de lectura)
+        s1 = self.i64[:n, 0].copy()
+        a = self.tab[:n].copy()
+        s2 = self.i64[:n, 0].copy()
+        bad = np.flatnonzero((s1 & 1) | (s1 != s2))
+        for t in range(tries):
+            if not len(bad):
+                break
+            if t >= 2:
+                os.sched_yield()        # escritor desalojado a mitad de fila: cederle el core
+            s1[bad] = self.i64[bad, 0]
+            a[bad] = self.tab[bad]
+            s2[bad] = self.i64[bad, 0]
+            bad = bad[((s1[bad] & 1) | (s1[bad] != s2[bad])) != 0]
+        a.view(np.int64)[:, 0] = s1
+        if len(bad):
+            # no se pudo: última copia buena de esas filas (vieja pero consistente)
+            a[bad] = self._good[bad]
+        self._good[:n] = a
+        return a
+
+    def seqs(self, n: int) -> np.ndarray:
+        return self.i64[:n, 0].copy()
+
+    def book_into(self, i: int, b: DepthBook, tries: int = 8) -> bool:
+        """copia consistente de una fila al DepthBook `b`; False si no hay dato"""
+        for t in range(tries):
+            if t >= 2: os.sched_yield()
+            s1 = int(self.i64[i, 0])
+            if s1 & 1: continue
+            row = self.tab[i].copy()
+            if int(self.i64[i, 0]) == s1: break
+        else:
+            return False
+        if not s1 or not row.view(np.int64)[1]: return False      # nunca escrita / limpiada para reuso
+        nb, na = int(row[2]), int(row[3])
+        b.n_bid, b.n_ask = nb, na
+        b.bid_px[:nb] = row[self._bp][:nb]; b.bid_qty[:nb] = row[self._bq][:nb]
+        b.ask_px[:na] = row[self._ap][:na]; b.ask_qty[:na] = row[self._aq][:na]
+        return True
+
+    def snapshot(self, ids, n: int, active: Optional[np.ndarray] = None) -> QuoteSnapshot:
+        """vista QuoteSnapshot (top-of-book) sobre una copia consistente; `active` enmascara ids dados de baja"""
+        a = self.read(n)
+        a64 = a.view(np.int64)
+        D = self.depth
+        nb, na = a[:, 2] > 0, a[:, 3] > 0
+        px = np.column_stack((np.where(nb, a[:, HDR], 0.0), np.where(na, a[:, HDR + 2 * D], 0.0),
+                              np.where(nb, a[:, HDR + D], 0.0), np.where(na, a[:, HDR + 3 * D], 0.0)))
+        seq = a64[:, 0].copy()
+        seq[a64[:, 1] == 0] = 0                         # filas limpiadas (ts 0) = sin dato
+        if active is not None:
+            seq[~active[:n]] = 0
+        return QuoteSnapshot(px, a64[:, 1].copy(), seq, ids, n)
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self._owner: self.shm.unlink()
+        except Exception:
+            pass
+
+class ShmRing:
+    """
+    cola circular en shm de eventos "fila tocada", de UN escritor (el shard) y lector con cursor propio.
+    head (int64, sólo crece) hace de secuencia: el slot se escribe antes de publicar head+1.
+    si el lector se atrasa más que la capacidad (o lo pisan mientras lee) => None: re-escanear la tabla.
+    """
+    def __init__(self, capacity: int = 65536, name: Optional[str] = None, create: bool = True):
+        self.capacity = int(capacity)
+        size = (8 + self.capacity) * 8             # head + padding a 64 bytes, después los slots
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._owner = create
+        self.buf = np.ndarray((8 + self.capacity,), dtype=np.int64, buffer=self.shm.buf)
+        self.slots = self.buf[8:]
+        if create:
+            self.buf[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    # buf[1]: última generación de filas que el escritor aplicó (ack de "dejé de escribir las filas viejas")
+    def set_ack(self, gen: int):
+        self.buf[1] = gen
+
+    def acked(self) -> int:
+        return int(self.buf[1])
+
+    @classmethod
+    def attach(cls, name: str, capacity: int) -> "ShmRing":
+        return cls(capacity, name=name, create=False)
+
+    def push(self, row: int):
+        h = int(self.buf[0])
+        self.slots[h % self.capacity] = row
+        self.buf[0] = h + 1
+
+    def head(self) -> int:
+        return int(self.buf[0])
+
+    def read(self, cursor: int) -> Tuple[int, Optional[np.ndarray]]:
+        """-> (cursor nuevo, filas tocadas desde `cursor`) ; filas None = se perdieron eventos"""
+        h = int(self.buf[0])
+        if h == cursor:
+            return h, _EMPTY
+        if h - cursor > self.capacity:
+            return h, None
+        rows = self.slots[np.arange(cursor, h) % self.capacity]
+        if int(self.buf[0]) - cursor > self.capacity:
+            return int(self.buf[0]), None           # el escritor dio la vuelta mientras copiábamos
+        return h, rows
+
+    def close(self):
+        try:
+            self.shm.close()
+            if self._owner: self.shm.unlink()
+        except Exception:
+            pass
+
+_EMPTY = np.zeros(0, dtype=np.int64)
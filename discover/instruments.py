@@ -1,21 +1,24 @@
-import requests
 from settings import settings
+from util.rest import rest_client
 
-def fetch_all_symbols() -> list[dict]:
+async def fetch_all_symbols() -> list[dict]:
     rest, _ = settings.urls()
-    r = requests.get(f"{rest}/rest/instruments/all", timeout=settings.primary_timeout_s)
-    r.raise_for_status()
+    r = await rest_client().get(f"{rest}/rest/instruments/all", timeout=settings.primary_timeout_s)
     j = r.json()
     return j if isinstance(j, list) else j.get("instruments", [])
 
-def build_pairs() -> list[tuple[str,str]]:
-    items = fetch_all_symbols()
-    exists = {it.get("symbol",""): it for it in items if it.get("symbol")}
+def pairs_from_symbols(symbols) -> list[tuple[str,str]]:
+    """pares (XXX, XXXD) con ambas patas presentes"""
+    exists = set(symbols)
     pairs: list[tuple[str,str]] = []
-    for sym in list(exists.keys()):
+    for sym in exists:
         if sym.endswith("D"):
             usd = sym
             ars = sym[:-1]
             if ars in exists:
                 pairs.append((ars, usd))
     return sorted(list({tuple(p) for p in pairs}))
+
+async def build_pairs() -> list[tuple[str,str]]:
+    items = await fetch_all_symbols()
+    return pairs_from_symbols(it.get("symbol","") for it in items if it.get("symbol"))
@@ -0,0 +1,204 @@
+import csv, os, threading, time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+import pandas as pd
+from settings import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:          # sin pyarrow: sólo csv
+    pa = pq = None
+
+# journal de trades append-only (señales + fills) escrito por un thread de fondo a csv / parquet del día;
+# ts ISO UTC, pnl realizado en ARS por bono (ARS + D, el lado USD al mep_ref de la leg)
+
+COLUMNS = ["ts", "kind", "pair", "dir", "implied", "mep_ref", "nom", "px_ars", "px_usd",
+           "symbol", "side", "fill_qty", "fill_px", "cost", "ccy", "pos", "realized_pnl", "cl_ord_id"]
+_FLOATS = {"implied", "mep_ref", "px_ars", "px_usd", "fill_qty", "fill_px", "cost", "pos", "realized_pnl", "nom"}
+
+def _utc_iso(v=None) -> str:
+    """un solo formato de ts para señales y fills: ISO 8601 en UTC (naive = UTC, como los ts_ns del feed)"""
+    try:
+        t = pd.Timestamp(v) if v is not None and v != "" else pd.Timestamp.now(tz="UTC")
+    except Exception:
+        t = pd.Timestamp.now(tz="UTC")
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return t.isoformat()
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y%m%d")
+
+class TradeJournal:
+    def __init__(self, csv_path: str, journal_dir: Optional[str] = None, tail: Optional[int] = None,
+                 flush_s: Optional[float] = None):
+        self.csv_path = csv_path
+        self.dir = journal_dir or settings.journal_dir
+        self.flush_s = max(0.05, float(settings.journal_flush_ms if flush_s is None else flush_s * 1000) / 1000)
+        self.tail: Deque[dict] = deque(maxlen=int(settings.journal_tail if tail is None else tail))
+        self._q: Deque[dict] = deque()
+        self._pos: Dict[str, Tuple[float, float]] = {}     # par (o símbolo suelto) -> (nominales, costo promedio ARS)
+        self._leg: Dict[str, tuple] = {}                   # símbolo -> (par, dir, mep_ref) de la última señal
+        self._ref: Dict[str, float] = {}                   # par -> último mep_ref visto
+        self.realized: Dict[str, float] = {}               # moneda -> pnl realizado
+        self.n_signals = self.n_fills = 0
+        self.written = self.errors = 0
+        self._day = None
+        self._f = self._w = self._pq = None
+        self._pq_path = None
+        os.makedirs(self.dir, exist_ok=True)
+        self._stop = False
+        self._wake = threading.Event()
+        self._th = threading.Thread(target=self._run, name="trade-journal", daemon=True)
+        self._th.start()
+
+    # ---- lado loop ----
+    def _put(self, rec: dict):
+        self.tail.append(rec)
+        self._q.append(rec)
+
+    def signals(self, rows: List[dict]):
+        """filas de run_a2u / run_u2a (una por leg lanzado)"""
+        for r in rows:
+            rec = dict(r, kind="signal", ts=_utc_iso(r.get("ts")))
+            pair = str(r.get("pair", ""))
+            a, _, u = pair.partition(":")
+            for s in (a, u):
+                if s: self._leg[s.upper()] = (pair, r.get("dir"), r.get("mep_ref"))
+            if r.get("mep_ref"): self._ref[pair] = float(r["mep_ref"])
+            self.n_signals += 1
+            self._put(rec)
+
+    def on_er(self, er):
+        status = (er.status or "").upper()
+        if status not in ("FILLED", "PARTIALLY_FILLED"):
+            return
+        q, px = float(er.qty or 0), float(er.price or 0)
+        if q <= 0:
+            return
+        sym = (er.symbol or "").upper()
+        side = (er.side or "").upper()
+        ccy = "USD" if sym.endswith("D") else "ARS"
+        pair, dr, ref = self._leg.get(sym, (None, None, None))
+        # una posición por bono (especie ARS + D juntas): la leg compra una y vende la otra, así el
+        # pnl se realiza al cerrarla. el lado USD se valúa en ARS al mep_ref de la señal de la leg
+        ref = ref or self._ref.get(pair)
+        if ccy == "USD" and not ref:
+            key, px_a = sym, px                            # sin ref: sólo contra la misma especie
+        else:
+            key, px_a = pair or sym, px * (ref if ccy == "USD" else 1.0)
+        pos, avg = self._pos.get(key, (0.0, 0.0))
+        d = q if side == "BUY" else -q
+        pnl = 0.0
+        if pos == 0 or (pos > 0) == (d > 0):
+            avg = (abs(pos) * avg + q * px_a) / (abs(pos) + q)
+        else:
+            close = min(q, abs(pos))
+            pnl = close * (px_a - avg) * (1 if pos > 0 else -1)
+            if abs(d) > abs(pos): avg = px_a               # se dio vuelta: el resto abre al px del fill
+        pos += d
+        if pos == 0: avg = 0.0
+        self._pos[key] = (pos, avg)
+        pccy = ccy if key == sym and ccy == "USD" else "ARS"
+        if pnl:
+            self.realized[pccy] = self.realized.get(pccy, 0.0) + pnl
+        self.n_fills += 1
+        self._put(dict(ts=_utc_iso(er.ts), kind="fill", pair=pair, dir=dr, mep_ref=ref, symbol=sym, side=side,
+                       fill_qty=q, fill_px=px, cost=q * px, ccy=ccy, pos=pos, realized_pnl=pnl,
+                       cl_ord_id=er.cl_ord_id))
+
+    def tail_rows(self, n: Optional[int] = None) -> List[dict]:
+        rows = list(self.tail)
+        return rows[-n:] if n else rows
+
+    def status(self) -> dict:
+        return dict(signals=self.n_signals, fills=self.n_fills, realized=dict(self.realized),
+                    written=self.written, errors=self.errors, queued=len(self._q),
+                    parquet=self._pq_path if self._pq else None)
+
+    # ---- thread de fondo ----
+    def _rotate_csv(self, day: str):
+        try:
+            if os.path.exists(self.csv_path) and os.path.getsize(self.csv_path) > 0:
+                dst = os.path.join(self.dir, f"trades_{day}.csv")
+                k = 1
+                while os.path.exists(dst):
+                    dst = os.path.join(self.dir, f"trades_{day}.{k}.csv"); k += 1
+                os.replace(self.csv_path, dst)
+        except Exception:
+            self.errors += 1
+
+    def _open_day(self, day: str):
+        self._close_day()
+        # csv vivo de otro día (o de antes del journal, con otro header) => se archiva
+        try:
+            with open(self.csv_path, "r", encoding="utf-8") as f:
+                head = f.readline().strip()
+            old = _day(os.path.getmtime(self.csv_path))
+            if head != ",".join(COLUMNS) or old != day:
+                self._rotate_csv(old)
+        except OSError:
+            pass
+        new = not os.path.exists(self.csv_path) or os.path.getsize(self.csv_path) == 0
+        self._f = open(self.csv_path, "a", encoding="utf-8", newline="")
+        self._w = csv.DictWriter(self._f, fieldnames=COLUMNS, extrasaction="ignore")
+        if new:
+            self._w.writeheader()
+        if pq is not None:
+            # parquet no admite append: un archivo por sesión y día, row group por flush
+            p = os.path.join(self.dir, f"trades_{day}.parquet")
+            k = 1
+            while os.path.exists(p):
+                p = os.path.join(self.dir, f"trades_{day}.{k}.parquet"); k += 1
+            self._pq_path = p
+        self._day = day
+
+    def _close_day(self):
+        try:
+            if self._f: self._f.close()
+            if self._pq: self._pq.close()
+        except Exception:
+            self.errors += 1
+        self._f = self._w = self._pq = None
+
+    def _flush(self):
+        n = len(self._q)
+        if not n:
+            return
+        batch = [self._q.popleft() for _ in range(n)]
+        day = _day(time.time())
+        if day != self._day:
+            if self._day is not None:
+                self._close_day()
+                self._rotate_csv(self._day)
+            self._open_day(day)
+        try:
+            self._w.writerows(batch)
+            self._f.flush()
+            self.written += len(batch)
+        except Exception:
+            self.errors += 1
+        if pq is not None:
+            try:
+                cols = {c: [(float(r[c]) if r.get(c) is not None else None) if c in _FLOATS
+                            else (None if r.get(c) is None else str(r[c])) for r in batch] for c in COLUMNS}
+                t = pa.table({c: pa.array(v, type=pa.float64() if c in _FLOATS else pa.string())
+                              for c, v in cols.items()})
+                if self._pq is None:
+                    self._pq = pq.ParquetWriter(self._pq_path, t.schema)
+                self._pq.write_table(t)
+            except Exception:
+                self.errors += 1
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_s)
+            self._flush()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._th.join(timeout=2.0)
+        self._flush()
+        self._close_day()
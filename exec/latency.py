@@ -1,54 +1,183 @@
-import asyncio, statistics, time
-from collections import deque
-from typing import Optional
+import asyncio, time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
 from settings import settings
 from util.trace import Trace
+from util.hist import LatencyHist, P2Quantile
 
-class RTTMedian:
-    def __init__(self, maxlen: int = 60):
-        self.buf = deque(maxlen=maxlen)
-        self.last_ms: Optional[float] = None
+# (ts tick, ts señal) de la señal que originó la orden en curso; lo hereda el task del leg
+_SIGNAL: ContextVar[Optional[Tuple[int, int]]] = ContextVar("mesita_signal", default=None)
 
-    def add(self, ms: float):
-        self.last_ms = float(ms)
-        self.buf.append(self.last_ms)
+class StageLatency:
+    """
+    latencia por etapa con timestamps monotónicos (time.monotonic_ns), atados por símbolo (md)
+    y por clOrdId (órdenes), a histogramas HDR (util/hist.py):
+      md.decode        ws recv -> mensaje decodificado
+      md.store         decodificado -> quote en la tabla
+      tick_to_eval     tick -> el loop re-evalúa el par (cola del loop)
+      tick_to_signal   tick -> señal disparada
+      signal_to_send   señal -> orden entregada al socket (incluye pre-trade)
+      ws.send          duración del send
+      send_to_er       orden enviada -> primer er de ese clOrdId
+      tick_to_er       tick -> primer er (punta a punta)
+      probe.rtt        rtt de los probes
+    rtt pasivo: cada envío -> primer er (órdenes reales y probes) alimenta un estimador P² del
+    cuantil REF_Q (rtt_ms()); los probes se registran con probe() y no cuentan como tráfico real.
+    con md en otro proceso (datafeed/sharded.py) las etapas md.* quedan en el proceso del feed.
+    """
+    STAGES = ("md.decode", "md.store", "tick_to_eval", "tick_to_signal", "signal_to_send",
+              "ws.send", "send_to_er", "tick_to_er", "probe.rtt")
+
+    def __init__(self, max_orders: int = 10_000):
+        self.h: Dict[str, LatencyHist] = {k: LatencyHist() for k in self.STAGES}
+        self._md: Dict[str, int] = {}                                   # símbolo -> ts recv del último tick
+        self._orders: "OrderedDict[str, Tuple[int, int, bool]]" = OrderedDict()   # clOrdId -> (ts tick, ts send, probe)
+        self.max_orders = max_orders
+        self.rtt_q = float(settings.REF_Q)
+        self.rtt = P2Quantile(self.rtt_q)
+        self._rtt_recent: deque = deque(maxlen=512)        # para re-sembrar si cambia REF_Q
+        self.last_real_ns = 0                               # último envío de una orden real
+        self._probe_next: Optional[str] = None              # clOrdId del probe por salir (uno a la vez)
+        self.probes_sent = 0
+
+    def record(self, stage: str, ns: int):
+        h = self.h.get(stage)
+        if h is None:
+            h = self.h[stage] = LatencyHist()
+        h.record(ns)
+
+    # ---- md ----
+    def md(self, sym: str, t_recv: int, t_dec: int, t_store: int):
+        self.h["md.decode"].record(t_dec - t_recv)
+        self.h["md.store"].record(t_store - t_dec)
+        self._md[sym] = t_recv
+
+    def md_seen(self, sym: str, t_recv: int):
+        if t_recv > 0:
+            self._md[sym] = t_recv
+
+    def eval(self, syms: Iterable[str]):
+        now = time.monotonic_ns()
+        h = self.h["tick_to_eval"]
+        for s in syms:
+            t = self._md.get(s)
+            if t: h.record(now - t)
+
+    # ---- órdenes ----
+    def signal(self, syms: Iterable[str]) -> Tuple[int, int]:
+        """marca la señal -> (ts tick, ts señal); bind() la ata a la primera orden que salga después"""
+        now = time.monotonic_ns()
+        t_tick = max((self._md.get(s, 0) for s in syms), default=0)
+        if t_tick:
+            self.h["tick_to_signal"].record(now - t_tick)
+        return t_tick, now
+
+    @staticmethod
+    def bind(sig: Optional[Tuple[int, int]]):
+        """contexto del leg (task propio con el scheduler): las órdenes que salgan acá son de esta señal"""
+        _SIGNAL.set(sig)
 
-    def median_ms(self) -> Optional[float]:
-        if not self.buf: return None
-        return float(statistics.median(self.buf))
+    def probe(self, cl_ord_id: str):
+        """la próxima orden con este clOrdId es un probe (antes de mandarla)"""
+        self._probe_next = cl_ord_id
+        self.probes_sent += 1
+
+    def on_send(self, cl_ord_id: str, t0: int, t1: int):
+        self.h["ws.send"].record(t1 - t0)
+        # probe-ness va en la entrada de _orders: se va con ella (er o desalojo), nada queda colgado
+        is_probe = cl_ord_id == self._probe_next
+        if is_probe:
+            self._probe_next = None
+        else:
+            self.last_real_ns = t1
+        sig = _SIGNAL.get()
+        t_tick = 0
+        if sig is not None:
+            t_tick, t_sig = sig
+            self.h["signal_to_send"].record(t0 - t_sig)
+            _SIGNAL.set(None)            # el resto de las órdenes del leg (venta, unwind) no son de la señal
+        self._orders[cl_ord_id] = (t_tick, t1, is_probe)
+        while len(self._orders) > self.max_orders:
+            self._orders.popitem(last=False)
+
+    def on_er(self, cl_ord_id: Optional[str], t_recv: int):
+        e = self._orders.pop(cl_ord_id or "", None)
+        if e is None:
+            return
+        t_tick, t_send, is_probe = e
+        rtt = t_recv - t_send
+        if is_probe:
+            self.h["probe.rtt"].record(rtt)
+        else:
+            self.h["send_to_er"].record(rtt)
+        if t_tick:
+            self.h["tick_to_er"].record(t_recv - t_tick)
+        ms = rtt / 1e6
+        self.rtt.add(ms)
+        self._rtt_recent.append(ms)
+
+    def idle_s(self) -> float:
+        """segundos sin órdenes reales (los probes no cuentan)"""
+        if not self.last_real_ns:
+            return float("inf")
+        return (time.monotonic_ns() - self.last_real_ns) / 1e9
+
+    def rtt_ms(self) -> Optional[float]:
+        """cuantil REF_Q del rtt (ms); si cambió REF_Q se rearma el P² con las muestras recientes"""
+        q = float(settings.REF_Q)
+        if q != self.rtt_q:
+            self.rtt_q, self.rtt = q, P2Quantile(q)
+            for x in self._rtt_recent: self.rtt.add(x)
+        return self.rtt.value()
+
+    def rtt_status(self) -> dict:
+        v = self.rtt_ms()
+        idle = self.idle_s()
+        return dict(q=self.rtt_q, rtt_ms=None if v is None else round(v, 3), n=self.rtt.n,
+                    idle_s=None if idle == float("inf") else round(idle, 1), probes=self.probes_sent)
+
+    def status(self) -> Dict[str, dict]:
+        """etapas con muestras -> {n, p50, p90, p99, max, mean} en µs"""
+        return {k: h.summary() for k, h in self.h.items() if h.n}
+
+LATENCY = StageLatency()
 
 async def periodic_latency_probe(feed, tracer: Optional[Trace], ref_obj, stop_evt: asyncio.Event):
     """
-    manda BUY IOC con precio minúsculo (no ejecuta) y mide RTT por clOrdId.
-    ajusta HALF_LIFE_S = clamp(REF_K * median_rtt, [REF_MIN_HL_S, REF_MAX_HL_S]) si REF_TUNE=true.
+    el rtt se mide pasivo con las órdenes reales (LATENCY: envío -> primer er); el probe
+    (BUY 1 @ 0.01 IOC, no ejecuta) sale sólo si no hubo órdenes reales en los últimos LAT_PROBE_S.
+    el er del probe lo mide LATENCY como cualquier otro: acá no se espera ni se roba ningún er.
+    ajusta HALF_LIFE_S = clamp(REF_K * rtt_q, [REF_MIN_HL_S, REF_MAX_HL_S]) si REF_TUNE=true,
+    con rtt_q = cuantil REF_Q (P²) del rtt.
     """
-    est = RTTMedian(maxlen=120)
+    last_probe = 0.0
+    last_hl: Optional[float] = None
     while not stop_evt.is_set():
         try:
-            # probe: símbolo neutral (usa al30 si está suscripto, si no cualquiera)
-            syms = feed.subscribed_symbols() or ["AL30"]
-            sym = "AL30" if "AL30" in syms else syms[0]
-            t0 = time.time()
-            clid = await feed.send_limit(symbol=sym, side="BUY", qty=1, price=0.01, tif="IOC")
-            # esperar er del mismo clOrdId
-            while True:
-                er = await feed.next_exec_report()
-                if er.cl_ord_id == clid:
-                    rtt_ms = (time.time() - t0) * 1000.0
-                    est.add(rtt_ms)
-                    if tracer: tracer.log("latency.rtt", symbol=sym, rtt_ms=rtt_ms)
-                    break
-
-            med = est.median_ms()
-            if settings.REF_TUNE and med is not None:
-                target = settings.REF_K * (med/1000.0)
+            win = max(1.0, float(settings.LAT_PROBE_S))
+            if LATENCY.idle_s() >= win and time.monotonic() - last_probe >= win:
+                # probe: símbolo neutral (usa al30 si está suscripto, si no cualquiera)
+                syms = feed.subscribed_symbols() or ["AL30"]
+                sym = "AL30" if "AL30" in syms else syms[0]
+                clid = feed.new_cl_ord_id()
+                LATENCY.probe(clid)
+                last_probe = time.monotonic()
+                await feed.send_limit(symbol=sym, side="BUY", qty=1, price=0.01, tif="IOC", cl_ord_id=clid)
+                if tracer: tracer.log("latency.probe", symbol=sym, clOrdId=clid)
+
+            rtt = LATENCY.rtt_ms()
+            if settings.REF_TUNE and rtt is not None:
+                target = settings.REF_K * (rtt/1000.0)
                 hl = max(settings.REF_MIN_HL_S, min(settings.REF_MAX_HL_S, target))
                 # actualizar settings y el ref en caliente
                 settings.HALF_LIFE_S = hl
                 if hasattr(ref_obj, "set_half_life"):
                     ref_obj.set_half_life(hl)
-                if tracer: tracer.log("latency.hlf_update", median_ms=med, new_hl_s=hl)
+                if tracer and (last_hl is None or abs(hl - last_hl) > 0.01 * last_hl):
+                    tracer.log("latency.hlf_update", q=settings.REF_Q, rtt_ms=rtt, new_hl_s=hl)
+                last_hl = hl
         except Exception:
-            # silencioso; seguimos probando
+            # silencioso; seguimos midiendo
             pass
-        await asyncio.sleep(max(1.0, float(settings.LAT_PROBE_S)))
+        await asyncio.sleep(1.0)
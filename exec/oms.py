@@ -0,0 +1,105 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from datafeed.base import ExecReport, FILL_STATUSES, DONE_STATUSES
+
+# estado de nuestras órdenes por clOrdId (y orderId): PENDING_NEW -> NEW -> PARTIALLY_FILLED -> FILLED
+# o CANCELLED / REJECTED / EXPIRED; lo alimentan on_send y el hook de er del ERRouter
+
+@dataclass
+class OrderState:
+    cl_ord_id: str
+    symbol: str
+    side: str
+    qty: int
+    price: Optional[float]
+    tif: str
+    status: str = "PENDING_NEW"
+    order_id: Optional[str] = None
+    cum_qty: float = 0.0
+    leaves_qty: float = 0.0
+    avg_px: float = 0.0
+    ts_sent: float = field(default_factory=time.time)
+    ts_update: float = 0.0
+    cancel_sent: bool = False
+    replaced_by: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in DONE_STATUSES
+
+    def as_dict(self) -> dict:
+        return dict(clOrdId=self.cl_ord_id, orderId=self.order_id, symbol=self.symbol, side=self.side,
+                    qty=self.qty, price=self.price, tif=self.tif, status=self.status,
+                    cum=self.cum_qty, leaves=self.leaves_qty, avg_px=self.avg_px, cancel_sent=self.cancel_sent)
+
+class OMS:
+    def __init__(self, keep_done: int = 2000):
+        self.orders: Dict[str, OrderState] = {}
+        self.by_oid: Dict[str, str] = {}
+        self._open: Dict[str, OrderState] = {}
+        self._done: "OrderedDict[str, None]" = OrderedDict()     # terminadas, para er tardíos (acotado)
+        self._keep = keep_done
+
+    def on_send(self, cl_ord_id: str, symbol: str, side: str, qty: int, price: Optional[float], tif: str) -> OrderState:
+        o = OrderState(cl_ord_id, symbol, side.upper(), int(qty), price, tif.upper(), leaves_qty=float(qty))
+        self.orders[cl_ord_id] = o
+        self._open[cl_ord_id] = o
+        return o
+
+    def get(self, cl_ord_id: str) -> Optional[OrderState]:
+        return self.orders.get(cl_ord_id)
+
+    def by_order_id(self, order_id: str) -> Optional[OrderState]:
+        return self.orders.get(self.by_oid.get(order_id, ""))
+
+    def on_er(self, er: ExecReport):
+        o = self.orders.get(er.cl_ord_id or "") or self.by_order_id(er.order_id or "")
+        if o is None:
+            return
+        if er.order_id and o.order_id is None:
+            o.order_id = er.order_id
+            self.by_oid[er.order_id] = o.cl_ord_id
+        st = (er.status or "").upper()
+        if st in FILL_STATUSES and er.qty:
+            q = float(er.qty)
+            cum = o.cum_qty + q
+            o.avg_px = (o.avg_px * o.cum_qty + float(er.price or 0) * q) / cum
+            o.cum_qty = cum
+        # si el exchange manda los acumulados, mandan ellos
+        if er.cum_qty is not None: o.cum_qty = float(er.cum_qty)
+        if er.avg_px: o.avg_px = float(er.avg_px)
+        o.leaves_qty = float(er.leaves_qty) if er.leaves_qty is not None else max(o.qty - o.cum_qty, 0.0)
+        if st and not o.done:
+            o.status = st
+        o.ts_update = time.time()
+        if o.done:
+            o.leaves_qty = 0.0
+            self._retire(o)
+
+    def _retire(self, o: OrderState):
+        self._open.pop(o.cl_ord_id, None)
+        self._done[o.cl_ord_id] = None
+        while len(self._done) > self._keep:
+            clid, _ = self._done.popitem(last=False)
+            old = self.orders.pop(clid, None)
+            if old and old.order_id: self.by_oid.pop(old.order_id, None)
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[OrderState]:
+        return [o for o in self._open.values() if symbol is None or o.symbol == symbol]
+
+    def fail(self, cl_ord_id: str):
+        """la orden no llegó a salir (envío fallido)"""
+        o = self.orders.get(cl_ord_id)
+        if o is not None and not o.done:
+            o.status = "REJECTED"; o.leaves_qty = 0.0
+            self._retire(o)
+
+    def mark_cancel(self, cl_ord_id: str):
+        o = self.orders.get(cl_ord_id)
+        if o is not None: o.cancel_sent = True
+
+    def status(self, max_list: int = 50) -> dict:
+        op = list(self._open.values())
+        return dict(open=len(op), tracked=len(self.orders), orders=[o.as_dict() for o in op[:max_list]])
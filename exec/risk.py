@@ -0,0 +1,178 @@
+import time
+from typing import Dict, Optional
+from settings import settings
+from datafeed.base import FILL_STATUSES, DONE_STATUSES
+
+# control pre-trade en proceso (límites en settings, 0 = sin límite); las ventas nunca se bloquean
+
+def ccy_of(symbol: str) -> str:
+    return "USD" if (symbol or "").upper().endswith("D") else "ARS"
+
+class RiskReject(Exception):
+    def __init__(self, reason: str, **info):
+        super().__init__(reason)
+        self.reason = reason
+        self.info = info
+
+class RiskEngine:
+    def __init__(self, tracer=None):
+        self._tracer = tracer
+        self.cash: Dict[str, float] = {"ARS": 0.0, "USD": 0.0}
+        self.cash_ts = 0.0
+        self.fx = 0.0                                               # ARS por USD (para pasar notional USD a ARS)
+        self.reserved: Dict[str, float] = {"ARS": 0.0, "USD": 0.0}
+        self.spent: Dict[str, float] = {"ARS": 0.0, "USD": 0.0}     # fills de compra todavía no reflejados en cash
+        self.orders: Dict[str, dict] = {}                           # clOrdId -> orden abierta
+        self.by_oid: Dict[str, str] = {}                            # orderId -> clOrdId
+        self.pending: Dict[str, int] = {}                           # símbolo -> órdenes abiertas
+        self.pending_buy: Dict[str, int] = {}                       # símbolo -> nominales de compra pendientes
+        self.pos: Dict[str, int] = {}
+        self.day = time.strftime("%Y%m%d")
+        self.daily_notional_ars = 0.0
+        self.rejects = 0
+        self.last_reject: Optional[dict] = None
+
+    # ---- entradas desde el loop ----
+    def update(self, cash_ars: float, cash_usd: float, ts: float, fx: Optional[float] = None):
+        """cash de risk_poll / reconciler; un refresh más nuevo ya incluye lo gastado"""
+        if ts and ts > self.cash_ts:
+            self.cash_ts = ts
+            self.spent = {"ARS": 0.0, "USD": 0.0}
+        self.cash["ARS"] = float(cash_ars or 0.0)
+        self.cash["USD"] = float(cash_usd or 0.0)
+        if fx: self.fx = float(fx)
+
+    def set_positions(self, pos: Dict[str, int]):
+        self.pos = {k.upper(): int(v) for k, v in (pos or {}).items() if v}
+
+    def available(self, ccy: str) -> float:
+        return max(self.cash.get(ccy, 0.0) - self.reserved.get(ccy, 0.0) - self.spent.get(ccy, 0.0), 0.0)
+
+    def _to_ars(self, ccy: str, notional: float) -> float:
+        return notional if ccy == "ARS" else notional * self.fx
+
+    # ---- pre-trade ----
+    def _reject(self, reason: str, **info):
+        self.rejects += 1
+        self.last_reject = dict(ts=time.time(), reason=reason, **info)
+        if self._tracer: self._tracer.log("risk.reject", reason=reason, **info)
+        raise RiskReject(reason, **info)
+
+    def pre_trade(self, cl_ord_id: str, symbol: str, side: str, qty: int, px: Optional[float]):
+        """valida y registra la orden; levanta RiskReject si no pasa"""
+        sym = (symbol or "").upper()
+        ccy = ccy_of(sym)
+        qty = int(qty or 0)
+        px = float(px or 0.0)
+        buy = side.upper() == "BUY"
+        if settings.risk_enabled and buy:
+            day = time.strftime("%Y%m%d")
+            if day != self.day:
+                self.day, self.daily_notional_ars = day, 0.0
+            if px <= 0:
+                self._reject("no_px", symbol=sym, qty=qty)
+            notional = qty * px
+            if ccy != "ARS" and self.fx <= 0 and (settings.risk_per_trade_ars > 0 or settings.risk_daily_notional_ars > 0):
+                # sin tipo de cambio el notional en ARS daría 0 y se saltearía los caps en ARS
+                self._reject("no_fx", symbol=sym, notional=notional)
+            n_ars = self._to_ars(ccy, notional)
+            lim = settings.risk_per_trade_ars
+            if lim > 0 and n_ars > lim:
+                self._reject("per_trade", symbol=sym, notional_ars=n_ars, limit=lim)
+            lim = settings.risk_daily_notional_ars
+            if lim > 0 and self.daily_notional_ars + n_ars > lim:
+                self._reject("daily_notional", symbol=sym, notional_ars=n_ars, used=self.daily_notional_ars, limit=lim)
+            lim = settings.risk_max_open_orders
+            if lim > 0 and len(self.orders) >= lim:
+                self._reject("max_open_orders", symbol=sym, open=len(self.orders), limit=lim)
+            lim = settings.risk_max_pending_per_symbol
+            if lim > 0 and self.pending.get(sym, 0) >= lim:
+                self._reject("max_pending_symbol", symbol=sym, open=self.pending.get(sym, 0), limit=lim)
+            lim = settings.risk_max_pos_per_symbol
+            if lim > 0 and self.pos.get(sym, 0) + self.pending_buy.get(sym, 0) + qty > lim:
+                self._reject("max_pos_symbol", symbol=sym, pos=self.pos.get(sym, 0), pending=self.pending_buy.get(sym, 0), qty=qty, limit=lim)
+            avail = self.available(ccy)
+            if notional > avail:
+                self._reject("cash", symbol=sym, ccy=ccy, notional=notional, available=avail)
+        self._add(cl_ord_id, sym, ccy, side.upper(), qty, px, buy)
+
+    def _add(self, clid: str, sym: str, ccy: str, side: str, qty: int, px: float, buy: bool):
+        res = qty * px if buy else 0.0
+        self.orders[clid] = dict(symbol=sym, ccy=ccy, side=side, qty=qty, leaves=qty, px=px, reserved=res, ts=time.time())
+        self.pending[sym] = self.pending.get(sym, 0) + 1
+        if buy:
+            self.reserved[ccy] += res
+            self.pending_buy[sym] = self.pending_buy.get(sym, 0) + qty
+            self.daily_notional_ars += self._to_ars(ccy, res)
+
+    def drop(self, clid: str):
+        """saca la orden y libera lo que quede reservado (er terminal, ttl o envío fallido)"""
+        o = self.orders.pop(clid, None)
+        if o is None: return
+        sym = o["symbol"]
+        self.pending[sym] = self.pending.get(sym, 1) - 1
+        if self.pending[sym] <= 0: self.pending.pop(sym, None)
+        if o["side"] == "BUY":
+            self.reserved[o["ccy"]] = max(self.reserved[o["ccy"]] - o["reserved"], 0.0)
+            self.pending_buy[sym] = self.pending_buy.get(sym, 0) - o["leaves"]
+            if self.pending_buy[sym] <= 0: self.pending_buy.pop(sym, None)
+        if o.get("order_id"): self.by_oid.pop(o["order_id"], None)
+
+    # ---- post-trade ----
+    def on_er(self, er):
+        """libera reservas con el er de la orden (por clOrdId, o por orderId si el er no lo trae)"""
+        clid = er.cl_ord_id or self.by_oid.get(er.order_id or "", "")
+        o = self.orders.get(clid)
+        st = (er.status or "").upper()
+        if o is not None and er.order_id and not o.get("order_id"):
+            o["order_id"] = er.order_id
+            self.by_oid[er.order_id] = clid
+        if st in FILL_STATUSES:
+            q = int(er.qty or 0)
+            sym = (er.symbol or (o or {}).get("symbol", "")).upper()
+            sign = 1 if (er.side or (o or {}).get("side", "")).upper() == "BUY" else -1
+            self.pos[sym] = self.pos.get(sym, 0) + sign * q
+            if self.pos[sym] == 0: self.pos.pop(sym, None)
+            if o is not None and q > 0:
+                q = min(q, o["leaves"])
+                o["leaves"] -= q
+                if o["side"] == "BUY":
+                    # lo llenado pasa de reservado a gastado (hasta el próximo refresh de cash)
+                    rel = min(q * o["px"], o["reserved"])
+                    o["reserved"] -= rel
+                    self.reserved[o["ccy"]] = max(self.reserved[o["ccy"]] - rel, 0.0)
+                    self.spent[o["ccy"]] += q * float(er.price or o["px"])
+                    self.pending_buy[o["symbol"]] = self.pending_buy.get(o["symbol"], 0) - q
+                    if self.pending_buy[o["symbol"]] <= 0: self.pending_buy.pop(o["symbol"], None)
+                if o["leaves"] <= 0:
+                    self.drop(clid)
+        if st in DONE_STATUSES and o is not None:
+            self.drop(clid)
+
+    def expire(self, ttl_s: Optional[float] = None) -> int:
+        """órdenes sin er terminal después de ttl (ws caído, er perdido): se liberan"""
+        ttl = settings.risk_order_ttl_s if ttl_s is None else ttl_s
+        if ttl <= 0: return 0
+        lim = time.time() - ttl
+        old = [c for c, o in self.orders.items() if o["ts"] < lim]
+        for c in old: self.drop(c)
+        if old and self._tracer: self._tracer.log("risk.expire", n=len(old))
+        return len(old)
+
+    def status(self) -> dict:
+        return dict(
+            enabled=settings.risk_enabled,
+            limits=dict(
+                per_trade_ars=settings.risk_per_trade_ars,
+                daily_notional_ars=settings.risk_daily_notional_ars,
+                max_pending_per_symbol=settings.risk_max_pending_per_symbol,
+                max_open_orders=settings.risk_max_open_orders,
+                max_pos_per_symbol=settings.risk_max_pos_per_symbol,
+            ),
+            daily_notional_ars=self.daily_notional_ars,
+            reserved_ars=self.reserved["ARS"], reserved_usd=self.reserved["USD"],
+            spent_ars=self.spent["ARS"], spent_usd=self.spent["USD"],
+            avail_ars=self.available("ARS"), avail_usd=self.available("USD"),
+            open_orders=len(self.orders), pending=dict(self.pending),
+            rejects=self.rejects, last_reject=self.last_reject,
+        )
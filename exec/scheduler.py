@@ -0,0 +1,70 @@
+import asyncio
+from typing import Awaitable, Dict, Iterable, Optional, Set
+from settings import settings
+
+class ExecScheduler:
+    """
+    lanza los legs de pares independientes en paralelo en vez de esperar uno por uno:
+      - cap de concurrencia (settings.max_concurrent_legs)
+      - lock por símbolo: un par no arranca si alguna de sus patas ya tiene un leg en vuelo
+      - reservas de cash por moneda: el leg reserva su notional antes de arrancar y lo libera al
+        terminar, así dos legs concurrentes no gastan el mismo cash_ars / cash_usd
+    """
+    def __init__(self, max_concurrent: Optional[int] = None, tracer=None):
+        self._max = max_concurrent
+        self._busy: Set[str] = set()
+        self._reserved: Dict[str, float] = {"ARS": 0.0, "USD": 0.0}
+        self._tasks: Set[asyncio.Task] = set()
+        self._tracer = tracer
+        self.launched = 0
+        self.finished = 0                # legs terminados (libera símbolos / cash: la estrategia re-evalúa)
+        self.failed = 0
+
+    @property
+    def max_concurrent(self) -> int:
+        return int(settings.max_concurrent_legs if self._max is None else self._max)
+
+    def available(self, ccy: str, cash: float) -> float:
+        return max(float(cash or 0.0) - self._reserved.get(ccy, 0.0), 0.0)
+
+    def can_launch(self, symbols: Iterable[str]) -> bool:
+        return len(self._tasks) < self.max_concurrent and not any(s in self._busy for s in symbols)
+
+    def launch(self, symbols: Iterable[str], ccy: str, amount: float, leg: Awaitable) -> bool:
+        syms = tuple(symbols)
+        if not self.can_launch(syms):
+            leg.close()
+            return False
+        self._busy.update(syms)
+        self._reserved[ccy] = self._reserved.get(ccy, 0.0) + amount
+        t = asyncio.create_task(self._run(syms, ccy, amount, leg))
+        self._tasks.add(t)
+        self.launched += 1
+        return True
+
+    async def _run(self, syms, ccy: str, amount: float, leg: Awaitable):
+        try:
+            return await leg
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            if self._tracer: self._tracer.log("exec.leg.error", symbols=list(syms), err=str(e))
+        finally:
+            self._busy.difference_update(syms)
+            self._reserved[ccy] = max(self._reserved.get(ccy, 0.0) - amount, 0.0)
+            self._tasks.discard(asyncio.current_task())
+            self.finished += 1
+
+    async def drain(self, timeout: Optional[float] = None):
+        """espera los legs en vuelo (al apagar); los que no terminan a tiempo se cancelan"""
+        if not self._tasks: return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for t in pending: t.cancel()
+
+    def status(self) -> dict:
+        return dict(
+            inflight=len(self._tasks), max_concurrent=self.max_concurrent, busy=sorted(self._busy),
+            reserved_ars=self._reserved.get("ARS", 0.0), reserved_usd=self._reserved.get("USD", 0.0),
+            launched=self.launched, finished=self.finished, failed=self.failed,
+        )
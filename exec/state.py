@@ -1,20 +1,36 @@
-import requests
+import asyncio, time
 from settings import settings
+from util.rest import rest_client
 
 class AccountState:
     def __init__(self, token: str):
         self.token = token
         self.ars = 0.0
         self.usd = 0.0
+        self.ts = 0.0          # último refresh ok (unix)
 
-    def refresh_from_risk(self):
+    async def refresh_from_risk(self):
         rest, _ = settings.urls()
         acc = settings.account_for_env()
         h = {"X-Auth-Token": self.token, "accept":"application/json"}
-        r = requests.get(f"{rest}/rest/risk/accountReport/{acc}", headers=h, timeout=5)
-        r.raise_for_status()
+        r = await rest_client().get(f"{rest}/rest/risk/accountReport/{acc}", headers=h, timeout=5)
         j = r.json()
         det = j.get("detailedPosition", j)
         self.ars = float(det.get("availableCashARS", det.get("cashARS", 0.0)) or 0.0)
         self.usd = float(det.get("availableCashUSD", det.get("cashUSD", 0.0)) or 0.0)
-        return dict(cash_ars=self.ars, cash_usd=self.usd)
+        self.ts = time.time()
+        return self.snapshot()
+
+    def snapshot(self) -> dict:
+        return dict(cash_ars=self.ars, cash_usd=self.usd, ts=self.ts)
+
+    async def poll_forever(self, tracer=None):
+        """risk_poll en background: publica el último cash en self.ars/usd/ts cada risk_poll_s"""
+        while True:
+            try:
+                await self.refresh_from_risk()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if tracer: tracer.log("risk.poll.error", err=str(e))
+            await asyncio.sleep(settings.risk_poll_s)
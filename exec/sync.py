@@ -1,7 +1,10 @@
-import asyncio, time
+import asyncio
 from typing import Optional, Tuple, Callable
 from settings import settings
 from datafeed.primary_ws import PrimaryWS
+from datafeed.base import FILL_STATUSES, DONE_STATUSES
+from exec.risk import RiskReject
+from util.clock import REAL_CLOCK
 
 def _edge_ok(implied_now: float, ref: float, dir_: str, tol_bps: float) -> Tuple[bool, bool]:
     if not implied_now or not ref: return (False, False)
@@ -13,6 +16,30 @@ def _edge_ok(implied_now: float, ref: float, dir_: str, tol_bps: float) -> Tuple
         return (implied_now >= ref*(1 + settings.thresh_pct + tol),
                 implied_now >= ref*(1 + tol))
 
+
+async def _collect_fills(q: asyncio.Queue, timeout_s: float, want: int, clock=REAL_CLOCK) -> int:
+    """suma fills de UNA orden (queue por clOrdId) hasta timeout, estado terminal o qty completa"""
+    got = 0
+    t_end = clock.time() + timeout_s
+    while got < want:
+        rem = t_end - clock.time()
+        if rem <= 0: break
+        try:
+            er = await clock.wait_queue(q, rem)
+        except asyncio.TimeoutError:
+            break
+        st = (er.status or "").upper()
+        if st in FILL_STATUSES:
+            got += int(er.qty or 0)
+        if st in DONE_STATUSES:
+            break
+    return got
+
+def _filled(feed, clid: str, got: int) -> int:
+    """cum_qty exacto del oms si el feed lo lleva; si no, lo contado por er"""
+    o = feed.oms.get(clid) if getattr(feed, "oms", None) else None
+    return int(o.cum_qty) if o is not None else got
+
 async def leg_buy_ioc_then_sell_smart(
     feed: PrimaryWS,
     buy_symbol: str, buy_price: Optional[float], buy_qty_cap: int,
@@ -24,36 +51,43 @@ async def leg_buy_ioc_then_sell_smart(
     grace_ms = settings.GRACE_MS if grace_ms is None else grace_ms
     tol_bps  = settings.EDGE_TOL_BPS
 
-    if buy_price is None:
-        await feed.send_market(buy_symbol, "BUY", buy_qty_cap, tif="IOC")
-    else:
-        await feed.send_limit(buy_symbol, "BUY", buy_qty_cap, buy_price, tif="IOC")
+    router = feed.er_router
+    clock = getattr(feed, "clock", REAL_CLOCK)   # replay/sim inyectan un reloj virtual
 
-    t_end = time.time() + (wait_ms/1000)
-    bought = 0; sold = 0
-    while time.time() < t_end:
-        try:
-            er = await asyncio.wait_for(feed.next_exec_report(), timeout=0.05)
-            if er.symbol == buy_symbol and er.side == "BUY" and er.status in ("FILLED","PARTIALLY_FILLED"):
-                bought += int(er.qty or 0)
-        except asyncio.TimeoutError:
-            pass
+    # pata compra: sólo escuchamos los er de NUESTRO clOrdId
+    buy_clid = feed.new_cl_ord_id()
+    q_buy = router.expect(buy_clid)
+    try:
+        if buy_price is None:
+            await feed.send_market(buy_symbol, "BUY", buy_qty_cap, tif="IOC", cl_ord_id=buy_clid)
+        else:
+            await feed.send_limit(buy_symbol, "BUY", buy_qty_cap, buy_price, tif="IOC", cl_ord_id=buy_clid)
+        bought = _filled(feed, buy_clid, await _collect_fills(q_buy, wait_ms/1000, buy_qty_cap, clock))
+    except RiskReject as e:
+        # la pata de entrada no pasó el pre-trade: no hay nada que deshacer
+        return {"bought":0, "sold":0, "unwound":False, "rejected":e.reason}
+    finally:
+        router.release(buy_clid)
     if bought <= 0:
         return {"bought":0, "sold":0, "unwound":False}
 
-    if sell_price is None:
-        await feed.send_market(sell_symbol, "SELL", bought, tif="IOC")
-    else:
-        await feed.send_limit(sell_symbol, "SELL", bought, sell_price, tif="DAY")
-
-    t_grace = time.time() + (grace_ms/1000)
-    while time.time() < t_grace and sold < bought:
-        try:
-            er = await asyncio.wait_for(feed.next_exec_report(), timeout=0.05)
-            if er.symbol == sell_symbol and er.side == "SELL" and er.status in ("FILLED","PARTIALLY_FILLED"):
-                sold += int(er.qty or 0)
-        except asyncio.TimeoutError:
-            pass
+    sell_clid = feed.new_cl_ord_id()
+    q_sell = router.expect(sell_clid)
+    try:
+        if sell_price is None:
+            await feed.send_market(sell_symbol, "SELL", bought, tif="IOC", cl_ord_id=sell_clid)
+        else:
+            await feed.send_limit(sell_symbol, "SELL", bought, sell_price, tif="DAY", cl_ord_id=sell_clid)
+        sold = await _collect_fills(q_sell, grace_ms/1000, bought, clock)
+        # la DAY que no llenó en grace no puede quedar viva: si después llena, el unwind vende dos veces.
+        # cancel y esperamos el terminal (con los fills tardíos que traiga) antes de decidir el remanente
+        o = feed.oms.get(sell_clid) if getattr(feed, "oms", None) else None
+        if sold < bought and sell_price is not None and hasattr(feed, "cancel") and (o is None or not o.done):
+            await feed.cancel(sell_clid)
+            sold += await _collect_fills(q_sell, max(wait_ms, grace_ms)/1000, bought - sold, clock)
+        sold = _filled(feed, sell_clid, sold)
+    finally:
+        router.release(sell_clid)
 
     rem = bought - sold
     if rem <= 0 or settings.UNWIND_MODE.lower() == "none":
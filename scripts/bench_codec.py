@@ -0,0 +1,51 @@
+import json, random, sys, time
+from datafeed.codec import available_codecs, get_codec
+from datafeed.book import DepthBook
+
+# uso: python scripts/bench_codec.py [N]  => mensajes/seg por codec instalado (md, er, no)
+
+def _frames(n: int, depth: int = 5):
+    rng = random.Random(0)
+    md, er = [], []
+    for i in range(n):
+        px = 70000 + rng.random() * 100
+        md.append(json.dumps({
+            "type": "md", "symbol": f"AL{30 + i % 20}",
+            "entries": {
+                "BI": [{"price": round(px - k, 2), "size": rng.randint(1, 5000)} for k in range(depth)],
+                "OF": [{"price": round(px + 1 + k, 2), "size": rng.randint(1, 5000)} for k in range(depth)],
+            },
+        }))
+        er.append(json.dumps({
+            "type": "er", "product": {"marketId": "ROFX", "symbol": "AL30"}, "side": "BUY",
+            "status": "PARTIALLY_FILLED", "price": px, "quantity": 100, "lastPx": px, "lastQty": 10,
+            "orderId": str(1000 + i), "clOrdId": f"MESITA-{i}", "cumQty": 10, "leavesQty": 90, "avgPx": px,
+        }))
+    no = {"type": "no", "clOrdId": "MESITA-1", "product": {"marketId": "ROFX", "symbol": "AL30"},
+          "price": 70000.5, "quantity": 100, "side": "BUY", "account": "REM0000", "timeInForce": "IOC",
+          "iceberg": False, "proprietary": "PBCP"}
+    return md, er, no
+
+def _rate(fn, items) -> float:
+    t0 = time.perf_counter()
+    for x in items: fn(x)
+    return len(items) / (time.perf_counter() - t0)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    md, er, no = _frames(n)
+    book = DepthBook(5)
+    print(f"{n} mensajes por prueba; instalados: {', '.join(available_codecs())}")
+    print(f"{'codec':<8} {'md/s':>12} {'er/s':>12} {'no enc/s':>12}")
+    for name in available_codecs():
+        c = get_codec(name)
+        def on_md(raw):
+            t, m = c.decode(raw)
+            book.update(m.bids, m.offers)
+        r_md = _rate(on_md, md)
+        r_er = _rate(c.decode, er)
+        r_no = _rate(lambda _: c.encode(no), range(n))
+        print(f"{name:<8} {r_md:>12,.0f} {r_er:>12,.0f} {r_no:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
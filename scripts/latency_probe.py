@@ -29,16 +29,16 @@ async def main():
     while not feed.token_value():
         await asyncio.sleep(0.05)
 
-    clid = await feed.send_limit(symbol=symbol, side=side, qty=qty, price=price, tif="IOC")
+    clid = feed.new_cl_ord_id()
+    q = feed.er_router.expect(clid)
     t0 = time.time()
+    await feed.send_limit(symbol=symbol, side=side, qty=qty, price=price, tif="IOC", cl_ord_id=clid)
     print(f"sent clOrdId={clid} @ {t0:.6f}")
 
-    while True:
-        er = await feed.next_exec_report()
-        if er.cl_ord_id == clid:
-            dt = (time.time() - t0) * 1000.0
-            print(f"er for {clid}: status={er.status} rtt_ms={dt:.1f}")
-            break
+    er = await q.get()
+    dt = (time.time() - t0) * 1000.0
+    print(f"er for {clid}: status={er.status} rtt_ms={dt:.1f}")
+    feed.er_router.release(clid)
 
     await feed.stop(); await task
 
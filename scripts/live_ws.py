@@ -1,54 +1,38 @@
 # scripts/live_ws.py
 import asyncio
-import json
 import math
-import os
 import time
 from asyncio import Lock
-from typing import Dict, List, Optional
-
-import pandas as pd
+from typing import Dict, List, Optional, Set, Tuple
 
 from settings import settings
 from discover.instruments import build_pairs
 from datafeed.primary_ws import PrimaryWS
-from sim.mep_ref import MEPRef
-from agent.rules import signal_ars_to_usd, signal_usd_to_ars
+from datafeed.sharded import ShardedFeed, make_feed
+from sim.mep_ref import make_ref
+from agent.strategy import run_a2u, run_u2a
+from agent.pair_index import PairIndex
 from exec.state import AccountState
 from exec.reconciler import Reconciler
-from exec.sync import leg_buy_ioc_then_sell_smart
-from exec.latency import periodic_latency_probe
+from exec.latency import LATENCY, periodic_latency_probe
+from exec.scheduler import ExecScheduler
+from exec.risk import RiskEngine
+from exec.journal import TradeJournal
 from util.trace import Trace
+from util.control import ControlChannel
+from util.publish import StatePublisher
 
 # ----- paths para UI -----
 STATUS_JSON     = "assets/plots/status.json"
 TRADES_CSV      = "assets/plots/live_trades.csv"
+TRADES_JSON     = "assets/plots/trades.json"
 BOOKS_JSON      = "assets/plots/books.json"
 POSITIONS_JSON  = "assets/plots/positions.json"
 
 # ----- helpers ui/control -----
-def load_control() -> dict:
-    p = settings.control_path
-    if not os.path.exists(p):
-        return {}
-    try:
-        with open(p, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def write_json(path: str, obj: dict):
-    try:
-        tmp = f"{path}.tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
-        os.replace(tmp, path)
-    except Exception:
-        pass
-
 def apply_overrides(ctrl: dict):
     """
-    aplica en caliente overrides venidos desde control.json (ui),
+    aplica en caliente overrides venidos de la ui (ControlChannel: sólo las claves que cambiaron),
     incluyendo credenciales, urls y entorno (paper/live).
     """
     changed = {}
@@ -57,12 +41,14 @@ def apply_overrides(ctrl: dict):
         "WAIT_MS", "GRACE_MS", "EDGE_TOL_BPS",
         "thresh_pct", "min_notional_ars",
         "risk_poll_s", "risk_refresh_s", "poll_s",
-        "HALF_LIFE_S", "REF_K", "REF_MIN_HL_S", "REF_MAX_HL_S", "LAT_PROBE_S",
-        "instrument_refresh_s"
+        "HALF_LIFE_S", "REF_K", "REF_Q", "REF_TOP_N", "REF_OUTLIER_K", "REF_STALE_S", "REF_MIN_HL_S", "REF_MAX_HL_S", "LAT_PROBE_S",
+        "instrument_refresh_s", "max_concurrent_legs",
+        "risk_per_trade_ars", "risk_daily_notional_ars", "risk_max_pending_per_symbol",
+        "risk_max_open_orders", "risk_max_pos_per_symbol", "risk_order_ttl_s"
     ]
-    keys_bool = ["trace_enabled", "trace_raw", "REF_TUNE"]
+    keys_bool = ["trace_enabled", "trace_raw", "REF_TUNE", "md_event_driven", "risk_poll_bg", "risk_enabled"]
     keys_text = [
-        "REF_MODE", "UNWIND_MODE", "balance_mode",
+        "REF_MODE", "REF_SOURCE", "REF_COMPOSITE", "UNWIND_MODE", "balance_mode",
         # credenciales/urls/env
         "env", "primary_base_url", "primary_ws_url", "proprietary_tag",
         "primary_paper_username", "primary_paper_password", "account_paper",
@@ -96,25 +82,20 @@ def apply_overrides(ctrl: dict):
 
     return changed
 
-def operable_ars_a2u(qa, qu, implied) -> float:
-    if implied is None:
-        return 0.0
-    # pesos máximos operables dados los top-of-book
-    return min(qa.ask_qty * qa.ask, qu.bid_qty * qu.bid * implied)
-
-def operable_ars_u2a(qa, qu, implied_rev) -> float:
-    if implied_rev is None:
-        return 0.0
-    return min(qa.bid_qty * qa.bid, qu.ask_qty * qu.ask * implied_rev)
-
-async def er_consumer(feed: PrimaryWS, rec: Reconciler):
-    while True:
-        er = await feed.next_exec_report()
-        rec.apply_er(er)
+async def er_consumer(feed: PrimaryWS, rec: Reconciler, journal: TradeJournal):
+    # suscripción broadcast: el reconciler ve todos los fills aunque sync/latency esperen los suyos
+    q = feed.er_router.subscribe()
+    try:
+        while True:
+            er = await q.get()
+            rec.apply_er(er)
+            journal.on_er(er)
+    finally:
+        feed.er_router.unsubscribe(q)
 
 async def periodic_refresh(acct: AccountState, rec: Reconciler):
     while True:
-        acct.refresh_from_risk()
+        await acct.refresh_from_risk()
         rec.full_refresh(acct.ars, acct.usd)
         await asyncio.sleep(settings.risk_refresh_s)
 
@@ -122,7 +103,7 @@ async def periodic_instrument_refresh(feed: PrimaryWS, pairs_ref: dict, lock: Lo
     while True:
         await asyncio.sleep(settings.instrument_refresh_s)
         try:
-            new_pairs = build_pairs()
+            new_pairs = await build_pairs()
             new_symbols = sorted({s for a, b in new_pairs for s in (a, b)})
             await feed.update_symbols(new_symbols)
             async with lock:
@@ -132,6 +113,12 @@ async def periodic_instrument_refresh(feed: PrimaryWS, pairs_ref: dict, lock: Lo
             pass
 
 async def force_flatten_positions(feed: PrimaryWS, rec: Reconciler):
+    # primero bajamos lo que tengamos apoyado (si no, un DAY que llena después re-abre posición)
+    for o in feed.oms.open_orders():
+        try:
+            await feed.cancel(o.cl_ord_id)
+        except Exception:
+            pass
     pos: Dict[str, int] = rec.snapshot_positions()
     for sym, qty in pos.items():
         q = abs(int(qty or 0))
@@ -147,7 +134,7 @@ async def force_flatten_positions(feed: PrimaryWS, rec: Reconciler):
 # ----- montaje principal -----
 async def main():
     # descubrimos pares (ARS/USD)
-    pairs = build_pairs()
+    pairs = await build_pairs()
     if not pairs:
         raise SystemExit("no hay pares ars/usd descubiertos")
 
@@ -157,12 +144,18 @@ async def main():
     symbols = sorted({s for a, b in pairs for s in (a, b)})
 
     # feed ws/rest (urls/creds salen de settings, que a su vez mapea .env / overrides)
-    feed = PrimaryWS(symbols)
+    feed = make_feed(symbols)
 
-    # referencia mep (ema auto-tune por latencia si REF_TUNE=True)
-    ref = MEPRef(half_life_s=float(settings.HALF_LIFE_S))
+    # referencia mep (ema auto-tune por latencia si REF_TUNE=True); REF_SOURCE=composite => top-N pares
+    ref = make_ref(pairs, half_life_s=float(settings.HALF_LIFE_S))
 
     tracer: Optional[Trace] = Trace(settings.trace_path, settings.trace_rotate_mb) if settings.trace_enabled else None
+
+    # legs de pares independientes en paralelo (lock por símbolo + reserva de cash)
+    sched = ExecScheduler(tracer=tracer)
+    # pre-trade: toda orden del feed pasa por acá (caps, reservas, posición)
+    risk = RiskEngine(tracer=tracer)
+    feed.risk = risk
     task_ws = asyncio.create_task(feed.run())
 
     # hot-reload de instrumentos
@@ -175,13 +168,16 @@ async def main():
         await asyncio.sleep(0.05)
 
     acct = AccountState(feed.token_value())
-    acct.refresh_from_risk()
+    await acct.refresh_from_risk()
 
     balance_mode = settings.balance_mode.lower()
     rec = Reconciler(acct.ars, acct.usd)
 
+    # journal de señales + fills (append-only, lo escribe un thread aparte)
+    journal = TradeJournal(TRADES_CSV)
+
     # consumidor de ER + (opcional) refresco periódico de risk (si er_reconcile)
-    tasks_extra: List[asyncio.Task] = [asyncio.create_task(er_consumer(feed, rec))]
+    tasks_extra: List[asyncio.Task] = [asyncio.create_task(er_consumer(feed, rec, journal))]
     if balance_mode == "er_reconcile":
         tasks_extra.append(asyncio.create_task(periodic_refresh(acct, rec)))
 
@@ -189,61 +185,60 @@ async def main():
     stop_probe = asyncio.Event()
     task_probe = asyncio.create_task(periodic_latency_probe(feed, tracer, ref, stop_probe))
 
+    # risk_poll en background (risk_poll_bg): se lanza/para según balance_mode
+    task_risk: Optional[asyncio.Task] = None
+
     trading_enabled = True
     force_reload_flag = False
     force_flatten_flag = False
-    last_ctrl_apply = 0.0
 
-    # logging de señales
-    rows = []
+    # canal de control ui -> bot (socket unix + fallback control.json vigilado)
+    ctl = ControlChannel()
+    await ctl.start()
+
+    # estado para la ui: a ui_publish_hz, sólo si cambió, escrito por un thread aparte (y http opcional)
+    pub = StatePublisher({"books": BOOKS_JSON, "positions": POSITIONS_JSON, "status": STATUS_JSON,
+                          "trades": TRADES_JSON})
+
+    # tick-driven: dirty = símbolos tocados desde la vuelta anterior (None = rescan completo)
+    dirty: Optional[Set[str]] = None
+    last_hk = 0.0
+    pidx: Optional[PairIndex] = None
+    pidx_src = None
 
     try:
         while True:
-            # ---- control en caliente ----
-            ctrl = load_control()
-            applied = {}
-
-            if ctrl:
-                # panic / resume
-                if ctrl.get("panic_stop") is True:
+            # control/ui/status sólo a cadencia poll_s, no en cada tick
+            housekeeping = not dirty or time.time() - last_hk >= settings.poll_s
+            if housekeeping:
+                last_hk = time.time()
+            ui_due = pub.due()
+
+            # ---- control en caliente (comandos del canal; sin disco en el loop) ----
+            for c in ctl.drain():
+                if c.cmd == "panic_stop":
                     trading_enabled = False
-                    if tracer: tracer.log("control.panic")
-                if ctrl.get("resume") is True:
+                    if tracer: tracer.log("control.panic", id=c.id)
+                elif c.cmd == "resume":
                     trading_enabled = True
-                    if tracer: tracer.log("control.resume")
-                    try:
-                        ctrl["resume"] = False
-                        with open(settings.control_path, "w", encoding="utf-8") as f:
-                            json.dump(ctrl, f)
-                    except Exception:
-                        pass
-
-                # reload instruments on demand
-                if ctrl.get("reload_instruments_now") is True:
+                    if tracer: tracer.log("control.resume", id=c.id)
+                elif c.cmd == "reload_instruments_now":
                     force_reload_flag = True
-                    if tracer: tracer.log("control.reload")
-                    try:
-                        ctrl["reload_instruments_now"] = False
-                        with open(settings.control_path, "w", encoding="utf-8") as f:
-                            json.dump(ctrl, f)
-                    except Exception:
-                        pass
-
-                # flatten on demand
-                if ctrl.get("force_flatten") is True:
+                    if tracer: tracer.log("control.reload", id=c.id)
+                elif c.cmd == "force_flatten":
                     force_flatten_flag = True
-                    if tracer: tracer.log("control.force_flatten")
-                    try:
-                        ctrl["force_flatten"] = False
-                        with open(settings.control_path, "w", encoding="utf-8") as f:
-                            json.dump(ctrl, f)
-                    except Exception:
-                        pass
-
-                # aplicar overrides (incluye credenciales/urls/env)
-                if time.time() - last_ctrl_apply > 0.25:
-                    applied = apply_overrides(ctrl)
-                    last_ctrl_apply = time.time()
+                    if tracer: tracer.log("control.force_flatten", id=c.id)
+                elif c.cmd == "trace_rotate":
+                    # rotación manual del trace (botón de la ui)
+                    if tracer: tracer.rotate()
+                elif c.cmd == "set":
+                    # aplicar overrides (incluye credenciales/urls/env)
+                    applied = apply_overrides(c.args)
+                    # cambio de fuente de ref: ref nueva y el probe pasa a auto-tunear ésta
+                    if "REF_SOURCE" in applied:
+                        ref = make_ref(pairs_ref["pairs"], half_life_s=float(settings.HALF_LIFE_S))
+                        task_probe.cancel()
+                        task_probe = asyncio.create_task(periodic_latency_probe(feed, tracer, ref, stop_probe))
                     # si tocan HALF_LIFE y estamos sin auto-tune
                     if "HALF_LIFE_S" in applied and not settings.REF_TUNE:
                         try:
@@ -251,17 +246,12 @@ async def main():
                         except Exception:
                             pass
                     if tracer and applied:
-                        tracer.log("overrides.apply", **applied)
-
-                # reautenticar en caliente si te lo pide la UI
-                if ctrl.get("force_reauth") is True:
-                    if tracer: tracer.log("control.force_reauth")
-                    try:
-                        ctrl["force_reauth"] = False
-                        with open(settings.control_path, "w", encoding="utf-8") as f:
-                            json.dump(ctrl, f)
-                    except Exception:
-                        pass
+                        tracer.log("overrides.apply", seq=c.seq, **applied)
+                    ctl.ack(c, applied=applied)
+                    continue
+                elif c.cmd == "force_reauth":
+                    # reautenticar en caliente si te lo pide la UI
+                    if tracer: tracer.log("control.force_reauth", id=c.id)
                     # cerramos ws actual
                     try:
                         await feed.stop()
@@ -269,7 +259,8 @@ async def main():
                         pass
                     # recreamos feed con nuevas urls/creds de settings
                     new_symbols = feed.subscribed_symbols()
-                    feed = PrimaryWS(new_symbols)
+                    feed = make_feed(new_symbols)
+                    feed.risk = risk
                     task_ws.cancel()
                     task_ws = asyncio.create_task(feed.run())
                     # esperamos token nuevo
@@ -277,12 +268,20 @@ async def main():
                         await asyncio.sleep(0.05)
                     # refrescamos estado de cuenta y reconciliador
                     acct = AccountState(feed.token_value())
-                    acct.refresh_from_risk()
+                    await acct.refresh_from_risk()
                     rec = Reconciler(acct.ars, acct.usd)
+                    # er del feed nuevo -> reconciler nuevo; el probe también pasa al feed nuevo
+                    tasks_extra[0].cancel()
+                    tasks_extra[0] = asyncio.create_task(er_consumer(feed, rec, journal))
+                    task_probe.cancel()
+                    task_probe = asyncio.create_task(periodic_latency_probe(feed, tracer, ref, stop_probe))
+                    if task_risk:
+                        task_risk.cancel(); task_risk = None
+                ctl.ack(c)
 
             if force_reload_flag:
                 try:
-                    new_pairs = build_pairs()
+                    new_pairs = await build_pairs()
                     new_symbols = sorted({s for a, b in new_pairs for s in (a, b)})
                     await feed.update_symbols(new_symbols)
                     async with pairs_lock:
@@ -301,44 +300,56 @@ async def main():
             snap = feed.snapshot()
 
             # ---- cash source (risk_poll o er_reconcile) ----
+            risk_bg = settings.balance_mode.lower() != "er_reconcile" and settings.risk_poll_bg
+            if task_risk and not risk_bg:
+                task_risk.cancel(); task_risk = None
             if settings.balance_mode.lower() == "er_reconcile":
                 cash_ars, cash_usd = rec.cash.ars, rec.cash.usd
                 last_refresh = time.time()
                 src = "er_reconcile"
             else:
-                t = time.time()
-                if t - getattr(main, "_last_poll", 0.0) >= settings.risk_poll_s:
-                    acct.refresh_from_risk()
-                    setattr(main, "_last_poll", t)
+                if risk_bg:
+                    # el task publica el último snapshot en acct; acá nunca esperamos http
+                    if task_risk is None or task_risk.done():
+                        task_risk = asyncio.create_task(acct.poll_forever(tracer))
+                    last_refresh = acct.ts
+                else:
+                    t = time.time()
+                    if t - getattr(main, "_last_poll", 0.0) >= settings.risk_poll_s:
+                        try:
+                            await acct.refresh_from_risk()
+                        except Exception:
+                            pass
+                        setattr(main, "_last_poll", t)
+                    last_refresh = getattr(main, "_last_poll", 0.0)
                 cash_ars, cash_usd = acct.ars, acct.usd
-                last_refresh = getattr(main, "_last_poll", 0.0)
                 src = "risk_poll"
 
-            # ---- volcados para UI ----
+            # ---- volcados para UI (el publisher serializa / escribe fuera del loop) ----
             # top-of-book
-            try:
-                books = {
-                    s: dict(
-                        bid=q.bid, ask=q.ask,
-                        bid_qty=q.bid_qty, ask_qty=q.ask_qty,
-                        ts=str(q.ts),
-                    )
-                    for s, q in snap.items()
-                }
-                write_json(BOOKS_JSON, dict(ts=time.time(), books=books))
-            except Exception:
-                pass
+            if ui_due:
+                try:
+                    books = {
+                        s: dict(
+                            bid=q.bid, ask=q.ask,
+                            bid_qty=q.bid_qty, ask_qty=q.ask_qty,
+                            ts=str(q.ts),
+                        )
+                        for s, q in snap.items()
+                    }
+                    pub.publish("books", dict(books=books))
+                except Exception:
+                    pass
 
-            # posiciones + cash
-            try:
-                write_json(POSITIONS_JSON, dict(
-                    ts=time.time(),
-                    positions=rec.snapshot_positions(),
-                    cash_ars=cash_ars,
-                    cash_usd=cash_usd
-                ))
-            except Exception:
-                pass
+                # posiciones + cash
+                try:
+                    pub.publish("positions", dict(
+                        positions=rec.snapshot_positions(),
+                        cash_ars=cash_ars,
+                        cash_usd=cash_usd
+                    ))
+                except Exception:
+                    pass
 
             # ---- referencias MEP ----
             async with pairs_lock:
@@ -352,176 +363,96 @@ async def main():
                     cur_pairs[0]
                 )
 
-            qa_ref = snap.get(ref_pair[0])
-            qu_ref = snap.get(ref_pair[1])
-
-            if qa_ref and qu_ref:
-                # update ref (tick + ema)
-                ref.update(
-                    ts_unix=time.time(),
-                    ask_peso_al30=qa_ref.ask,
-                    bid_usd_al30d=qu_ref.bid,
-                    bid_peso_al30=qa_ref.bid,
-                    ask_usd_al30d=qu_ref.ask
-                )
+            # implied/eligible incrementales: sólo se recalculan los pares que tocó el tick
+            if pidx_src is not pairs_ref["pairs"]:
+                pidx_src = pairs_ref["pairs"]
+                pidx = PairIndex(cur_pairs)
+                if hasattr(ref, "set_pairs"):
+                    ref.set_pairs(cur_pairs)
+                dirty = None                  # índice nuevo: cargar todos
+            if dirty:
+                LATENCY.eval(dirty)
+            pidx.update(snap, dirty)
+            scope = pidx.scope(dirty, ref_pair, time.monotonic(), settings.poll_s,
+                               (sched.finished, cash_ars, cash_usd))
+
+            # update ref (tick + ema): par de referencia o compuesta según REF_SOURCE
+            if ref.update_snap(time.time(), snap, ref_pair):
                 a2u_ref = ref.ref_a2u(settings.REF_MODE)
                 u2a_ref = ref.ref_u2a(settings.REF_MODE)
 
-                # status enriquecido para ui
-                write_json(STATUS_JSON, dict(
-                    ts=time.time(),
-                    env=settings.env,
-                    mode=settings.balance_mode,
-                    last_refresh=last_refresh,
-                    cash_ars=cash_ars,
-                    cash_usd=cash_usd,
-                    source=src,
-                    trading_enabled=trading_enabled,
-                    poll_s=settings.poll_s,
-                    risk_poll_s=settings.risk_poll_s,
-                    ref_mode=settings.REF_MODE,
-                    half_life_s=settings.HALF_LIFE_S,
-                    ref_tune=settings.REF_TUNE,
-                    ref_k=settings.REF_K,
-                    ref_min=settings.REF_MIN_HL_S,
-                    ref_max=settings.REF_MAX_HL_S,
-                    lat_probe_s=settings.LAT_PROBE_S,
-                    ref_inst_a2u=ref.inst_a2u,
-                    ref_ema_a2u=ref.ema_a2u,
-                    ref_inst_u2a=ref.inst_u2a,
-                    ref_ema_u2a=ref.ema_u2a,
-                    ref_pair=dict(ars=ref_pair[0], usd=ref_pair[1]),
-                ))
+                # status enriquecido para ui (a ui_publish_hz)
+                if ui_due:
+                    pub.publish("status", dict(
+                        env=settings.env,
+                        mode=settings.balance_mode,
+                        last_refresh=last_refresh,
+                        cash_ars=cash_ars,
+                        cash_usd=cash_usd,
+                        source=src,
+                        trading_enabled=trading_enabled,
+                        poll_s=settings.poll_s,
+                        risk_poll_s=settings.risk_poll_s,
+                        ref_mode=settings.REF_MODE,
+                        half_life_s=settings.HALF_LIFE_S,
+                        ref_tune=settings.REF_TUNE,
+                        ref_k=settings.REF_K,
+                        ref_q=settings.REF_Q,
+                        rtt=LATENCY.rtt_status(),
+                        ref_min=settings.REF_MIN_HL_S,
+                        ref_max=settings.REF_MAX_HL_S,
+                        lat_probe_s=settings.LAT_PROBE_S,
+                        ref_inst_a2u=ref.inst_a2u,
+                        ref_ema_a2u=ref.ema_a2u,
+                        ref_inst_u2a=ref.inst_u2a,
+                        ref_ema_u2a=ref.ema_u2a,
+                        ref_pair=dict(ars=ref_pair[0], usd=ref_pair[1]),
+                        ref_source=settings.REF_SOURCE,
+                        ref_comp=ref.status() if hasattr(ref, "status") else None,
+                        implied=pidx.implied_map(),
+                        exec=sched.status(),
+                        risk=risk.status(),
+                        orders=feed.oms.status(),
+                        md=feed.status() if isinstance(feed, ShardedFeed) else None,
+                        latency=LATENCY.status(),
+                        control=ctl.status(),
+                        ui=pub.status(),
+                        journal=journal.status(),
+                    ))
+
+                if pidx.set_limits(a2u_ref * (1 - settings.thresh_pct) if a2u_ref else None,
+                                   u2a_ref * (1 + settings.thresh_pct) if u2a_ref else None):
+                    scope = None              # se movió el umbral: re-evaluar todos los eligible
+
+                # ---- pre-trade: cash/posiciones al día y reservas huérfanas fuera ----
+                risk.update(cash_ars, cash_usd, last_refresh, fx=a2u_ref or u2a_ref)
+                if housekeeping:
+                    risk.set_positions(rec.snapshot_positions())
+                    risk.expire()
 
                 # ---- trading loop: ARS -> USD ----
                 if trading_enabled and a2u_ref:
-                    for ars_sym, usd_sym in cur_pairs:
-                        qa = snap.get(ars_sym)
-                        qu = snap.get(usd_sym)
-                        if not qa or not qu:
-                            continue
-                        implied = (qa.ask / qu.bid) if (qa.ask > 0 and qu.bid > 0) else None
-                        op_ars = operable_ars_a2u(qa, qu, implied)
-
-                        if implied and signal_ars_to_usd(
-                            implied, a2u_ref, op_ars,
-                            settings.min_notional_ars, settings.thresh_pct
-                        ):
-                            # caps por profundidad y cash
-                            cap_by_depth = int(min(qu.bid_qty, qa.ask_qty))
-                            cap_by_cash  = int(max(int(cash_ars // max(qa.ask, 1)), 0))
-                            nom_cap      = max(min(cap_by_depth, cap_by_cash), 0)
-
-                            if nom_cap > 0 and nom_cap * qa.ask >= settings.min_notional_ars:
-                                async def refs():
-                                    s2 = feed.snapshot()
-                                    qa2, qu2 = s2.get(ars_sym), s2.get(usd_sym)
-                                    implied_now = (qa2.ask / qu2.bid) if (qa2 and qu2 and qa2.ask > 0 and qu2.bid > 0) else None
-                                    return dict(
-                                        dir="A2U", ref=a2u_ref, implied_now=implied_now,
-                                        book_ok=bool(qu2 and qu2.bid_qty > 0),
-                                        rem_sell_px=(qu2.bid if qu2 else None)
-                                    )
-
-                                if settings.trace_enabled and tracer:
-                                    tracer.log("signal.a2u",
-                                               pair=f"{ars_sym}:{usd_sym}",
-                                               implied=implied, ref=a2u_ref,
-                                               cap_depth=int(min(qu.bid_qty, qa.ask_qty)),
-                                               cap_cash=int(max(int(cash_ars // max(qa.ask, 1)), 0)),
-                                               nom_cap=nom_cap,
-                                               ref_inst=ref.inst_a2u, ref_ema=ref.ema_a2u, mode=settings.REF_MODE)
-
-                                res = await leg_buy_ioc_then_sell_smart(
-                                    feed,
-                                    buy_symbol=ars_sym,  buy_price=qa.ask,  buy_qty_cap=nom_cap,
-                                    sell_symbol=usd_sym, sell_price=qu.bid,
-                                    get_refs_and_implied=refs,
-                                    wait_ms=settings.WAIT_MS, grace_ms=settings.GRACE_MS
-                                )
-
-                                if settings.trace_enabled and tracer:
-                                    tracer.log("exec.a2u.result", pair=f"{ars_sym}:{usd_sym}", **res)
-
-                                rows.append(dict(
-                                    ts=str(qa.ts), pair=f"{ars_sym}:{usd_sym}", dir="ARS->USD",
-                                    implied=implied, mep_ref=a2u_ref, nom=nom_cap, px_ars=qa.ask, px_usd=qu.bid
-                                ))
+                    journal.signals(await run_a2u(feed, pidx.a2u_candidates(scope), snap, a2u_ref, cash_ars, ref, tracer, sched))
 
                 # ---- trading loop: USD -> ARS (elige el mejor implied_rev) ----
-                if trading_enabled and u2a_ref and rec.cash.usd > 0:
-                    cands = []
-                    for ars_sym, usd_sym in cur_pairs:
-                        qa = snap.get(ars_sym)
-                        qu = snap.get(usd_sym)
-                        if not qa or not qu:
-                            continue
-                        implied_rev = (qa.bid / qu.ask) if (qa.bid > 0 and qu.ask > 0) else None
-                        op_ars_rev = operable_ars_u2a(qa, qu, implied_rev)
-
-                        if implied_rev and signal_usd_to_ars(
-                            implied_rev, u2a_ref, op_ars_rev,
-                            settings.min_notional_ars, settings.thresh_pct
-                        ):
-                            cands.append((implied_rev, ars_sym, usd_sym, qa, qu))
-
-                    if cands:
-                        implied_rev, ars_sym, usd_sym, qa, qu = max(cands, key=lambda x: x[0])
-                        cap_by_depth = int(min(qa.bid_qty, qu.ask_qty))
-                        cap_by_cash  = int(max(int(rec.cash.usd // max(qu.ask, 1)), 0))
-                        nom_cap      = max(min(cap_by_depth, cap_by_cash), 0)
-
-                        if nom_cap > 0 and nom_cap * qa.bid >= settings.min_notional_ars:
-                            async def refs_u2a():
-                                s2 = feed.snapshot()
-                                qa2, qu2 = s2.get(ars_sym), s2.get(usd_sym)
-                                implied_now = (qa2.bid / qu2.ask) if (qa2 and qu2 and qa2.bid > 0 and qu2.ask > 0) else None
-                                return dict(
-                                    dir="U2A", ref=u2a_ref, implied_now=implied_now,
-                                    book_ok=bool(qa2 and qa2.bid_qty > 0),
-                                    rem_sell_px=(qa2.bid if qa2 else None)
-                                )
-
-                            if settings.trace_enabled and tracer:
-                                tracer.log("signal.u2a",
-                                           pair=f"{ars_sym}:{usd_sym}",
-                                           implied=implied_rev, ref=u2a_ref,
-                                           cap_depth=int(min(qa.bid_qty, qu.ask_qty)),
-                                           cap_cash=int(max(int(rec.cash.usd // max(qu.ask, 1)), 0)),
-                                           nom_cap=nom_cap,
-                                           ref_inst=ref.inst_u2a, ref_ema=ref.ema_u2a, mode=settings.REF_MODE)
-
-                            res = await leg_buy_ioc_then_sell_smart(
-                                feed,
-                                buy_symbol=usd_sym,  buy_price=None,   buy_qty_cap=nom_cap,
-                                sell_symbol=ars_sym, sell_price=qa.bid,
-                                get_refs_and_implied=refs_u2a,
-                                wait_ms=settings.WAIT_MS, grace_ms=settings.GRACE_MS
-                            )
-
-                            if settings.trace_enabled and tracer:
-                                tracer.log("exec.u2a.result", pair=f"{ars_sym}:{usd_sym}", **res)
-
-                            rows.append(dict(
-                                ts=str(qa.ts), pair=f"{ars_sym}:{usd_sym}", dir="USD->ARS",
-                                implied=implied_rev, mep_ref=u2a_ref, nom=nom_cap, px_ars=qa.bid
-                            ))
-
-                # flush parcial de trades para la ui
-                if rows and len(rows) % 10 == 0:
-                    try:
-                        pd.DataFrame(rows).to_csv(TRADES_CSV, index=False)
-                    except Exception:
-                        pass
+                if trading_enabled and u2a_ref:
+                    journal.signals(await run_u2a(feed, pidx.u2a_best(settings.u2a_topk, sched.can_launch), snap, u2a_ref, rec.cash.usd, ref, tracer, sched))
 
-            # loop pacing
-            await asyncio.sleep(settings.poll_s)
+                # cola acotada de señales / fills para la ui
+                if ui_due:
+                    pub.publish("trades", dict(rows=journal.tail_rows(), journal=journal.status()))
+
+            # loop pacing: por tick (poll_s como heartbeat) o polling clásico
+            if settings.md_event_driven:
+                dirty = await feed.wait_updates(settings.poll_s)
+            else:
+                dirty = None
+                await asyncio.sleep(settings.poll_s)
 
     finally:
-        # flush final
+        # legs en vuelo: los dejamos terminar (sync + unwind) antes de bajar el feed
         try:
-            if rows:
-                pd.DataFrame(rows).to_csv(TRADES_CSV, index=False)
+            await sched.drain(timeout=(settings.WAIT_MS + settings.GRACE_MS) / 1000 + 1.0)
         except Exception:
             pass
 
@@ -533,7 +464,12 @@ async def main():
 
         for t in tasks_extra:
             t.cancel()
+        if task_risk:
+            task_risk.cancel()
         task_discover.cancel()
+        await ctl.stop()
+        pub.close()
+        journal.close()
 
         # cerrar feed ws
         try:
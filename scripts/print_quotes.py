@@ -1,26 +1,26 @@
-import asyncio, pandas as pd
+import asyncio, time, pandas as pd
 from settings import settings
 from discover.instruments import build_pairs
 from datafeed.primary_ws import PrimaryWS
-from sim.mep_ref import MEPRef
+from sim.mep_ref import make_ref
+
+# uso: python scripts/print_quotes.py  => pares (top + implied) y la ref mep cada poll_s
 
 def implied_a2u(qa, qu): return (qa.ask/qu.bid) if (qa and qu and qa.ask>0 and qu.bid>0) else None
 def implied_u2a(qa, qu): return (qa.bid/qu.ask) if (qa and qu and qa.bid>0 and qu.ask>0) else None
 
 async def main():
-    pairs = build_pairs()
+    pairs = await build_pairs()
     ref_pair = next((p for p in pairs if p[0].upper()=="AL30" and p[1].upper()=="AL30D"), pairs[0])
     symbols = sorted({s for a,b in pairs for s in (a,b)})
     feed = PrimaryWS(symbols)
-    ref = MEPRef(120)
+    ref = make_ref(pairs, half_life_s=float(settings.HALF_LIFE_S))
     task = asyncio.create_task(feed.run())
     try:
         while True:
             snap = feed.snapshot()
-            if ref_pair[0] in snap and ref_pair[1] in snap:
-                qa_ref, qu_ref = snap[ref_pair[0]], snap[ref_pair[1]]
-                ref.update(qa_ref.ask, qu_ref.bid, qa_ref.bid, qu_ref.ask)
-                a2u_ref, u2a_ref = ref.mep_ref_ars_to_usd, ref.mep_ref_usd_to_ars
+            if ref.update_snap(time.time(), snap, ref_pair):
+                a2u_ref, u2a_ref = ref.ref_a2u(settings.REF_MODE), ref.ref_u2a(settings.REF_MODE)
                 rows = []
                 for ars_sym, usd_sym in pairs:
                     qa, qu = snap.get(ars_sym), snap.get(usd_sym)
@@ -35,9 +35,15 @@ async def main():
                     ))
                 print(pd.DataFrame(rows).to_string(index=False))
                 if a2u_ref and u2a_ref:
-                    print(f"mep_ref a2u={a2u_ref:.2f} u2a={u2a_ref:.2f}")
+                    print(f"mep_ref ({settings.REF_SOURCE}/{settings.REF_MODE}) a2u={a2u_ref:.2f} u2a={u2a_ref:.2f}")
                 else:
                     print("mep_ref warming up…")
+                if hasattr(ref, "status"):
+                    st = ref.status()
+                    print(f"  a2u: {', '.join(st['used_a2u']) or '-'} | u2a: {', '.join(st['used_u2a']) or '-'}"
+                          + (f" | outliers: {', '.join(st['rejected'])}" if st["rejected"] else ""))
+            else:
+                print("mep_ref warming up…")
             await asyncio.sleep(settings.poll_s)
     finally:
         await feed.stop(); await task
@@ -0,0 +1,23 @@
+import asyncio, sys
+import pandas as pd
+from sim.replay import run_replay
+
+# uso: python scripts/replay.py assets/ticks/ticks_YYYYMMDD.bin [out.csv]  => estrategia de live_ws sobre ticks grabados
+
+async def main():
+    if len(sys.argv) < 2:
+        print("usage: python scripts/replay.py <TICKS_FILE> [OUT_CSV]")
+        return
+    res = await run_replay(sys.argv[1])
+    rows = res.pop("rows")
+    print(f"ticks={res['ticks']} cycles={res['cycles']} sim={res['sim_s']:.0f}s wall={res['wall_s']:.2f}s")
+    print(f"trades={len(rows)} cash_ars={res['cash_ars']:.2f} cash_usd={res['cash_usd']:.2f}")
+    print(f"positions={res['positions']}")
+    if rows:
+        df = pd.DataFrame(rows)
+        print(df.tail(20).to_string(index=False))
+        if len(sys.argv) > 2:
+            df.to_csv(sys.argv[2], index=False)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,17 @@
+import asyncio, sys, time
+from sim.exchange import stress
+
+# uso: python scripts/stress_sim.py [N] [UNWIND_MODE]  => N escenarios de sync contra el exchange simulado
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    mode = sys.argv[2] if len(sys.argv) > 2 else None
+    t0 = time.perf_counter()
+    df = await stress(n, unwind_mode=mode)
+    dt = time.perf_counter() - t0
+    print(f"{n} escenarios en {dt:.1f}s ({n/dt*60:.0f}/min)")
+    print(df[["bought","sold","unwound","residual","leg_ms","fees_ars","pnl_ars"]].describe().to_string())
+    print(f"fill buy>0: {(df.bought>0).mean():.1%}  sold<bought: {(df.sold<df.bought).mean():.1%}  unwound: {df.unwound.mean():.1%}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
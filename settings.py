@@ -3,8 +3,20 @@ from typing import Tuple
 
 class Settings(BaseSettings):
     env: str = "paper"                     # "paper" (Remarkets) | "live" (cuenta con guita real)
-    poll_s: float = 0.2
+    poll_s: float = 0.2                    # con md_event_driven es sólo el heartbeat de fallback
+    md_event_driven: bool = True           # el loop despierta por tick (solo re-evalúa pares tocados)
+    md_depth: int = 5                      # niveles de book por lado (smd depth); 1 = sólo top-of-book
+    ws_codec: str = "auto"                 # auto | msgspec | orjson | json (auto = el más rápido instalado)
+    md_mode: str = "inproc"                # inproc | process (feed-handler en otro proceso, ticks por shm)
+    md_shards: int = 1                     # conexiones ws de md (datafeed/sharded.py); 1 = una sola, sin shm
+    md_shard_mode: str = "process"         # process | thread (thread no escala el parseo por el GIL)
+    md_shm_capacity: int = 4096            # filas de la tabla shm (símbolos + movidos en rebalanceos)
+    md_shm_poll_ms: float = 1.0            # cadencia con la que el loop mira los rings compartidos
+    md_ring_size: int = 65536              # eventos por ring (por shard); si el loop se atrasa más, barre la tabla
     primary_timeout_s: float = 3.0
+    rest_retries: int = 2                  # reintentos rest (red / 429 / 5xx) con backoff exponencial
+    rest_backoff_s: float = 0.2
+    rest_pool: int = 8                     # conexiones keep-alive del pool rest
 
     primary_base_url: str = ""
     primary_ws_url: str = ""
@@ -22,9 +34,11 @@ class Settings(BaseSettings):
     thresh_pct: float = 0.002 # 0,2% tipo de cambio minimo por debajo del mep de referencia
     cost_bps: float = 0.0 # por defecto sin comisión (veta flat). si fuera con comisión por ej. 0,15%, poner 15
     slip_bps: float = 0.0 # deslizamiento de precio para el backtesting, si fuera por ej 0.08% poner 8
+    u2a_topk: int = 8                  # mejores u2a del heap que se validan con depth por ciclo (live y replay)
 
     balance_mode: str = "risk_poll"    # risk_poll | er_reconcile
     risk_poll_s: float = 0.5
+    risk_poll_bg: bool = True          # risk_poll en task aparte; el loop sólo lee el último snapshot
     risk_refresh_s: float = 30.0
 
     instrument_refresh_s: float = 24*60*60
@@ -34,26 +48,62 @@ class Settings(BaseSettings):
     GRACE_MS: int = 800
     EDGE_TOL_BPS: float = 1.0
     UNWIND_MODE: str = "smart"        # smart | always | none
+    max_concurrent_legs: int = 4      # legs en vuelo a la vez (pares sin símbolos en común); 1 = secuencial
+
+    # pre-trade risk (exec/risk.py); 0 = sin límite. el cash disponible se chequea siempre
+    risk_enabled: bool = True
+    risk_per_trade_ars: float = 0.0           # notional máximo por orden (ARS equivalentes)
+    risk_daily_notional_ars: float = 0.0      # compras acumuladas en el día
+    risk_max_pending_per_symbol: int = 0      # órdenes abiertas por símbolo
+    risk_max_open_orders: int = 0             # órdenes abiertas totales
+    risk_max_pos_per_symbol: int = 0          # nominales por símbolo (posición + compras pendientes)
+    risk_order_ttl_s: float = 30.0            # órdenes sin er terminal se liberan pasado este tiempo
 
     # reference mode
     REF_MODE: str = "hybrid"           # "tick" (instantáneo) | "hybrid" (inst + ema) esto depende de la latencia
     HALF_LIFE_S: float = 7.0           # half-life default de la ema temporal; puede auto-tunearse
     REF_TUNE: bool = True              # auto-ajustar half-life según latencia
-    REF_K: float = 4.0                 # multiplicador: hl ≈ REF_K * median_rtt_s
+    REF_SOURCE: str = "pair"           # "pair" (ref_pair, AL30/AL30D) | "composite" (top-N pares líquidos, sim/mep_ref.py)
+    REF_TOP_N: int = 5                 # composite: pares más líquidos que entran
+    REF_COMPOSITE: str = "weighted"    # composite: "weighted" (por liquidez) | "median"
+    REF_OUTLIER_K: float = 3.0         # composite: descarta |x - mediana| > K * MAD
+    REF_STALE_S: float = 30.0          # composite: pares con quote más vieja quedan afuera (0 = no filtra)
+    REF_K: float = 4.0                 # multiplicador: hl ≈ REF_K * rtt_q (s)
+    REF_Q: float = 0.5                 # cuantil del rtt pasivo que usa el auto-tune (0.5 = mediana, 0.9 = p90)
     REF_MIN_HL_S: float = 2.0          # límites de hl
     REF_MAX_HL_S: float = 20.0
 
     # latency probe
-    LAT_PROBE_S: float = 10.0          # cada cuánto medir RTT (seg)
+    LAT_PROBE_S: float = 10.0          # probe sólo si no hubo órdenes reales en esta ventana (seg)
 
-    # ui control file
+    # ui control (util/control.py): socket unix + archivo vigilado como fallback
     control_path: str = "assets/plots/control.json"
+    control_socket: str = "assets/plots/control.sock"   # "" = sólo archivo
+    control_watch_s: float = 0.25                        # cadencia del stat del archivo
+
+    # estado para la ui (util/publish.py): status / books / positions
+    ui_publish_hz: float = 2.0         # tope de publicaciones por seg; sólo se escribe lo que cambió
+    ui_http_port: int = 0              # > 0 => GET /state/<nombre> en ui_http_host (además de los json)
+    ui_http_host: str = "127.0.0.1"
+    ui_chart_minutes: float = 15.0     # ventana de los gráficos implied vs ref del panel
 
     # trace
     trace_enabled: bool = False
     trace_path: str = "assets/plots/trace.log"
     trace_rotate_mb: int = 20
     trace_raw: bool = False
+    trace_buffer: int = 100_000        # ring buffer en memoria; si se llena se descartan los más viejos
+    trace_flush_ms: int = 200          # cadencia del writer de fondo
+    trace_gzip: bool = False           # comprimir los archivos rotados
+
+    # journal de trades (exec/journal.py): csv vivo append-only + parquet diario si hay pyarrow
+    journal_dir: str = "assets/journal"
+    journal_tail: int = 500            # señales / fills que quedan en memoria para la ui
+    journal_flush_ms: int = 500        # cadencia del writer de fondo
+
+    # captura binaria de ticks (datafeed/recorder.py), un archivo por día
+    tick_record: bool = False
+    tick_dir: str = "assets/ticks"
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,208 @@
+import itertools, math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+from settings import settings
+from discover.instruments import pairs_from_symbols
+
+# backtest vectorizado de la regla de umbral mep sobre todos los pares: matrices (T, P) y C configs por pasada;
+# aproxima live: un trade por flanco de señal por par, size = top-of-book sin límite de cash
+
+@dataclass
+class PairArrays:
+    ts_s: np.ndarray            # (T,)
+    pairs: List[Tuple[str, str]]
+    bid_ars: np.ndarray         # (T, P) ...
+    ask_ars: np.ndarray
+    bid_qty_ars: np.ndarray
+    ask_qty_ars: np.ndarray
+    bid_usd: np.ndarray
+    ask_usd: np.ndarray
+    bid_qty_usd: np.ndarray
+    ask_qty_usd: np.ndarray
+    ref_idx: int                # columna del par de referencia
+
+def _ffill_idx(mask: np.ndarray) -> np.ndarray:
+    """para cada fila, índice de la última fila con mask=True (-1 si todavía no hubo)"""
+    idx = np.where(mask, np.arange(len(mask)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    return idx
+
+def _take(col: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    out = col[np.maximum(idx, 0)].astype(np.float64)
+    out[idx < 0] = np.nan
+    return out
+
+def pair_arrays(ticks: np.ndarray, symbols: List[str], pairs: Optional[List[Tuple[str, str]]] = None,
+                ref_pair: Optional[Tuple[str, str]] = None, min_dt_ms: float = 0.0) -> PairArrays:
+    """
+    alinea los ticks de todos los pares en una línea de tiempo común (cada tick de cualquier pata),
+    con el último book conocido de cada símbolo. min_dt_ms>0 submuestrea la línea de tiempo
+    (se queda con la última fila de cada ventana) para acotar memoria en sesiones largas.
+    """
+    pairs = list(pairs or pairs_from_symbols(symbols))
+    if not pairs:
+        raise ValueError("no hay pares ars/usd")
+    ids = {s: i for i, s in enumerate(symbols)}
+    need = sorted({ids[s] for p in pairs for s in p if s in ids})
+    sub = ticks[np.isin(ticks["sym"], need)]
+    rows = np.arange(len(sub))
+    if min_dt_ms > 0 and len(sub):
+        b = sub["ts_ns"] // int(min_dt_ms * 1e6)
+        rows = rows[np.r_[b[1:] != b[:-1], True]]
+
+    fields = ("bid", "ask", "bid_qty", "ask_qty")
+    book: Dict[str, Dict[str, np.ndarray]] = {}
+    for s in {s for p in pairs for s in p}:
+        if s not in ids:
+            book[s] = {f: np.full(len(rows), np.nan) for f in fields}
+            continue
+        idx = _ffill_idx(sub["sym"] == ids[s])[rows]
+        book[s] = {f: _take(sub[f], idx) for f in fields}
+
+    def mat(leg: int, f: str) -> np.ndarray:
+        return np.stack([book[p[leg]][f] for p in pairs], axis=1)
+
+    ref_pair = ref_pair or next((p for p in pairs if p[0].upper() == "AL30" and p[1].upper() == "AL30D"), pairs[0])
+    return PairArrays(
+        ts_s=sub["ts_ns"][rows] / 1e9, pairs=pairs,
+        bid_ars=mat(0, "bid"), ask_ars=mat(0, "ask"), bid_qty_ars=mat(0, "bid_qty"), ask_qty_ars=mat(0, "ask_qty"),
+        bid_usd=mat(1, "bid"), ask_usd=mat(1, "ask"), bid_qty_usd=mat(1, "bid_qty"), ask_qty_usd=mat(1, "ask_qty"),
+        ref_idx=pairs.index(ref_pair),
+    )
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where((num > 0) & (den > 0), num / den, np.nan)
+
+def _ffill(x: np.ndarray) -> np.ndarray:
+    idx = _ffill_idx(np.isfinite(x))
+    return _take(x, idx)
+
+def ema_time_decay(ts_s: np.ndarray, x: np.ndarray, half_life_s: float, max_exp: float = 500.0) -> np.ndarray:
+    """
+    misma recursión que MEPRef.update pero vectorizada:
+      y_t = (1-a_t) y_{t-1} + a_t x_t,  a_t = 1 - exp(-dt_t / tau)
+    (x faltante => el ema no cambia y ese dt se pierde; el primer x válido inicializa).
+    forma cerrada por bloques: y_t = e^{-(D_t-D0)} (y_0 + sum a_s x_s e^{D_s-D0}), cortando
+    bloques cada `max_exp` unidades de D para que los exponenciales no desborden.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if half_life_s <= 0:
+        return _ffill(x)
+    tau = half_life_s / math.log(2)
+    valid = np.isfinite(x)
+    if not valid.any():
+        return np.full_like(x, np.nan)
+    first = int(np.argmax(valid))
+    dt = np.diff(ts_s, prepend=ts_s[0])
+    d = np.where(valid, np.maximum(dt, 0.0) / tau, 0.0)
+    d[:first + 1] = 0.0
+    a = -np.expm1(-d)
+    a[first] = 1.0
+    ax = np.where(valid, a * np.nan_to_num(x), 0.0)
+    D = np.cumsum(d)
+
+    y = np.full_like(x, np.nan)
+    start, y_prev, D0 = first, 0.0, D[first]
+    n = len(x)
+    while start < n:
+        end = int(np.searchsorted(D, D0 + max_exp, side="right"))
+        end = max(end, start + 1)
+        dd = D[start:end] - D0
+        y[start:end] = np.exp(-dd) * (y_prev + np.cumsum(ax[start:end] * np.exp(dd)))
+        y_prev, D0, start = y[end - 1], D[end - 1], end
+    return y
+
+def param_grid(**axes: Iterable) -> List[dict]:
+    """producto cartesiano: param_grid(thresh_pct=[...], half_life_s=[...], ref_mode=[...], min_notional_ars=[...])"""
+    keys = list(axes)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*(list(axes[k]) for k in keys))]
+
+def backtest(pa: PairArrays, grid: List[dict], horizon_s: float = 30.0,
+             cost_bps: Optional[float] = None, slip_bps: Optional[float] = None,
+             max_cells: int = 20_000_000) -> pd.DataFrame:
+    """
+    evalúa todas las configs del grid en una pasada. claves por config (default = settings):
+    thresh_pct, half_life_s, ref_mode ("tick" | "hybrid"), min_notional_ars.
+    pnl en ARS contra la ref al momento de la señal, neto de (cost_bps + slip_bps) por pata.
+    hit = el implied operado le gana a la ref `horizon_s` después.
+    """
+    cost = ((settings.cost_bps if cost_bps is None else cost_bps) +
+            (settings.slip_bps if slip_bps is None else slip_bps)) / 1e4
+    C = len(grid)
+    th = np.array([float(g.get("thresh_pct", settings.thresh_pct)) for g in grid])
+    mn = np.array([float(g.get("min_notional_ars", settings.min_notional_ars)) for g in grid])
+    hl = [float(g.get("half_life_s", settings.HALF_LIFE_S)) for g in grid]
+    mode = [str(g.get("ref_mode", settings.REF_MODE)) for g in grid]
+
+    imp_a = _ratio(pa.ask_ars, pa.bid_usd)
+    imp_u = _ratio(pa.bid_ars, pa.ask_usd)
+    with np.errstate(invalid="ignore"):
+        op_a = np.fmin(pa.ask_qty_ars * pa.ask_ars, pa.bid_qty_usd * pa.bid_usd * imp_a)
+        op_u = np.fmin(pa.bid_qty_ars * pa.bid_ars, pa.ask_qty_usd * pa.ask_usd * imp_u)
+    op_a = np.where(np.isfinite(imp_a), op_a, np.nan)
+    op_u = np.where(np.isfinite(imp_u), op_u, np.nan)
+    qty_a = np.fmin(pa.bid_qty_usd, pa.ask_qty_ars)
+    qty_u = np.fmin(pa.ask_qty_usd, pa.bid_qty_ars)
+
+    # refs: inst + ema por half-life única, combinadas por modo (mismo criterio que MEPRef.ref_*)
+    r = pa.ref_idx
+    inst_a, inst_u = _ffill(imp_a[:, r]), _ffill(imp_u[:, r])
+    emas = {h: (ema_time_decay(pa.ts_s, imp_a[:, r], h), ema_time_decay(pa.ts_s, imp_u[:, r], h)) for h in set(hl)}
+    keys = sorted({(h, m) for h, m in zip(hl, mode)})
+    gidx = np.array([keys.index((h, m)) for h, m in zip(hl, mode)])
+    REF_A = np.empty((len(keys), len(pa.ts_s))); REF_U = np.empty_like(REF_A)
+    for k, (h, m) in enumerate(keys):
+        if m == "tick":
+            REF_A[k], REF_U[k] = inst_a, inst_u
+        else:
+            REF_A[k], REF_U[k] = np.fmin(inst_a, emas[h][0]), np.fmax(inst_u, emas[h][1])
+
+    T, P = imp_a.shape
+    fut = np.minimum(np.searchsorted(pa.ts_s, pa.ts_s + horizon_s), T - 1)
+    out = {k: np.zeros(C) for k in ("trades_a2u", "trades_u2a", "pnl_ars", "hits", "turnover_ars")}
+    prev_a = np.zeros((C, P), dtype=bool); prev_u = np.zeros((C, P), dtype=bool)
+    step = max(1, max_cells // max(C * P, 1))
+
+    for t0 in range(0, T, step):
+        t1 = min(T, t0 + step)
+        ra = REF_A[gidx, t0:t1]; ru = REF_U[gidx, t0:t1]          # (C, Tb)
+        with np.errstate(invalid="ignore"):
+            sig_a = (imp_a[None, t0:t1] <= (ra * (1 - th)[:, None])[:, :, None]) & (op_a[None, t0:t1] >= mn[:, None, None])
+            sig_u = (imp_u[None, t0:t1] >= (ru * (1 + th)[:, None])[:, :, None]) & (op_u[None, t0:t1] >= mn[:, None, None])
+        for sig, prev, d in ((sig_a, prev_a, "a2u"), (sig_u, prev_u, "u2a")):
+            rise = sig.copy()
+            rise[:, 1:] &= ~sig[:, :-1]
+            rise[:, 0] &= ~prev
+            prev[:] = sig[:, -1]
+            c, t, p = np.nonzero(rise)
+            if not len(c):
+                continue
+            tg = t + t0
+            if d == "a2u":
+                q = qty_a[tg, p]; rf = ra[c, t]; imp = imp_a[tg, p]
+                pnl = q * pa.bid_usd[tg, p] * (rf - imp)
+                notional = q * pa.ask_ars[tg, p]
+                hit = imp < REF_A[gidx[c], fut[tg]]
+            else:
+                q = qty_u[tg, p]; rf = ru[c, t]; imp = imp_u[tg, p]
+                pnl = q * pa.ask_usd[tg, p] * (imp - rf)
+                notional = q * pa.bid_ars[tg, p]
+                hit = imp > REF_U[gidx[c], fut[tg]]
+            pnl = pnl - 2 * cost * notional
+            out[f"trades_{d}"] += np.bincount(c, minlength=C)
+            out["pnl_ars"] += np.bincount(c, weights=np.nan_to_num(pnl), minlength=C)
+            out["hits"] += np.bincount(c, weights=hit.astype(float), minlength=C)
+            out["turnover_ars"] += np.bincount(c, weights=np.nan_to_num(notional), minlength=C)
+
+    df = pd.DataFrame(dict(thresh_pct=th, half_life_s=hl, ref_mode=mode, min_notional_ars=mn))
+    df["trades_a2u"] = out["trades_a2u"].astype(int)
+    df["trades_u2a"] = out["trades_u2a"].astype(int)
+    df["trades"] = df["trades_a2u"] + df["trades_u2a"]
+    df["pnl_ars"] = out["pnl_ars"]
+    df["hit_rate"] = np.where(df["trades"] > 0, out["hits"] / np.maximum(df["trades"], 1), np.nan)
+    df["turnover_ars"] = out["turnover_ars"]
+    return df
@@ -0,0 +1,282 @@
+import asyncio, dataclasses, math, random
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+import pandas as pd
+
+from settings import settings
+from datafeed.base import DataFeedWS, ExecReport, Quote2
+from datafeed.primary_ws import ERRouter, parse_er
+from exec.sync import leg_buy_ioc_then_sell_smart
+from util.clock import VirtualClock
+from exec.oms import OMS
+
+# exchange procedural sobre VirtualClock para stress de exec/sync.py: er como el ws real, rtt lognormal,
+# book random walk, fills parciales y cola para DAY
+
+@dataclass
+class SimConfig:
+    rtt_ms: float = 60.0            # mediana del rtt
+    rtt_sigma: float = 0.5          # sigma lognormal
+    md_rate_hz: float = 20.0        # updates de book por símbolo
+    vol_bps: float = 3.0            # desvío del mid por update
+    spread_bps: float = 10.0
+    depth: float = 500.0            # qty media del top (exponencial)
+    partial_prob: float = 0.2       # prob. de que un cruce llene sólo una fracción
+    trade_rate_hz: float = 2.0      # flujo ajeno que consume la cola (órdenes apoyadas)
+    trade_size: float = 200.0
+    cost_bps: float = settings.cost_bps
+    slip_bps: float = settings.slip_bps
+
+    def jitter(self, rng: random.Random, k: float = 0.5) -> "SimConfig":
+        """misma config con ruido multiplicativo lognormal en cada parámetro (escenarios aleatorios)"""
+        return SimConfig(**{f.name: getattr(self, f.name) * math.exp(rng.gauss(0, k)) if f.name not in ("cost_bps", "slip_bps")
+                            else getattr(self, f.name) for f in dataclasses.fields(self)})
+
+class SimExchange(DataFeedWS):
+    def __init__(self, mids: Dict[str, float], cfg: Optional[SimConfig] = None,
+                 clock: Optional[VirtualClock] = None, seed: int = 0):
+        self.cfg = cfg or SimConfig()
+        self.clock = clock or VirtualClock(0)
+        self.rng = random.Random(seed)
+        self.er_router = ERRouter()
+        self.oms = OMS()
+        self.er_router.add_hook(self.oms.on_er)
+        self._er_default: Optional[asyncio.Queue] = None
+        self._mid = dict(mids)
+        self._book: Dict[str, Quote2] = {}
+        self._dirty: Set[str] = set()
+        self._resting: Dict[str, List[dict]] = {}
+        self._seq = 0
+        self.fees_ars = 0.0
+        self.cash_ars = 0.0
+        self.cash_usd = 0.0
+        self.pos: Dict[str, int] = {}
+        self.rtts_ms: List[float] = []
+        for s in self._mid:
+            self._refresh_book(s)
+            self.clock.call_later(self.rng.expovariate(self.cfg.md_rate_hz), self._on_md, s)
+            self.clock.call_later(self.rng.expovariate(self.cfg.trade_rate_hz), self._on_trade, s)
+
+    # ---- interfaz DataFeedWS ----
+    async def run(self): ...
+    async def stop(self): ...
+    def subscribed_symbols(self) -> List[str]: return list(self._mid)
+    def snapshot(self) -> Dict[str, Quote2]: return dict(self._book)
+    def token_value(self) -> str: return "sim"
+
+    def new_cl_ord_id(self) -> str:
+        self._seq += 1
+        return f"SIM-{self._seq}"
+
+    async def wait_updates(self, timeout: float) -> Set[str]:
+        if not self._dirty:
+            deadline = self.clock.time_ns() + int(timeout * 1e9)
+            nxt = self.clock.next_event_ns()
+            self.clock.advance(deadline if nxt is None else min(nxt, deadline))
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    async def next_exec_report(self) -> ExecReport:
+        if self._er_default is None:
+            self._er_default = self.er_router.subscribe()
+        return await self.clock.wait_queue(self._er_default, float("inf"))
+
+    async def send_limit(self, symbol: str, side: str, qty: int, price: float, tif: str="DAY", iceberg: bool=False, display_qty: int|None=None, cl_ord_id: Optional[str]=None) -> str:
+        clid = cl_ord_id or self.new_cl_ord_id()
+        self.oms.on_send(clid, symbol, side, qty, price, tif)
+        self.submit({"type":"no", "clOrdId":clid, "product":{"marketId":"ROFX","symbol":symbol},
+                     "price":price, "quantity":qty, "side":side, "timeInForce":tif})
+        return clid
+
+    async def send_market(self, symbol: str, side: str, qty: int, tif: str="IOC", cl_ord_id: Optional[str]=None):
+        clid = cl_ord_id or self.new_cl_ord_id()
+        self.oms.on_send(clid, symbol, side, qty, None, tif)
+        self.submit({"type":"no", "clOrdId":clid, "product":{"marketId":"ROFX","symbol":symbol},
+                     "quantity":qty, "side":side, "ordType":"MARKET", "timeInForce":tif})
+        return clid
+
+    async def cancel(self, cl_ord_id: str):
+        """'co': llega al exchange a rtt/2; si la orden sigue apoyada se baja y sale el CANCELLED"""
+        rtt = self.cfg.rtt_ms * math.exp(self.rng.gauss(0, self.cfg.rtt_sigma))
+        self.clock.call_later(rtt / 2000.0, self._on_cancel, cl_ord_id)
+
+    # ---- exchange ----
+    def submit(self, no: dict):
+        """recibe un `no` como el que manda PrimaryWS; llega al matching después de rtt/2"""
+        rtt = self.cfg.rtt_ms * math.exp(self.rng.gauss(0, self.cfg.rtt_sigma))
+        self.rtts_ms.append(rtt)
+        o = dict(clid=no["clOrdId"], sym=no["product"]["symbol"], side=no["side"], qty=int(no["quantity"]),
+                 px=None if no.get("ordType") == "MARKET" else float(no["price"]),
+                 tif=str(no.get("timeInForce", "DAY")).upper(), cum=0, queue=0.0, oneway_ns=int(rtt / 2 * 1e6))
+        self.clock.call_later(rtt / 2000.0, self._on_order, o)
+
+    def _emit(self, o: dict, status: str, last_px: float = 0.0, last_qty: int = 0):
+        j = {"type":"er", "clOrdId":o["clid"], "orderId":o["clid"], "product":{"marketId":"ROFX","symbol":o["sym"]},
+             "side":o["side"], "status":status, "price":o["px"] or 0.0, "quantity":o["qty"],
+             "cumQty":o["cum"], "leavesQty":o["qty"] - o["cum"]}
+        if last_qty:
+            j["lastPx"] = last_px; j["lastQty"] = last_qty
+        t_ns = self.clock.time_ns() + o["oneway_ns"]
+        self.clock.call_at(t_ns, lambda: self.er_router.publish(parse_er(j, pd.Timestamp(self.clock.time_ns(), tz="UTC"))))
+
+    def _fill(self, o: dict, px: float, qty: int):
+        slip = self.cfg.slip_bps / 1e4
+        px = px * (1 + slip) if o["side"] == "BUY" else px * (1 - slip)
+        o["cum"] += qty
+        sign = 1 if o["side"] == "BUY" else -1
+        self.pos[o["sym"]] = self.pos.get(o["sym"], 0) + sign * qty
+        notional = px * qty
+        if o["sym"].endswith("D"):
+            self.cash_usd -= sign * notional
+            self.fees_ars += notional * self.cfg.cost_bps / 1e4 * self._fx()
+        else:
+            self.cash_ars -= sign * notional
+            self.fees_ars += notional * self.cfg.cost_bps / 1e4
+        self._emit(o, "FILLED" if o["cum"] >= o["qty"] else "PARTIALLY_FILLED", px, qty)
+
+    def _cross(self, o: dict) -> int:
+        """matchea contra el top opuesto; devuelve lo que quedó sin llenar"""
+        q = self._book[o["sym"]]
+        leaves = o["qty"] - o["cum"]
+        if o["side"] == "BUY":
+            px, avail = q.ask, q.ask_qty
+            ok = o["px"] is None or px <= o["px"]
+        else:
+            px, avail = q.bid, q.bid_qty
+            ok = o["px"] is None or px >= o["px"]
+        if not ok or avail <= 0:
+            return leaves
+        n = min(leaves, int(avail))
+        if self.rng.random() < self.cfg.partial_prob:
+            n = int(n * self.rng.random())
+        if n > 0:
+            self._fill(o, px, n)
+            if o["side"] == "BUY": self._book[o["sym"]] = dataclasses.replace(q, ask_qty=avail - n)
+            else: self._book[o["sym"]] = dataclasses.replace(q, bid_qty=avail - n)
+        return leaves - n
+
+    def _on_order(self, o: dict):
+        self._emit(o, "NEW")
+        leaves = self._cross(o)
+        if leaves <= 0:
+            return
+        if o["tif"] == "DAY" and o["px"] is not None:
+            q = self._book[o["sym"]]
+            best = q.bid if o["side"] == "BUY" else q.ask
+            better = o["px"] > best if o["side"] == "BUY" else o["px"] < best
+            # cola: si mejoramos el precio quedamos primeros; si igualamos, detrás del top visible
+            o["queue"] = 0.0 if better else (q.bid_qty if o["side"] == "BUY" else q.ask_qty) if o["px"] == best else float("inf")
+            self._resting.setdefault(o["sym"], []).append(o)
+        else:
+            self._emit(o, "CANCELLED")
+
+    def _on_cancel(self, clid: str):
+        for rest in self._resting.values():
+            for o in rest:
+                if o["clid"] == clid:
+                    rest.remove(o)
+                    self._emit(o, "CANCELLED")
+                    return
+
+    def _fx(self) -> float:
+        ars = [s for s in self._mid if not s.endswith("D") and f"{s}D" in self._mid]
+        return self._mid[ars[0]] / self._mid[f"{ars[0]}D"] if ars else 1.0
+
+    def _refresh_book(self, s: str):
+        c = self.cfg
+        m = self._mid[s]
+        h = m * c.spread_bps / 2e4
+        self._book[s] = Quote2(
+            ts=pd.Timestamp(self.clock.time_ns(), tz="UTC"), bid=m - h, ask=m + h,
+            bid_qty=float(max(1, int(self.rng.expovariate(1 / c.depth)))),
+            ask_qty=float(max(1, int(self.rng.expovariate(1 / c.depth)))),
+        )
+        self._dirty.add(s)
+
+    def _on_md(self, s: str):
+        self._mid[s] *= math.exp(self.rng.gauss(0, self.cfg.vol_bps / 1e4))
+        self._refresh_book(s)
+        for o in list(self._resting.get(s, ())):
+            q = self._book[s]
+            best = q.bid if o["side"] == "BUY" else q.ask
+            if (o["side"] == "BUY" and o["px"] > best) or (o["side"] == "SELL" and o["px"] < best):
+                o["queue"] = 0.0          # el book se corrió detrás nuestro: somos top
+            if self._cross(o) <= 0:
+                self._resting[s].remove(o)
+        self.clock.call_later(self.rng.expovariate(self.cfg.md_rate_hz), self._on_md, s)
+
+    def _on_trade(self, s: str):
+        """flujo ajeno: consume la cola delante nuestro y después nos llena"""
+        size = self.rng.expovariate(1 / self.cfg.trade_size)
+        hit_bid = self.rng.random() < 0.5
+        for o in list(self._resting.get(s, ())):
+            if (o["side"] == "BUY") != hit_bid:
+                continue
+            eat = min(size, o["queue"]); o["queue"] -= eat; size -= eat
+            n = min(int(size), o["qty"] - o["cum"])
+            if n > 0 and o["queue"] <= 0:
+                self._fill(o, o["px"], n); size -= n
+                if o["cum"] >= o["qty"]: self._resting[s].remove(o)
+            if size <= 0: break
+        self.clock.call_later(self.rng.expovariate(self.cfg.trade_rate_hz), self._on_trade, s)
+
+    def mark_ars(self) -> float:
+        """pnl marcado a mid en ARS (cash + posiciones - fees)"""
+        fx = self._fx()
+        val = self.cash_ars + self.cash_usd * fx - self.fees_ars
+        for s, n in self.pos.items():
+            val += n * self._mid[s] * (fx if s.endswith("D") else 1.0)
+        return val
+
+async def _scenario(cfg: SimConfig, seed: int, qty: int, edge_bps: float, wait_ms: int, grace_ms: int) -> dict:
+    rng = random.Random(seed)
+    fx = 1450.0
+    mid_ars = 70000.0
+    ex = SimExchange({"AL30": mid_ars, "AL30D": mid_ars / fx * (1 + edge_bps / 1e4)}, cfg, VirtualClock(0), seed=rng.randrange(1 << 30))
+    ex.clock.advance(int(1e9))
+    snap = ex.snapshot()
+    qa, qu = snap["AL30"], snap["AL30D"]
+    ref = fx
+
+    def refs():
+        s2 = ex.snapshot()
+        qa2, qu2 = s2["AL30"], s2["AL30D"]
+        return dict(dir="A2U", ref=ref, implied_now=qa2.ask / qu2.bid if qu2.bid > 0 else None,
+                    book_ok=qu2.bid_qty > 0, rem_sell_px=qu2.bid)
+
+    t0 = ex.clock.time_ns()
+    res = await leg_buy_ioc_then_sell_smart(
+        ex, buy_symbol="AL30", buy_price=qa.ask, buy_qty_cap=qty,
+        sell_symbol="AL30D", sell_price=qu.bid, get_refs_and_implied=refs,
+        wait_ms=wait_ms, grace_ms=grace_ms,
+    )
+    leg_ms = (ex.clock.time_ns() - t0) / 1e6
+    ex.clock.advance(ex.clock.time_ns() + int(5e9))      # que lleguen los er rezagados
+    return dict(
+        seed=seed, rtt_ms=cfg.rtt_ms, depth=cfg.depth, partial_prob=cfg.partial_prob, **res,
+        leg_ms=leg_ms, residual=ex.pos.get("AL30", 0) + ex.pos.get("AL30D", 0),
+        fees_ars=ex.fees_ars, pnl_ars=ex.mark_ars(),
+    )
+
+async def stress(n: int = 1000, cfg: Optional[SimConfig] = None, seed: int = 0, qty: int = 100, edge_bps: float = 30.0,
+                 wait_ms: Optional[int] = None, grace_ms: Optional[int] = None, unwind_mode: Optional[str] = None,
+                 jitter: float = 0.5) -> pd.DataFrame:
+    """
+    corre `n` escenarios de leg_buy_ioc_then_sell_smart (A2U sobre AL30/AL30D) con configs aleatorias
+    alrededor de `cfg`; devuelve un DataFrame por escenario (bought/sold/unwound/residual/pnl/...).
+    """
+    base = cfg or SimConfig()
+    rng = random.Random(seed)
+    wait_ms = settings.WAIT_MS if wait_ms is None else wait_ms
+    grace_ms = settings.GRACE_MS if grace_ms is None else grace_ms
+    prev_mode = settings.UNWIND_MODE
+    if unwind_mode is not None:
+        settings.UNWIND_MODE = unwind_mode
+    rows = []
+    try:
+        for i in range(n):
+            c = base.jitter(rng, jitter) if jitter > 0 else base
+            rows.append(await _scenario(c, rng.randrange(1 << 30), qty, edge_bps, wait_ms, grace_ms))
+    finally:
+        settings.UNWIND_MODE = prev_mode
+    return pd.DataFrame(rows)
@@ -1,5 +1,7 @@
 import math
 from typing import Optional
+import numpy as np
+from settings import settings
 
 class MEPRef:
     """
@@ -79,3 +81,190 @@ class MEPRef:
         if mode == "tick": return self._inst_u2a
         c = [x for x in (self._inst_u2a, self._ema_u2a) if x]
         return max(c) if c else None
+
+    def update_snap(self, ts_unix: float, snap, pair) -> bool:
+        """update desde el snapshot con el par de referencia; False si falta alguna pata"""
+        qa, qu = snap.get(pair[0]), snap.get(pair[1])
+        if not (qa and qu):
+            return False
+        self.update(ts_unix=ts_unix, ask_peso_al30=qa.ask, bid_usd_al30d=qu.bid,
+                    bid_peso_al30=qa.bid, ask_usd_al30d=qu.ask)
+        return True
+
+# columnas de px (bid, ask, bid_qty, ask_qty) que arman cada implied: [a2u, u2a]
+_NUM, _DEN = [1, 0], [0, 1]            # ask ars / bid usd ; bid ars / ask usd
+_NUM_Q, _DEN_Q = [3, 2], [2, 3]        # qty del lado que se pega en cada pata
+
+def _median(v):
+    s = sorted(v); n = len(s); h = n // 2
+    return s[h] if n % 2 else 0.5 * (s[h - 1] + s[h])
+
+class MultiMEPRef:
+    """
+    refs inst/ema de TODOS los pares a la vez (arrays numpy, un update vectorizado por vuelta)
+    y una referencia compuesta, con la misma interfaz que MEPRef (inst_*/ema_*, ref_a2u/ref_u2a, set_half_life):
+      1. candidatos: pares con las dos patas y quotes frescas (REF_STALE_S)
+      2. top-N por liquidez (notional operable top-of-book, como operable_ars_*)
+      3. outliers fuera: |x - mediana| > REF_OUTLIER_K * MAD (con piso de 1 bp para MAD = 0)
+      4. REF_COMPOSITE: "weighted" (promedio ponderado por liquidez) | "median"
+    la ema es por par (cada uno con su dt), así un par que se seca no arrastra la referencia.
+    """
+    def __init__(self, pairs, half_life_s: float = 7.0):
+        self.set_half_life(half_life_s)
+        self.pairs = []
+        self.set_pairs(pairs)
+        self._inst = [None, None]            # compuesta inst (a2u, u2a)
+        self._ema = [None, None]             # compuesta ema; se arma recién cuando alguien la pide
+        self._ema_stale = False
+        self.used_a2u = []
+        self.used_u2a = []
+        self.rejected = []
+
+    def set_half_life(self, half_life_s: float):
+        self.half = max(float(half_life_s), 0.0)
+        self._tau = self.half / math.log(2) if self.half > 0 else None
+
+    def set_pairs(self, pairs):
+        """cambia el universo preservando el estado de los pares que siguen"""
+        old = {p: i for i, p in enumerate(self.pairs)}
+        n = len(pairs)
+        pe, last = np.full((n, 2), np.nan), np.full(n, np.nan)
+        for j, p in enumerate(pairs):
+            i = old.get(tuple(p))
+            if i is not None:
+                pe[j], last[j] = self.pe[i], self._last[i]
+        self.pairs = [tuple(p) for p in pairs]
+        # columnas 0 = a2u, 1 = u2a
+        self.pe, self._last = pe, last                    # ema por par
+        self.pi = np.full((n, 2), np.nan)                 # implied inst por par
+        self.liq = np.zeros((n, 2))                       # notional operable por par
+        self._ids_key = None
+
+    # ---- snapshot -> arrays ----
+    def _gather(self, snap):
+        """(px ars (n,4), px usd (n,4), ts_ns ars, ts_ns usd, ok) con columnas bid, ask, bid_qty, ask_qty"""
+        n = len(self.pairs)
+        ids = getattr(snap, "_ids", None)
+        if ids is not None and hasattr(snap, "px"):
+            # QuoteSnapshot: gather vectorizado por id de símbolo (índice cacheado por universo)
+            key = (id(ids), len(ids))
+            if key != self._ids_key:
+                self._ia = np.array([ids.get(a, -1) for a, _ in self.pairs], dtype=np.int64)
+                self._iu = np.array([ids.get(u, -1) for _, u in self.pairs], dtype=np.int64)
+                self._ids_key = key
+            m = len(snap.seq)
+            ia, iu = self._ia, self._iu
+            ok = (ia >= 0) & (iu >= 0) & (ia < m) & (iu < m)
+            ia, iu = np.where(ok, ia, 0), np.where(ok, iu, 0)
+            ok &= (snap.seq[ia] > 0) & (snap.seq[iu] > 0)
+            return snap.px[ia], snap.px[iu], snap.ts_ns[ia], snap.ts_ns[iu], ok
+        # dict de Quote2 (replay / sim)
+        pa, pu = np.zeros((n, 4)), np.zeros((n, 4))
+        ta, tu = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+        ok = np.zeros(n, dtype=bool)
+        for j, (a, u) in enumerate(self.pairs):
+            qa, qu = snap.get(a), snap.get(u)
+            if not (qa and qu): continue
+            pa[j] = (qa.bid, qa.ask, qa.bid_qty, qa.ask_qty)
+            pu[j] = (qu.bid, qu.ask, qu.bid_qty, qu.ask_qty)
+            ta[j] = getattr(qa, "ts_ns", None) or qa.ts.value
+            tu[j] = getattr(qu, "ts_ns", None) or qu.ts.value
+            ok[j] = True
+        return pa, pu, ta, tu, ok
+
+    def update_snap(self, ts_unix: float, snap, pair=None) -> bool:
+        """update de todos los pares + compuesta; `pair` se ignora (compat con MEPRef). False si no hay ref"""
+        if not self.pairs:
+            return False
+        pa, pu, ta, tu, ok = self._gather(snap)
+        # a2u = ask ars / bid usd ; u2a = bid ars / ask usd  (las dos columnas de una)
+        num, den = pa[:, _NUM], pu[:, _DEN]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = num / den
+        bad = ~((num > 0) & (den > 0))
+        bad[~ok] = True
+        stale_s = float(settings.REF_STALE_S)
+        if stale_s > 0:
+            bad[ts_unix - np.minimum(ta, tu) / 1e9 > stale_s] = True
+        x[bad] = np.nan
+        self.pi = x
+        # liquidez = notional operable top-of-book (mismo criterio que operable_ars_*); nan => fuera
+        self.liq = np.minimum(pa[:, _NUM_Q] * num, pu[:, _DEN_Q] * den * x)
+
+        # ema por par (dt propio); pares sin dato conservan la ema
+        has = ~bad
+        if self._tau is None:
+            self.pe[has] = x[has]
+        else:
+            dt = np.maximum(ts_unix - self._last, 0.0)
+            alpha = np.where(self._last == self._last, -np.expm1(-dt / self._tau), 1.0)
+            pe = self.pe
+            first = has & (pe != pe)
+            pe[first] = x[first]
+            upd = has & ~first
+            pe[upd] += (alpha[:, None] * (x - pe))[upd]
+        self._last[has.any(axis=1)] = ts_unix
+
+        self._inst[0], self.used_a2u, rej_a = self._composite(x[:, 0], self.liq[:, 0])
+        self._inst[1], self.used_u2a, rej_u = self._composite(x[:, 1], self.liq[:, 1])
+        self.rejected = sorted(set(rej_a) | set(rej_u))
+        self._ema_stale = True
+        return self._inst[0] is not None or self._inst[1] is not None
+
+    def _ema_ref(self, k: int):
+        if self._ema_stale:
+            self._ema = [self._composite(self.pe[:, j], self.liq[:, j])[0] for j in (0, 1)]
+            self._ema_stale = False
+        return self._ema[k]
+
+    def _composite(self, x: np.ndarray, w: np.ndarray):
+        """-> (valor, pares usados, pares descartados por outlier)"""
+        cand = np.flatnonzero((x == x) & (w > 0))          # x == x => no nan
+        if not len(cand):
+            return None, [], []
+        top = max(1, int(settings.REF_TOP_N))
+        if len(cand) > top:
+            cand = cand[np.argpartition(-w[cand], top - 1)[:top]]
+        # top-N es chico: de acá en más listas (np.median por vuelta cuesta más que el resto junto)
+        ids, v, ww = cand.tolist(), x[cand].tolist(), w[cand].tolist()
+        med = _median(v)
+        mad = _median([abs(a - med) for a in v]) * 1.4826
+        tol = float(settings.REF_OUTLIER_K) * max(mad, med * 1e-4)
+        keep = [k for k in range(len(v)) if abs(v[k] - med) <= tol]
+        if settings.REF_COMPOSITE.lower() == "median":
+            val = _median([v[k] for k in keep])
+        else:
+            val = sum(v[k] * ww[k] for k in keep) / sum(ww[k] for k in keep)
+        kept = set(keep)
+        return (val, [self.pairs[ids[k]] for k in keep],
+                [self.pairs[ids[k]] for k in range(len(v)) if k not in kept])
+
+    @property
+    def inst_a2u(self): return self._inst[0]
+    @property
+    def inst_u2a(self): return self._inst[1]
+    @property
+    def ema_a2u(self): return self._ema_ref(0)
+    @property
+    def ema_u2a(self): return self._ema_ref(1)
+
+    def ref_a2u(self, mode: str):
+        if mode == "tick": return self.inst_a2u
+        c = [x for x in (self.inst_a2u, self.ema_a2u) if x]
+        return min(c) if c else None
+
+    def ref_u2a(self, mode: str):
+        if mode == "tick": return self.inst_u2a
+        c = [x for x in (self.inst_u2a, self.ema_u2a) if x]
+        return max(c) if c else None
+
+    def status(self) -> dict:
+        f = lambda ps: [f"{a}:{u}" for a, u in ps]
+        return dict(method=settings.REF_COMPOSITE, top_n=int(settings.REF_TOP_N),
+                    used_a2u=f(self.used_a2u), used_u2a=f(self.used_u2a), rejected=f(self.rejected))
+
+def make_ref(pairs, half_life_s: float):
+    """REF_SOURCE=composite => MultiMEPRef sobre todos los pares; pair => MEPRef del par de referencia"""
+    if settings.REF_SOURCE.lower() == "composite":
+        return MultiMEPRef(pairs, half_life_s=half_life_s)
+    return MEPRef(half_life_s=half_life_s)
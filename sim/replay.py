@@ -0,0 +1,198 @@
+import asyncio, dataclasses, time
+from typing import Dict, List, Optional, Set, Tuple
+import pandas as pd
+
+from settings import settings
+from datafeed.base import DataFeedWS, ExecReport, Quote2
+from datafeed.primary_ws import ERRouter
+from datafeed.recorder import load_ticks
+from exec.reconciler import Reconciler
+from sim.mep_ref import make_ref
+from agent.strategy import run_a2u, run_u2a
+from agent.pair_index import PairIndex
+from discover.instruments import pairs_from_symbols
+from util.clock import VirtualClock
+from exec.oms import OMS
+
+# replay determinístico de la lógica de live_ws sobre ticks grabados, con reloj virtual;
+# matching a top-of-book sin cola (IOC cancela el remanente, DAY queda apoyada)
+
+FILL_CHUNK = 1 << 16
+
+class ReplayFeed(DataFeedWS):
+    def __init__(self, ticks, symbols: List[str], clock: Optional[VirtualClock] = None, er_latency_s: float = 0.0):
+        self._ticks = ticks
+        self._names = list(symbols)
+        self.clock = clock or VirtualClock(int(ticks[0]["ts_ns"]) if len(ticks) else 0)
+        self.er_router = ERRouter()
+        self.oms = OMS()
+        self.er_router.add_hook(self.oms.on_er)
+        self._er_default: Optional[asyncio.Queue] = None
+        self._lat_ns = int(er_latency_s * 1e9)
+        self._book: Dict[str, Quote2] = {}
+        self._dirty: Set[str] = set()
+        self._resting: Dict[str, List[dict]] = {}
+        self._seq = 0
+        self._rows: list = []
+        self._row0 = 0
+        self.n_ticks = len(ticks)
+        self.done = self.n_ticks == 0
+        if not self.done:
+            self.clock.call_at(int(ticks[0]["ts_ns"]), self._on_tick, 0)
+
+    # ---- interfaz DataFeedWS ----
+    async def run(self): ...
+    async def stop(self): ...
+    def subscribed_symbols(self) -> List[str]: return list(self._names)
+    def snapshot(self) -> Dict[str, Quote2]: return dict(self._book)
+    def token_value(self) -> str: return "replay"
+
+    def new_cl_ord_id(self) -> str:
+        self._seq += 1
+        return f"SIM-{self._seq}"
+
+    async def wait_updates(self, timeout: float) -> Set[str]:
+        """avanza el reloj virtual hasta el próximo evento (o timeout) y drena los símbolos tocados"""
+        if not self._dirty:
+            deadline = self.clock.time_ns() + int(timeout * 1e9)
+            nxt = self.clock.next_event_ns()
+            self.clock.advance(deadline if nxt is None else min(nxt, deadline))
+        dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    async def next_exec_report(self) -> ExecReport:
+        if self._er_default is None:
+            self._er_default = self.er_router.subscribe()
+        return await self.clock.wait_queue(self._er_default, float("inf"))
+
+    async def send_limit(self, symbol: str, side: str, qty: int, price: float, tif: str="DAY", iceberg: bool=False, display_qty: int|None=None, cl_ord_id: Optional[str]=None) -> str:
+        clid = cl_ord_id or self.new_cl_ord_id()
+        self.oms.on_send(clid, symbol, side, qty, price, tif)
+        self._er(symbol, side, price, qty, "NEW", clid)
+        leaves = self._match(symbol, side, int(qty), price, clid)
+        if leaves > 0:
+            if tif.upper() == "DAY":
+                self._resting.setdefault(symbol, []).append(dict(clid=clid, side=side, px=price, leaves=leaves, qty=int(qty)))
+            else:
+                self._er(symbol, side, price, leaves, "CANCELLED", clid)
+        return clid
+
+    async def send_market(self, symbol: str, side: str, qty: int, tif: str="IOC", cl_ord_id: Optional[str]=None):
+        clid = cl_ord_id or self.new_cl_ord_id()
+        self.oms.on_send(clid, symbol, side, qty, None, tif)
+        self._er(symbol, side, 0.0, qty, "NEW", clid)
+        leaves = self._match(symbol, side, int(qty), None, clid)
+        if leaves > 0:
+            self._er(symbol, side, 0.0, leaves, "CANCELLED", clid)
+        return clid
+
+    async def cancel(self, cl_ord_id: str):
+        for sym, rest in self._resting.items():
+            for o in rest:
+                if o["clid"] == cl_ord_id:
+                    rest.remove(o)
+                    self._er(sym, o["side"], o["px"], o["leaves"], "CANCELLED", cl_ord_id)
+                    return
+
+    # ---- motor ----
+    def _er(self, symbol, side, price, qty, status, clid):
+        er = ExecReport(
+            ts=pd.Timestamp(self.clock.time_ns(), tz="UTC"), symbol=symbol, side=side,
+            price=float(price or 0), qty=float(qty), status=status, order_id=clid, cl_ord_id=clid,
+        )
+        if self._lat_ns:
+            self.clock.call_at(self.clock.time_ns() + self._lat_ns, self.er_router.publish, er)
+        else:
+            self.er_router.publish(er)
+
+    def _match(self, symbol: str, side: str, qty: int, limit: Optional[float], clid: str) -> int:
+        q = self._book.get(symbol)
+        if q is None or qty <= 0:
+            return qty
+        if side == "BUY":
+            px, avail = q.ask, q.ask_qty
+            crosses = px > 0 and (limit is None or px <= limit)
+        else:
+            px, avail = q.bid, q.bid_qty
+            crosses = px > 0 and (limit is None or px >= limit)
+        fill = min(qty, int(avail)) if crosses else 0
+        if fill <= 0:
+            return qty
+        # consumimos la liquidez hasta el próximo tick del símbolo
+        if side == "BUY":
+            self._book[symbol] = dataclasses.replace(q, ask_qty=avail - fill)
+        else:
+            self._book[symbol] = dataclasses.replace(q, bid_qty=avail - fill)
+        leaves = qty - fill
+        self._er(symbol, side, px, fill, "FILLED" if leaves == 0 else "PARTIALLY_FILLED", clid)
+        return leaves
+
+    def _on_tick(self, i: int):
+        j = i - self._row0
+        if j >= len(self._rows):
+            self._row0 = i
+            self._rows = self._ticks[i:i + FILL_CHUNK].tolist()
+            j = 0
+        ts_ns, sid, bid, ask, bq, aq = self._rows[j]
+        sym = self._names[sid]
+        self._book[sym] = Quote2(ts=pd.Timestamp(ts_ns, tz="UTC"), bid=bid, ask=ask, bid_qty=bq, ask_qty=aq)
+        self._dirty.add(sym)
+        rest = self._resting.get(sym)
+        if rest:
+            for o in list(rest):
+                o["leaves"] = self._match(sym, o["side"], o["leaves"], o["px"], o["clid"])
+                if o["leaves"] <= 0: rest.remove(o)
+        if i + 1 < self.n_ticks:
+            nxt = self._rows[j + 1][0] if j + 1 < len(self._rows) else int(self._ticks[i + 1]["ts_ns"])
+            self.clock.call_at(nxt, self._on_tick, i + 1)
+        else:
+            self.done = True
+
+async def run_replay(path: str, pairs: Optional[List[Tuple[str, str]]] = None,
+                     cash_ars: float = 1_000_000.0, cash_usd: float = 1_000.0,
+                     er_latency_s: float = 0.0, tracer=None) -> dict:
+    """
+    reproduce un archivo de ticks corriendo agent.strategy (run_a2u/run_u2a + leg_buy_ioc_then_sell_smart)
+    como en live_ws: tick-driven, poll_s como heartbeat, ref mep desde el par de referencia.
+    """
+    t_wall = time.perf_counter()
+    ticks, symbols = load_ticks(path)
+    feed = ReplayFeed(ticks, symbols, er_latency_s=er_latency_s)
+    pairs = pairs or pairs_from_symbols(symbols)
+    if not pairs:
+        raise ValueError("no hay pares ars/usd en el archivo de ticks")
+    ref_pair = next((p for p in pairs if p[0].upper() == "AL30" and p[1].upper() == "AL30D"), pairs[0])
+    pidx = PairIndex(pairs)
+    ref = make_ref(pairs, half_life_s=float(settings.HALF_LIFE_S))
+    rec = Reconciler(cash_ars, cash_usd)
+    q_er = feed.er_router.subscribe()
+    rows: List[dict] = []
+    cycles = 0
+
+    while not feed.done or feed.clock.next_event_ns() is not None:
+        dirty = await feed.wait_updates(settings.poll_s)
+        while not q_er.empty():
+            rec.apply_er(q_er.get_nowait())
+        cycles += 1
+        snap = feed.snapshot()
+        pidx.update(snap, dirty)
+        if not ref.update_snap(feed.clock.time(), snap, ref_pair):
+            continue
+        a2u_ref = ref.ref_a2u(settings.REF_MODE)
+        u2a_ref = ref.ref_u2a(settings.REF_MODE)
+        moved = pidx.set_limits(a2u_ref * (1 - settings.thresh_pct) if a2u_ref else None,
+                                u2a_ref * (1 + settings.thresh_pct) if u2a_ref else None)
+        if a2u_ref:
+            scope = None if moved else pidx.scope(dirty, ref_pair, feed.clock.time(), settings.poll_s,
+                                                  (rec.cash.ars, rec.cash.usd))
+            rows += await run_a2u(feed, pidx.a2u_candidates(scope), snap, a2u_ref, rec.cash.ars, ref, tracer)
+        if u2a_ref:
+            rows += await run_u2a(feed, pidx.u2a_best(settings.u2a_topk), snap, u2a_ref, rec.cash.usd, ref, tracer)
+
+    while not q_er.empty():
+        rec.apply_er(q_er.get_nowait())
+    return dict(
+        rows=rows, positions=rec.snapshot_positions(), cash_ars=rec.cash.ars, cash_usd=rec.cash.usd,
+        ticks=feed.n_ticks, cycles=cycles, sim_s=(feed.clock.time_ns() - int(ticks[0]["ts_ns"])) / 1e9 if len(ticks) else 0.0,
+        wall_s=time.perf_counter() - t_wall,
+    )
@@ -2,11 +2,20 @@
 import base64
 import json
 import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
 from pathlib import Path
 
 import pandas as pd
 import streamlit as st
 
+from settings import settings
+from util.control import ONE_SHOT, send_control
+from util.tail import TailReader
+
 STATUS_JSON     = "assets/plots/status.json"
 CONTROL_JSON    = "assets/plots/control.json"
 TRACE_PATH_DEF  = "assets/plots/trace.log"
@@ -14,17 +23,88 @@ TRADES_CSV      = "assets/plots/live_trades.csv"
 ER_CSV          = "assets/plots/execution_reports.csv"
 BOOKS_JSON      = "assets/plots/books.json"
 POSITIONS_JSON  = "assets/plots/positions.json"
+TRADES_JSON     = "assets/plots/trades.json"
 ENV_FILE        = ".env"
 
 st.set_page_config(page_title="Mesita — Control Panel", layout="wide")
 
 # ---------------- helpers ----------------
-def load_json(path: str) -> dict:
-    if not os.path.exists(path): return {}
+@st.cache_data(max_entries=64, show_spinner=False)
+def _read_json(path: str, mtime_ns: int, size: int) -> dict:
+    # clave = (path, mtime, size): mientras el bot no reescriba el archivo no se vuelve a leer el disco
     try:
         with open(path, "r", encoding="utf-8") as f: return json.load(f)
     except Exception: return {}
 
+def load_json(path: str) -> dict:
+    try: st_ = os.stat(path)
+    except OSError: return {}
+    return _read_json(path, st_.st_mtime_ns, st_.st_size)
+
+@st.cache_resource
+def _http_states() -> dict:
+    return {}                                 # nombre -> (versión, payload) del publisher http
+
+def load_state(name: str, path: str) -> dict:
+    """estado publicado por el bot: http local si ui_http_port > 0 (304 si la versión no cambió), si no el json"""
+    port = int(settings.ui_http_port or 0)
+    if port > 0:
+        cache = _http_states()
+        ver, data = cache.get(name, (None, None))
+        url = f"http://{settings.ui_http_host}:{port}/state/{name}" + (f"?v={ver}" if ver is not None else "")
+        try:
+            with urllib.request.urlopen(url, timeout=0.5) as r:
+                data = json.loads(r.read())
+            cache[name] = (data.get("_v"), data)
+            return data
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and data is not None:
+                return data
+        except Exception:
+            pass
+    return load_json(path)
+
+class ImpliedRing:
+    """
+    serie de implied (a2u / u2a) vs ref por par de los últimos `minutes`, en memoria del server de streamlit:
+    se agrega un punto sólo cuando cambia la versión del status (no por rerun) y se recorta por tiempo.
+    """
+    def __init__(self, minutes: float = 15.0):
+        self.window_s = minutes * 60.0
+        self.pts = {}                            # par -> deque[(ts, a2u, u2a, ref_a2u, ref_u2a)]
+        self._last = None
+        self._lock = threading.Lock()
+
+    def add(self, status: dict):
+        key = status.get("_v", status.get("ts"))
+        if key is None or key == self._last:
+            return
+        ts = float(status.get("ts") or time.time())
+        ra, ru = ref_values_from_status(status)
+        with self._lock:
+            self._last = key
+            for pair, (a, u) in (status.get("implied") or {}).items():
+                d = self.pts.setdefault(pair, deque())
+                d.append((ts, a, u, ra, ru))
+                while d and ts - d[0][0] > self.window_s:
+                    d.popleft()
+
+    def frame(self, pair: str) -> pd.DataFrame:
+        with self._lock:
+            rows = list(self.pts.get(pair, ()))
+        df = pd.DataFrame(rows, columns=["ts", "implied_a2u", "implied_u2a", "ref_a2u", "ref_u2a"])
+        df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        return df.set_index("ts")
+
+@st.cache_resource
+def implied_ring(minutes: float) -> ImpliedRing:
+    return ImpliedRing(minutes)
+
+@st.cache_resource
+def tail_reader(path: str, n: int, header: bool = False) -> TailReader:
+    """un TailReader por archivo que sobrevive a los reruns: cada refresco lee sólo las líneas nuevas"""
+    return TailReader(path, n, header)
+
 def save_json(path: str, obj: dict):
     tmp = f"{path}.tmp"
     with open(tmp, "w", encoding="utf-8") as f:
@@ -32,7 +112,13 @@ def save_json(path: str, obj: dict):
     os.replace(tmp, path)
 
 def merge_control(overrides: dict):
-    cur = load_json(CONTROL_JSON); cur.update(overrides); save_json(CONTROL_JSON, cur)
+    """one-shots como comandos y el resto como un "set" (diff) por el canal de control; devuelve los acks"""
+    acks = [send_control(k, path=CONTROL_JSON) for k in ONE_SHOT if overrides.get(k) is True]
+    rest = {k: v for k, v in overrides.items() if k not in ONE_SHOT}
+    if rest: acks.append(send_control("set", rest, path=CONTROL_JSON))
+    bad = [a for a in acks if not a.get("ok")]
+    if bad: st.warning(f"control: {bad[0].get('error', 'sin ack')}")
+    return acks
 
 def human_size(n: int | None) -> str:
     if n is None: return "n/a"
@@ -67,7 +153,7 @@ def ref_values_from_status(status: dict):
 
 # ---------------- sidebar ----------------
 st.sidebar.title("Status")
-status = load_json(STATUS_JSON)
+status = load_state("status", STATUS_JSON)
 st.sidebar.write(f"Balance Mode: **{status.get('source','?')}**")
 st.sidebar.write(f"Trading Enabled: **{status.get('trading_enabled', False)}**")
 st.sidebar.write(f"Cash ARS: **{status.get('cash_ars','?')}**")
@@ -76,6 +162,8 @@ st.sidebar.write(f"Ref Mode: **{status.get('ref_mode','?')}**")
 st.sidebar.write(f"Half-Life (s): **{status.get('half_life_s','?')}**")
 st.sidebar.write(f"Ref Tune: **{status.get('ref_tune','?')}**")
 st.sidebar.caption(f"TS: {status.get('ts','-')}")
+ctl_st = status.get("control") or {}
+if ctl_st: st.sidebar.caption(f"Control: {'socket' if ctl_st.get('socket') else 'file'} · seq {ctl_st.get('seq')}")
 
 trace_path = status.get("trace_path", TRACE_PATH_DEF)
 try:
@@ -84,6 +172,11 @@ except Exception:
     trace_size = None
 st.sidebar.write(f"Trace: **{human_size(trace_size)}**")
 
+# vistas en vivo (market / positions / latencia): st.fragment re-ejecuta sólo esa parte cada N s
+auto = st.sidebar.toggle("Auto-refresh", value=True)
+refresh_s = st.sidebar.select_slider("Refresh (s)", options=[0.5, 1.0, 2.0, 5.0, 10.0], value=1.0)
+RUN_EVERY = refresh_s if auto else None
+
 with st.sidebar.expander("Quick Actions"):
     col_a, col_b = st.columns(2)
     if col_a.button("Panic Stop", use_container_width=True):
@@ -104,9 +197,10 @@ tab_market, tab_positions, tab_ref, tab_ctrl, tab_safety, tab_trace, tab_logs, t
 )
 
 # ========== MARKET ==========
-with tab_market:
+@st.fragment(run_every=RUN_EVERY)
+def market_view():
     st.subheader("Top-of-Book (Live)")
-    bj = load_json(BOOKS_JSON); books = bj.get("books", {})
+    bj = load_state("books", BOOKS_JSON); books = bj.get("books", {})
     if not books:
         st.info("No live books yet.")
     else:
@@ -123,11 +217,31 @@ with tab_market:
         if q: df = df[df["Symbol"].str.contains(q, case=False)]
         st.dataframe(df.sort_values(by=sort_col), use_container_width=True, height=420)
 
+    # implied vs referencia por par (ring en memoria de la ui, se llena mientras el panel está abierto)
+    stt = load_state("status", STATUS_JSON)
+    ring = implied_ring(float(settings.ui_chart_minutes))
+    ring.add(stt)
+    pairs = sorted((stt.get("implied") or {}).keys())
+    if pairs:
+        rp = stt.get("ref_pair", {}) or {}
+        ref_key = f"{rp.get('ars')}:{rp.get('usd')}"
+        pair = st.selectbox("Implied vs Ref", pairs, index=pairs.index(ref_key) if ref_key in pairs else 0)
+        dfi = ring.frame(pair)
+        c1, c2 = st.columns(2)
+        c1.caption("ARS→USD: implied vs ref"); c1.line_chart(dfi[["implied_a2u", "ref_a2u"]], height=260)
+        c2.caption("USD→ARS: implied vs ref"); c2.line_chart(dfi[["implied_u2a", "ref_u2a"]], height=260)
+        st.caption(f"últimos {settings.ui_chart_minutes:g} min · {len(dfi)} puntos")
+
+with tab_market:
+    market_view()
+
 # ========== POSITIONS ==========
-with tab_positions:
+@st.fragment(run_every=RUN_EVERY)
+def positions_view():
     st.subheader("Positions & Cash")
-    pj = load_json(POSITIONS_JSON)
-    st.write(f"**Cash ARS:** {pj.get('cash_ars', status.get('cash_ars'))} — **Cash USD:** {pj.get('cash_usd', status.get('cash_usd'))}")
+    stt = load_state("status", STATUS_JSON)
+    pj = load_state("positions", POSITIONS_JSON)
+    st.write(f"**Cash ARS:** {pj.get('cash_ars', stt.get('cash_ars'))} — **Cash USD:** {pj.get('cash_usd', stt.get('cash_usd'))}")
     pos = pj.get("positions", {})
     if pos:
         pdf = pd.DataFrame([{"Symbol":k,"Qty":v} for k,v in pos.items()]).sort_values("Symbol")
@@ -135,6 +249,9 @@ with tab_positions:
     else:
         st.info("No positions reported yet.")
 
+with tab_positions:
+    positions_view()
+
 # ========== REFERENCE & LATENCY ==========
 with tab_ref:
     st.subheader("MEP Reference & Auto-Tune")
@@ -148,19 +265,23 @@ with tab_ref:
         st.metric("Ref Mode", status.get("ref_mode","-"))
         st.write(f"Instant U2A: **{status.get('ref_inst_u2a','-')}**")
         st.write(f"EMA U2A: **{status.get('ref_ema_u2a','-')}**")
+    rt = status.get("rtt") or {}
+    st.caption(f"RTT pasivo (órdenes reales): q{rt.get('q','-')} = **{rt.get('rtt_ms','-')} ms** · n={rt.get('n',0)} · idle {rt.get('idle_s','-')} s · probes {rt.get('probes',0)}")
 
     st.divider()
     st.subheader("Parameters")
     ref_mode = st.selectbox("REF_MODE", options=["tick","hybrid"], index=0 if status.get("ref_mode","tick")=="tick" else 1)
-    cols = st.columns(4)
+    cols = st.columns(5)
     with cols[0]:
         ref_tune = st.checkbox("REF_TUNE (Auto-Adjust EMA)", value=bool(status.get("ref_tune", True)))
     with cols[1]:
         half_life_s = st.slider("HALF_LIFE_S (if REF_TUNE=off)", 0.0, 30.0, float(status.get("half_life_s",7.0)), 0.5)
     with cols[2]:
-        ref_k = st.slider("REF_K (≈ K × median RTT s)", 1.0, 10.0, float(status.get("ref_k",4.0)), 0.5)
+        ref_k = st.slider("REF_K (≈ K × RTT quantile s)", 1.0, 10.0, float(status.get("ref_k",4.0)), 0.5)
     with cols[3]:
-        lat_probe_s = st.slider("LAT_PROBE_S (s)", 2.0, 60.0, float(status.get("lat_probe_s",10.0)), 1.0)
+        ref_q = st.slider("REF_Q (RTT quantile)", 0.5, 0.99, float(status.get("ref_q",0.5)), 0.01)
+    with cols[4]:
+        lat_probe_s = st.slider("LAT_PROBE_S (idle s before probe)", 2.0, 60.0, float(status.get("lat_probe_s",10.0)), 1.0)
 
     col_min, col_max = st.columns(2)
     with col_min:
@@ -169,7 +290,7 @@ with tab_ref:
         ref_max_hl = st.slider("REF_MAX_HL_S", 0.0, 60.0, float(status.get("ref_max",20.0)), 0.5)
 
     if st.button("Apply Reference/Latency", type="primary"):
-        payload = {"REF_MODE":ref_mode,"REF_TUNE":ref_tune,"REF_K":ref_k,"REF_MIN_HL_S":ref_min_hl,"REF_MAX_HL_S":ref_max_hl,"LAT_PROBE_S":lat_probe_s}
+        payload = {"REF_MODE":ref_mode,"REF_TUNE":ref_tune,"REF_K":ref_k,"REF_Q":ref_q,"REF_MIN_HL_S":ref_min_hl,"REF_MAX_HL_S":ref_max_hl,"LAT_PROBE_S":lat_probe_s}
         if not ref_tune: payload["HALF_LIFE_S"] = half_life_s
         merge_control(payload); st.success("Reference/Latency applied")
 
@@ -199,11 +320,32 @@ with tab_ctrl:
 # ========== SAFETY ==========
 with tab_safety:
     st.subheader("Risk & Execution")
-    st.caption("Caps diarios/por símbolo — placeholders: el core ya limita por profundidad y saldo.")
+    st.caption("Pre-trade en el core (exec/risk.py): toda compra se valida contra cash reservado y estos caps. 0 = sin límite.")
+    rk = status.get("risk", {}) or {}
+    lim = rk.get("limits", {}) or {}
+    risk_enabled = st.checkbox("risk_enabled", value=bool(rk.get("enabled", True)))
     c1,c2,c3 = st.columns(3)
-    c1.number_input("Daily Notional Cap (ARS) [placeholder]", 0.0, value=0.0, step=100000.0)
-    c2.number_input("Per-Trade Cap (ARS) [placeholder]", 0.0, value=0.0, step=10000.0)
-    c3.number_input("Max Pending per Symbol [placeholder]", 0, value=0, step=1)
+    daily_cap = c1.number_input("Daily Notional Cap (ARS)", 0.0, value=float(lim.get("daily_notional_ars", 0.0)), step=100000.0)
+    trade_cap = c2.number_input("Per-Trade Cap (ARS)", 0.0, value=float(lim.get("per_trade_ars", 0.0)), step=10000.0)
+    pend_cap  = c3.number_input("Max Pending per Symbol", 0, value=int(lim.get("max_pending_per_symbol", 0)), step=1)
+    c4,c5,c6 = st.columns(3)
+    open_cap = c4.number_input("Max Open Orders", 0, value=int(lim.get("max_open_orders", 0)), step=1)
+    pos_cap  = c5.number_input("Max Position per Symbol (nominales)", 0, value=int(lim.get("max_pos_per_symbol", 0)), step=100)
+    legs_cap = c6.number_input("Max Concurrent Legs", 1, value=int((status.get("exec", {}) or {}).get("max_concurrent", 4)), step=1)
+    if st.button("Apply Risk Caps"):
+        merge_control({"risk_enabled":risk_enabled, "risk_daily_notional_ars":daily_cap, "risk_per_trade_ars":trade_cap,
+                       "risk_max_pending_per_symbol":pend_cap, "risk_max_open_orders":open_cap,
+                       "risk_max_pos_per_symbol":pos_cap, "max_concurrent_legs":legs_cap})
+        st.success("Risk caps applied")
+
+    st.markdown("---")
+    m1,m2,m3,m4 = st.columns(4)
+    m1.metric("Daily Notional (ARS)", f"{rk.get('daily_notional_ars',0.0):,.0f}")
+    m2.metric("Reserved ARS / USD", f"{rk.get('reserved_ars',0.0):,.0f} / {rk.get('reserved_usd',0.0):,.2f}")
+    m3.metric("Open Orders", rk.get("open_orders", 0))
+    m4.metric("Rejects", rk.get("rejects", 0))
+    if rk.get("pending"): st.write("Pending por símbolo:", rk["pending"])
+    if rk.get("last_reject"): st.write("Último reject:", rk["last_reject"])
 
 # ========== TRACE ==========
 with tab_trace:
@@ -224,17 +366,23 @@ with tab_trace:
     st.caption(f"File: {trace_path} — Size: {human_size(tsz)}")
     if os.path.exists(trace_path):
         try:
-            with open(trace_path,"r",encoding="utf-8") as f: lines=f.readlines()[-200:]
-            st.text_area("Last 200 lines", value="".join(lines), height=240)
+            st.text_area("Last 200 lines", value=tail_reader(trace_path, 200).text(), height=240)
         except Exception as e: st.warning(f"Cannot read trace: {e}")
 
 # ========== LOGS ==========
 with tab_logs:
     st.subheader("Live Trades")
-    if os.path.exists(TRADES_CSV):
+    tj = load_state("trades", TRADES_JSON)
+    if tj.get("rows"):
+        # cola en memoria del journal (señales + fills), sin leer el csv
+        jst = tj.get("journal") or {}
+        j1, j2, j3 = st.columns(3)
+        j1.metric("Signals", jst.get("signals", 0)); j2.metric("Fills", jst.get("fills", 0))
+        j3.metric("Realized PnL", " / ".join(f"{k} {v:,.2f}" for k, v in (jst.get("realized") or {}).items()) or "-")
+        st.dataframe(pd.DataFrame(tj["rows"]).tail(300), use_container_width=True, height=300)
+    elif os.path.exists(TRADES_CSV):
         try:
-            df = pd.read_csv(TRADES_CSV)
-            st.dataframe(df.tail(300), use_container_width=True, height=300)
+            st.dataframe(tail_reader(TRADES_CSV, 300, True).frame(), use_container_width=True, height=300)
         except Exception as e:
             st.warning(f"Cannot read {TRADES_CSV}: {e}")
     else:
@@ -242,14 +390,25 @@ with tab_logs:
     st.subheader("Execution Reports")
     if os.path.exists(ER_CSV):
         try:
-            df2 = pd.read_csv(ER_CSV)
-            st.dataframe(df2.tail(300), use_container_width=True, height=300)
+            st.dataframe(tail_reader(ER_CSV, 300, True).frame(), use_container_width=True, height=300)
         except Exception as e:
             st.warning(f"Cannot read {ER_CSV}: {e}")
     else:
         st.info("No execution reports yet.")
 
 # ========== HEALTH ==========
+@st.fragment(run_every=RUN_EVERY)
+def latency_view():
+    st.markdown("**Latency by stage (µs)**")
+    lat = load_state("status", STATUS_JSON).get("latency") or {}
+    if lat:
+        df_lat = pd.DataFrame.from_dict(lat, orient="index").reindex(columns=["n","p50","p90","p99","max","mean"])
+        st.dataframe(df_lat, use_container_width=True)
+        st.bar_chart(df_lat[["p50","p90","p99"]])
+        st.caption("md.* = ws recv→decode→store · tick_to_eval / tick_to_signal = tick→loop / señal · signal_to_send · send_to_er = envío→primer ER (por clOrdId)")
+    else:
+        st.info("Sin muestras de latencia todavía.")
+
 with tab_health:
     st.subheader("Health")
     rp = status.get("ref_pair", {})
@@ -257,6 +416,9 @@ with tab_health:
     st.write(f"Ref Mode: **{status.get('ref_mode','-')}** — Half-Life (s): **{status.get('half_life_s','-')}** — Ref Tune: **{status.get('ref_tune','-')}**")
     st.write(f"Latency Probe (s): **{status.get('lat_probe_s','-')}** — K: **{status.get('ref_k','-')}** — Min/Max HL: **{status.get('ref_min','-')} / {status.get('ref_max','-')}**")
 
+    st.markdown("---")
+    latency_view()
+
 # ========== ACCOUNTS (NUEVO) ==========
 with tab_accounts:
     st.subheader("Accounts & Credentials")
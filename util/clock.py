@@ -0,0 +1,69 @@
+import asyncio, heapq, itertools, math, time
+from typing import Callable, List, Optional, Tuple
+
+class RealClock:
+    """reloj de pared + esperas reales del event loop (live)"""
+    def time(self) -> float: return time.time()
+    def time_ns(self) -> int: return time.time_ns()
+
+    async def sleep(self, s: float):
+        await asyncio.sleep(s)
+
+    async def wait_queue(self, q: asyncio.Queue, timeout: float):
+        return await asyncio.wait_for(q.get(), timeout=timeout)
+
+REAL_CLOCK = RealClock()
+
+class VirtualClock:
+    """
+    reloj simulado para replay/sim: el tiempo sólo avanza cuando alguien espera.
+    los eventos (ticks, er con latencia, ...) se agendan con call_at y corren en orden al avanzar.
+    """
+    def __init__(self, t0_ns: int = 0):
+        self.t_ns = int(t0_ns)
+        self._ev: List[Tuple[int, int, Callable, tuple]] = []
+        self._seq = itertools.count()
+
+    def time(self) -> float: return self.t_ns / 1e9
+    def time_ns(self) -> int: return self.t_ns
+
+    def call_at(self, t_ns: int, fn: Callable, *args):
+        heapq.heappush(self._ev, (max(int(t_ns), self.t_ns), next(self._seq), fn, args))
+
+    def call_later(self, delay_s: float, fn: Callable, *args):
+        self.call_at(self.t_ns + int(delay_s * 1e9), fn, *args)
+
+    def next_event_ns(self) -> Optional[int]:
+        return self._ev[0][0] if self._ev else None
+
+    def advance(self, t_ns: int):
+        """corre todos los eventos con ts <= t_ns (en orden) y deja el reloj en t_ns"""
+        while self._ev and self._ev[0][0] <= t_ns:
+            t, _, fn, args = heapq.heappop(self._ev)
+            self.t_ns = max(self.t_ns, t)
+            fn(*args)
+        self.t_ns = max(self.t_ns, int(t_ns))
+
+    async def sleep(self, s: float):
+        self.advance(self.t_ns + int(s * 1e9))
+        await asyncio.sleep(0)
+
+    async def wait_queue(self, q: asyncio.Queue, timeout: float):
+        """como asyncio.wait_for(q.get(), timeout) pero avanzando el tiempo virtual evento a evento (inf = sin deadline)"""
+        deadline = None if math.isinf(timeout) else self.t_ns + int(timeout * 1e9)
+        while q.empty():
+            await asyncio.sleep(0)
+            if not q.empty():
+                break
+            nxt = self.next_event_ns()
+            if nxt is None and deadline is None:
+                # nada agendado y sin deadline: esperar a que otro task agende o publique
+                try:
+                    return await asyncio.wait_for(q.get(), 0.01)
+                except asyncio.TimeoutError:
+                    continue
+            if nxt is None or (deadline is not None and nxt > deadline):
+                self.t_ns = max(self.t_ns, deadline)
+                raise asyncio.TimeoutError()
+            self.advance(nxt)
+        return q.get_nowait()
@@ -0,0 +1,206 @@
+import asyncio, json, os, socket, time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+from settings import settings
+
+# canal de control ui -> bot: socket unix (json por línea + ack) o control.json vigilado por (mtime, size);
+# one-shot por id, overrides como diff, panic / resume persistidos en "trading_enabled"
+
+PROTO = 1
+ONE_SHOT = ("panic_stop", "resume", "reload_instruments_now", "force_flatten", "trace_rotate", "force_reauth")
+STATE_KEY = "trading_enabled"          # estado persistido de panic / resume (no es un override)
+
+@dataclass
+class Command:
+    seq: int
+    cmd: str
+    args: Dict[str, Any] = field(default_factory=dict)
+    id: Optional[str] = None
+    src: str = "file"                               # socket | file
+    fut: Optional[asyncio.Future] = None            # socket: el handler espera el ack acá
+
+class ControlChannel:
+    def __init__(self, path: Optional[str] = None, sock_path: Optional[str] = None):
+        self.path = path or settings.control_path
+        self.sock_path = settings.control_socket if sock_path is None else sock_path
+        self.seq = 0
+        self.applied: Dict[str, Any] = {}           # overrides vigentes (base del diff)
+        self.acked: Dict[str, Any] = {}             # último id ackeado por comando
+        self._q: Deque[Command] = deque()
+        self._seen: Dict[str, Any] = {}             # último valor visto de cada one-shot en el archivo
+        self._stat = None
+        self._server = None
+        self._tasks: List[asyncio.Task] = []
+
+    # ---- entrada ----
+    def _push(self, cmd: str, args: Optional[dict] = None, id=None, src: str = "file", fut=None) -> Optional[Command]:
+        if cmd == "set":
+            args = {k: v for k, v in (args or {}).items() if self.applied.get(k, _MISSING) != v}
+            if not args:
+                return None                         # nada cambió
+        self.seq += 1
+        c = Command(self.seq, cmd, args or {}, id, src, fut)
+        self._q.append(c)
+        return c
+
+    def _from_file(self, data: dict, first: bool):
+        if not isinstance(data, dict):
+            return
+        for k in ONE_SHOT:
+            v = data.get(k)
+            # el primer barrido sólo toma la base: comandos viejos del archivo no se re-disparan al arrancar
+            if v and v != self._seen.get(k) and not first:
+                self._push(k, id=v)
+            self._seen[k] = v
+        if first:
+            # arranque: el panic persistido frena el trading (archivo viejo: "panic_stop": true)
+            halted = data.get(STATE_KEY) is False if STATE_KEY in data else data.get("panic_stop") is True
+            if halted:
+                self._push("panic_stop", id="persisted")
+        ov = {k: v for k, v in data.items() if k not in ONE_SHOT and k != STATE_KEY and not k.startswith("_")}
+        if ov:
+            self._push("set", ov)
+
+    def _read_file(self, first: bool = False):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        key = (st.st_mtime_ns, st.st_size)
+        if key == self._stat:
+            return
+        self._stat = key
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            self._stat = None                       # a medio escribir: reintentar en la próxima
+            return
+        self._from_file(data, first)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(max(0.05, float(settings.control_watch_s)))
+            self._read_file()
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    m = json.loads(line)
+                    if int(m.get("v", 0)) != PROTO:
+                        raise ValueError(f"protocolo {m.get('v')} != {PROTO}")
+                    cmd = str(m["cmd"])
+                    if cmd != "set" and cmd not in ONE_SHOT:
+                        raise ValueError(f"comando desconocido: {cmd}")
+                except Exception as e:
+                    ack = {"v": PROTO, "ok": False, "error": str(e)}
+                else:
+                    fut = asyncio.get_running_loop().create_future()
+                    c = self._push(cmd, m.get("args"), m.get("id"), "socket", fut)
+                    if c is None:
+                        ack = {"v": PROTO, "id": m.get("id"), "seq": self.seq, "ok": True, "applied": {}}
+                    else:
+                        try:
+                            ack = await asyncio.wait_for(fut, timeout=5.0)
+                        except asyncio.TimeoutError:
+                            ack = {"v": PROTO, "id": c.id, "seq": c.seq, "ok": False, "error": "timeout"}
+                writer.write((json.dumps(ack, default=str) + "\n").encode())
+                await writer.drain()
+        except Exception:
+            pass
+        finally:
+            try: writer.close()
+            except Exception: pass
+
+    async def start(self):
+        self._read_file(first=True)
+        self._tasks.append(asyncio.create_task(self._watch()))
+        if self.sock_path and hasattr(asyncio, "start_unix_server"):
+            try:
+                if os.path.exists(self.sock_path):
+                    os.unlink(self.sock_path)
+                self._server = await asyncio.start_unix_server(self._client, path=self.sock_path)
+            except Exception:
+                self._server = None                 # sin socket (permisos / fs): queda el archivo
+
+    # ---- lado loop ----
+    def drain(self) -> List[Command]:
+        out = []
+        while self._q:
+            out.append(self._q.popleft())
+        return out
+
+    def ack(self, c: Command, ok: bool = True, **info):
+        if c.cmd == "set" and ok:
+            self.applied.update(info.get("applied", c.args))
+        else:
+            self.acked[c.cmd] = c.id if c.id is not None else c.seq
+        if c.fut is not None and not c.fut.done():
+            c.fut.set_result(dict(v=PROTO, id=c.id, seq=c.seq, ok=ok, **info))
+
+    def status(self) -> dict:
+        return dict(v=PROTO, seq=self.seq, socket=self.sock_path if self._server else None,
+                    acked=dict(self.acked), pending=len(self._q))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        if self._server:
+            self._server.close()
+            try: os.unlink(self.sock_path)
+            except OSError: pass
+
+_MISSING = object()
+
+# ---- lado cliente (ui) ----
+
+def send_control(cmd: str, args: Optional[dict] = None, sock_path: Optional[str] = None,
+                 path: Optional[str] = None, timeout: float = 2.0) -> dict:
+    """
+    manda un comando al bot por el socket y devuelve el ack. si no hay socket (bot caído, windows)
+    cae al archivo: los overrides se mergean y los one-shot se escriben con un id nuevo.
+    los "set" también se persisten en el archivo, así un reinicio del bot arranca con ellos.
+    """
+    sock_path = settings.control_socket if sock_path is None else sock_path
+    path = path or settings.control_path
+    cid = f"{time.time_ns():x}"
+    if cmd == "set":
+        _merge_file(path, args or {})
+    elif cmd in ("panic_stop", "resume"):
+        _merge_file(path, {STATE_KEY: cmd == "resume"})
+    if sock_path and hasattr(socket, "AF_UNIX") and os.path.exists(sock_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(timeout)
+                s.connect(sock_path)
+                s.sendall((json.dumps(dict(v=PROTO, id=cid, cmd=cmd, args=args or {})) + "\n").encode())
+                buf = b""
+                while not buf.endswith(b"\n"):
+                    chunk = s.recv(65536)
+                    if not chunk: break
+                    buf += chunk
+            return json.loads(buf)
+        except Exception:
+            pass
+    if cmd != "set":
+        _merge_file(path, {cmd: cid})
+    return dict(v=PROTO, id=cid, ok=True, via="file")
+
+def _merge_file(path: str, d: dict):
+    cur = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cur = json.load(f)
+    except Exception:
+        pass
+    cur.update(d)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cur, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1,133 @@
+import math
+from typing import Dict, List, Optional, Sequence
+
+# histograma de latencias estilo HDR (log-lineal, ns enteros): error relativo <= 1/SUB, record() O(1)
+
+SUB_BITS = 5
+SUB = 1 << SUB_BITS
+
+def _idx(v: int) -> int:
+    if v < 2 * SUB:
+        return v
+    shift = v.bit_length() - SUB_BITS - 1
+    return SUB * shift + (v >> shift)
+
+def _upper(i: int) -> int:
+    """mayor valor que cae en el bucket i"""
+    if i < 2 * SUB:
+        return i
+    shift = i // SUB - 1
+    return ((i - SUB * shift + 1) << shift) - 1
+
+class LatencyHist:
+    __slots__ = ("counts", "n", "total", "max", "min", "_top")
+
+    def __init__(self, max_ns: int = 60_000_000_000):
+        self._top = _idx(int(max_ns))
+        self.counts: List[int] = [0] * (self._top + 1)
+        self.n = 0
+        self.total = 0
+        self.max = 0
+        self.min: Optional[int] = None
+
+    def record(self, ns: int):
+        ns = int(ns)
+        if ns < 0: ns = 0
+        i = _idx(ns)
+        self.counts[i if i <= self._top else self._top] += 1
+        self.n += 1
+        self.total += ns
+        if ns > self.max: self.max = ns
+        if self.min is None or ns < self.min: self.min = ns
+
+    def quantiles(self, qs: Sequence[float]) -> List[Optional[int]]:
+        """cuantiles en una sola pasada (qs ascendentes); None si está vacío"""
+        if not self.n:
+            return [None] * len(qs)
+        ranks = [max(1, math.ceil(q * self.n)) for q in qs]
+        out: List[Optional[int]] = []
+        c = j = 0
+        for i, k in enumerate(self.counts):
+            if not k: continue
+            c += k
+            while j < len(ranks) and c >= ranks[j]:
+                out.append(min(_upper(i), self.max)); j += 1
+            if j == len(ranks): break
+        while len(out) < len(qs):
+            out.append(self.max)
+        return out
+
+    def quantile(self, q: float) -> Optional[int]:
+        return self.quantiles((q,))[0]
+
+    def merge(self, other: "LatencyHist"):
+        for i, k in enumerate(other.counts[:len(self.counts)]):
+            self.counts[i] += k
+        self.n += other.n; self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def reset(self):
+        self.counts = [0] * (self._top + 1)
+        self.n = self.total = self.max = 0
+        self.min = None
+
+    def summary(self, unit_ns: float = 1000.0) -> Dict[str, float]:
+        """n, p50/p90/p99/max/mean en `unit_ns` (default µs)"""
+        p50, p90, p99 = self.quantiles((0.5, 0.9, 0.99))
+        r = lambda v: None if v is None else round(v / unit_ns, 1)
+        return dict(n=self.n, p50=r(p50), p90=r(p90), p99=r(p99), max=r(self.max if self.n else None),
+                    mean=r(self.total / self.n if self.n else None))
+
+class P2Quantile:
+    """
+    cuantil p en streaming con el algoritmo P² (Jain & Chlamtac, 1985): 5 marcadores que se
+    ajustan con interpolación parabólica. O(1) memoria y tiempo por muestra, sin guardar la serie.
+    """
+    __slots__ = ("p", "n", "q", "pos", "des", "inc")
+
+    def __init__(self, p: float = 0.5):
+        self.p = float(p)
+        self.n = 0
+        self.q: List[float] = []
+        self.pos = [1.0, 2.0, 3.0, 4.0, 5.0]
+        self.des = [1.0, 1 + 2 * self.p, 1 + 4 * self.p, 3 + 2 * self.p, 5.0]
+        self.inc = [0.0, self.p / 2, self.p, (1 + self.p) / 2, 1.0]
+
+    def add(self, x: float):
+        x = float(x)
+        self.n += 1
+        q, pos = self.q, self.pos
+        if self.n <= 5:
+            q.append(x)
+            if self.n == 5: q.sort()
+            return
+        if x < q[0]:
+            q[0] = x; k = 0
+        elif x >= q[4]:
+            q[4] = x; k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]: k += 1
+        for i in range(k + 1, 5): pos[i] += 1
+        for i in range(5): self.des[i] += self.inc[i]
+        for i in (1, 2, 3):
+            d = self.des[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])     # lineal
+                q[i] = qp
+                pos[i] += d
+
+    def value(self) -> Optional[float]:
+        if not self.n:
+            return None
+        if self.n < 5:
+            s = sorted(self.q)
+            return s[int(round(self.p * (len(s) - 1)))]
+        return self.q[2]
@@ -0,0 +1,120 @@
+import hashlib, json, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from settings import settings
+
+# estado para la ui publicado por un thread de fondo: escribe sólo si cambió (versión `_v`) y,
+# con ui_http_port > 0, sirve GET /state/<nombre> con 304 si no hubo cambios
+
+class StatePublisher:
+    def __init__(self, paths: Dict[str, str], hz: Optional[float] = None, http_port: Optional[int] = None):
+        self.paths = dict(paths)                     # nombre -> archivo
+        self.hz = float(settings.ui_publish_hz if hz is None else hz)
+        self._pending: Dict[str, dict] = {}
+        self._hash: Dict[str, bytes] = {}
+        self.version: Dict[str, int] = {}
+        self.body: Dict[str, tuple] = {}             # nombre -> (versión, último json): lo sirve el http
+        self.written = self.skipped = self.errors = 0
+        self._last_due = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._th = threading.Thread(target=self._run, name="ui-publisher", daemon=True)
+        self._th.start()
+        self._http = None
+        port = int(settings.ui_http_port if http_port is None else http_port)
+        if port > 0:
+            try:
+                self._http = ThreadingHTTPServer((settings.ui_http_host, port), _handler(self))
+                threading.Thread(target=self._http.serve_forever, name="ui-http", daemon=True).start()
+            except Exception:
+                self._http = None
+
+    # ---- lado loop ----
+    def due(self) -> bool:
+        """True a lo sumo ui_publish_hz veces por segundo (armar los payloads también cuesta)"""
+        t = time.monotonic()
+        if self.hz > 0 and t - self._last_due < 1.0 / self.hz:
+            return False
+        self._last_due = t
+        return True
+
+    def publish(self, name: str, obj: dict):
+        with self._lock:
+            self._pending[name] = obj
+        self._wake.set()
+
+    # ---- thread de fondo ----
+    def _flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        for name, obj in batch.items():
+            try:
+                raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str, sort_keys=True)
+            except Exception:
+                # el loop tocó algo anidado mientras serializábamos: queda para la próxima
+                self.errors += 1
+                with self._lock:
+                    self._pending.setdefault(name, obj)
+                continue
+            h = hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+            if h == self._hash.get(name):
+                self.skipped += 1
+                continue
+            self._hash[name] = h
+            v = self.version.get(name, 0) + 1
+            # mismo json plano que leía la ui + ts / versión al frente (el hash no los incluye)
+            head = f'{{"_v":{v},"ts":{time.time()}'
+            body = (head + ("," + raw[1:] if raw != "{}" else "}")).encode("utf-8")
+            self.body[name] = (v, body)             # una sola asignación: el http nunca ve versión y body cruzados
+            self.version[name] = v
+            path = self.paths.get(name)
+            if path:
+                try:
+                    tmp = f"{path}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(body)
+                    os.replace(tmp, path)
+                    self.written += 1
+                except Exception:
+                    self.errors += 1
+
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(1.0)
+            self._wake.clear()
+            self._flush()
+
+    def status(self) -> dict:
+        return dict(hz=self.hz, written=self.written, skipped=self.skipped, errors=self.errors,
+                    version=dict(self.version), http=self._http.server_address[1] if self._http else None)
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._th.join(timeout=2.0)
+        self._flush()
+        if self._http:
+            self._http.shutdown(); self._http.server_close()
+
+def _handler(pub: StatePublisher):
+    class H(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path, _, q = self.path.partition("?")
+            name = path.rstrip("/").rsplit("/", 1)[-1]
+            cur = pub.body.get(name)
+            if not path.startswith("/state/") or cur is None:
+                self.send_response(404); self.end_headers(); return
+            v, body = str(cur[0]), cur[1]
+            since = dict(p.split("=", 1) for p in q.split("&") if "=" in p).get("v") or self.headers.get("If-None-Match")
+            if since == v:
+                self.send_response(304); self.end_headers(); return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        def log_message(self, *a):
+            pass
+    return H
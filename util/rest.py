@@ -0,0 +1,58 @@
+import asyncio, random
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from settings import settings
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class AsyncRest:
+    """
+    cliente rest no bloqueante para el event loop:
+      - requests.Session con pool keep-alive (no re-handshake tls por llamada)
+      - cada request corre en un thread (asyncio.to_thread), el loop sigue consumiendo ws
+      - timeout por request + reintentos con backoff exponencial (+jitter) en errores de red / 429 / 5xx
+    """
+    def __init__(self, timeout_s: Optional[float] = None, retries: Optional[int] = None,
+                 backoff_s: Optional[float] = None, pool: Optional[int] = None):
+        self.timeout = settings.primary_timeout_s if timeout_s is None else timeout_s
+        self.retries = settings.rest_retries if retries is None else retries
+        self.backoff = settings.rest_backoff_s if backoff_s is None else backoff_s
+        n = settings.rest_pool if pool is None else pool
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=n, pool_maxsize=n)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    async def request(self, method: str, url: str, **kw) -> requests.Response:
+        kw.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                r = await asyncio.to_thread(self.session.request, method, url, **kw)
+                if r.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    r.raise_for_status()
+                    return r
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries: raise
+            attempt += 1
+            await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25))
+
+    async def get(self, url: str, **kw) -> requests.Response:
+        return await self.request("GET", url, **kw)
+
+    async def post(self, url: str, **kw) -> requests.Response:
+        return await self.request("POST", url, **kw)
+
+    def close(self):
+        try: self.session.close()
+        except Exception: pass
+
+_client: Optional[AsyncRest] = None
+
+def rest_client() -> AsyncRest:
+    """cliente compartido por proceso (un solo pool de conexiones)"""
+    global _client
+    if _client is None:
+        _client = AsyncRest()
+    return _client
@@ -0,0 +1,89 @@
+import io, os, threading
+from collections import deque
+from typing import Deque, List, Optional
+import pandas as pd
+
+# tail incremental de archivos que sólo crecen: costo por refresco O(bytes nuevos); rotación => relee desde el final
+
+_BLOCK = 64 * 1024
+
+class TailReader:
+    def __init__(self, path: str, n: int = 200, header: bool = False):
+        self.path = path
+        self.n = int(n)
+        self.header = header
+        self.head: Optional[str] = None
+        self.lines: Deque[str] = deque(maxlen=self.n)
+        self._off = 0
+        self._ino = None
+        self._df = None                        # frame() cacheado para el offset _df_off
+        self._df_off = -1
+        self._lock = threading.Lock()          # streamlit puede refrescar desde varias sesiones
+
+    def _reset(self, f, size: int):
+        self.lines.clear()
+        self.head = None
+        start = 0
+        if self.header:
+            f.seek(0)
+            first = f.readline()
+            if not first.endswith(b"\n"):
+                self._off = 0                  # ni el header está completo
+                return
+            self.head = first.decode("utf-8", "replace").rstrip("\r\n")
+            start = len(first)
+        # hacia atrás de a bloques hasta tener n líneas completas (o llegar al header)
+        end = size
+        pos, buf = end, b""
+        while pos > start and buf.count(b"\n") <= self.n:
+            step = min(_BLOCK, pos - start)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+        cut = buf.rfind(b"\n")
+        self._off = pos + cut + 1 if cut >= 0 else pos
+        body = buf[:cut + 1] if cut >= 0 else b""
+        if pos > start:
+            body = body[body.find(b"\n") + 1:]  # la primera línea puede estar cortada
+        self._push(body)
+
+    def _push(self, data: bytes):
+        if data:
+            self.lines.extend(data.decode("utf-8", "replace").splitlines())
+
+    def read(self) -> List[str]:
+        """últimas n líneas (completas), leyendo del disco sólo lo que se agregó desde la vez anterior"""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self.lines.clear(); self.head = None; self._off = 0; self._ino = None
+                return []
+            try:
+                with open(self.path, "rb") as f:
+                    if st.st_ino != self._ino or st.st_size < self._off or (self.header and self.head is None):
+                        self._ino = st.st_ino
+                        self._reset(f, st.st_size)
+                    elif st.st_size > self._off:
+                        f.seek(self._off)
+                        data = f.read(st.st_size - self._off)
+                        cut = data.rfind(b"\n")
+                        if cut >= 0:
+                            self._push(data[:cut + 1])
+                            self._off += cut + 1
+            except OSError:
+                pass
+            return list(self.lines)
+
+    def text(self) -> str:
+        return "\n".join(self.read())
+
+    def frame(self):
+        """cola de un csv como DataFrame (header + últimas n filas)"""
+        rows = self.read()
+        if self.head is None:
+            return pd.DataFrame()
+        if self._df_off != self._off or self._df is None:
+            self._df = pd.read_csv(io.StringIO("\n".join([self.head] + rows)))
+            self._df_off = self._off
+        return self._df
@@ -1,26 +1,140 @@
-import json, os, time, threading
+import atexit, gzip, json, os, shutil, threading, time
+from collections import deque
+from typing import Dict, Optional
+from settings import settings
 
-class Trace:
-    _lock = threading.Lock()
-
-    def __init__(self, path: str, rotate_mb: int = 20):
+class _Sink:
+    """
+    escritor único por archivo:
+      - ring buffer en memoria (si se llena se descarta lo más viejo y se cuenta)
+      - thread de fondo que serializa y escribe en batch con un solo handle abierto
+      - rotación por contador de bytes (sin stat por línea), gzip opcional del rotado
+    """
+    def __init__(self, path: str, rotate_bytes: int, maxlen: int, flush_s: float, gzip_rotated: bool):
         self.path = path
-        self.rotate_bytes = int(rotate_mb) * 1024 * 1024
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.rotate_bytes = rotate_bytes
+        self.flush_s = flush_s
+        self.gzip_rotated = gzip_rotated
+        self._buf: deque = deque(maxlen=maxlen)
+        self._wake = threading.Event()
+        self._stop = False
+        self._rotate_req = False
+        self.dropped = 0          # total descartado por overflow
+        self._dropped_rep = 0     # ya reportado en el archivo
+        self.written = 0
+        self._f = None
+        self._size = 0
+        self._open()
+        self._th = threading.Thread(target=self._run, name=f"trace-{os.path.basename(path)}", daemon=True)
+        self._th.start()
+
+    def _open(self):
+        self._f = open(self.path, "a", encoding="utf-8")
+        try: self._size = os.path.getsize(self.path)
+        except OSError: self._size = 0
+
+    def put(self, rec: dict):
+        if len(self._buf) == self._buf.maxlen:
+            self.dropped += 1
+        self._buf.append(rec)
+
+    def _drain(self):
+        n = len(self._buf)
+        out = []
+        if self.dropped > self._dropped_rep:
+            out.append(json.dumps({"ts": time.time(), "kind": "trace.drop", "dropped": self.dropped - self._dropped_rep, "total": self.dropped}))
+            self._dropped_rep = self.dropped
+        for _ in range(n):
+            try: rec = self._buf.popleft()
+            except IndexError: break
+            try: out.append(json.dumps(rec, ensure_ascii=False, default=str))
+            except Exception: pass
+        if not out: return
+        data = "\n".join(out) + "\n"
+        self._f.write(data)
+        self._f.flush()
+        self._size += len(data.encode("utf-8"))
+        self.written += len(out)
+        if self._rotate_req or (self.rotate_bytes > 0 and self._size >= self.rotate_bytes):
+            self._rotate()
 
     def _rotate(self):
+        self._rotate_req = False
         try:
-            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.rotate_bytes:
-                ts = time.strftime("%Y%m%d-%H%M%S")
-                # rotación simple: copia y limpia (sin gzip para simplicidad)
-                os.replace(self.path, f"{self.path}.{ts}")
+            self._f.close()
+            dst = base = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+            n = 1
+            while os.path.exists(dst) or os.path.exists(f"{dst}.gz"):
+                dst = f"{base}-{n}"; n += 1
+            os.replace(self.path, dst)
+            if self.gzip_rotated:
+                with open(dst, "rb") as src, gzip.open(f"{dst}.gz", "wb") as gz:
+                    shutil.copyfileobj(src, gz)
+                os.remove(dst)
         except Exception:
             pass
+        self._open()
 
-    def log(self, kind: str, **payload):
-        rec = {"ts": time.time(), "kind": kind, **payload}
-        line = json.dumps(rec, ensure_ascii=False)
+    def _run(self):
+        while not self._stop:
+            self._wake.wait(self.flush_s)
+            self._wake.clear()
+            try: self._drain()
+            except Exception: pass
+        try:
+            self._drain(); self._f.close()
+        except Exception:
+            pass
+
+    def request_rotate(self):
+        self._rotate_req = True
+        self._wake.set()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._th.join(timeout=5)
+
+class Trace:
+    """
+    front liviano: log() sólo arma el dict y lo encola (O(1), sin io ni json en el hot path).
+    todas las instancias sobre el mismo path comparten un único _Sink.
+    """
+    _lock = threading.Lock()
+    _sinks: Dict[str, _Sink] = {}
+
+    def __init__(self, path: str, rotate_mb: int = 20, buffer: Optional[int] = None,
+                 flush_ms: Optional[int] = None, gzip_rotated: Optional[bool] = None):
+        self.path = path
+        self.rotate_bytes = int(rotate_mb) * 1024 * 1024
+        d = os.path.dirname(path)
+        if d: os.makedirs(d, exist_ok=True)
         with self._lock:
-            self._rotate()
-            with open(self.path, "a", encoding="utf-8") as f:
-                f.write(line + "\n")
+            sink = self._sinks.get(path)
+            if sink is None:
+                sink = _Sink(
+                    path, self.rotate_bytes,
+                    maxlen=int(settings.trace_buffer if buffer is None else buffer),
+                    flush_s=(settings.trace_flush_ms if flush_ms is None else flush_ms) / 1000.0,
+                    gzip_rotated=bool(settings.trace_gzip if gzip_rotated is None else gzip_rotated),
+                )
+                self._sinks[path] = sink
+        self._sink = sink
+
+    def log(self, kind: str, **payload):
+        self._sink.put({"ts": time.time(), "kind": kind, **payload})
+
+    def rotate(self):
+        self._sink.request_rotate()
+
+    def stats(self) -> dict:
+        s = self._sink
+        return dict(buffered=len(s._buf), dropped=s.dropped, written=s.written, size=s._size)
+
+    @classmethod
+    def close_all(cls):
+        with cls._lock:
+            for s in cls._sinks.values(): s.close()
+            cls._sinks.clear()
+
+atexit.register(Trace.close_all)